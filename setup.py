@@ -14,11 +14,16 @@ setup(
     include_package_data=True,
     install_requires=[
         "fastapi",
-        "uvicorn",
+        # [standard] trae el soporte de WebSocket (/events/ws)
+        "uvicorn[standard]",
         "fastmcp",
         "click",
         # y cualquier otra dependencia que uses
     ],
+    extras_require={
+        # Formatos compactos en disco (TASKFLOW_FORMAT / TASKFLOW_COMPRESSION)
+        "fast": ["orjson", "msgpack", "zstandard"],
+    },
     entry_points={
         "console_scripts": [
             "taskflow-manager=taskflow_manager.cli:cli",
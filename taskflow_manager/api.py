@@ -1,22 +1,170 @@
-from typing import Any, Dict
+import asyncio
+import json
+import tempfile
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-from fastapi import Body, FastAPI, HTTPException
+from fastapi import (
+    Body,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+)
+from fastapi.responses import StreamingResponse
 
-from .backend.models import Project, Subtask, Task  # Status,
+from .backend.async_service import (
+    AsyncExecutor,
+    AsyncProjectService,
+    AsyncTaskService,
+)
+from .backend.batch_service import BatchError, BatchService
+from .backend.changes import changes_json
+from .backend.cluster import get_cluster
+from .backend.events import KEEPALIVE, Subscription
+from .backend.graph_service import GraphService
+from .backend.models import (
+    BatchOperation,
+    BatchResult,
+    CriticalPath,
+    CustomFieldSchema,
+    HistoryPage,
+    Project,
+    ProjectGraph,
+    SearchHit,
+    Status,
+    Subtask,
+    Task,
+    TaskMatch,
+)
 from .backend.project_service import ProjectService
+from .backend.query_service import QueryService
 from .backend.task_service import TaskService
+from .backend.transfer import export_ndjson, import_ndjson
+from .backend.views import View, page, parse_keys, tasks_json
 
 app = FastAPI(
     title="Gestor de Proyectos",
     version="0.1.0",
 )
 
-ps = ProjectService()
+ps = ProjectService(cluster=get_cluster())
 ts = TaskService(ps)
+qs = QueryService(ps)
+gs = GraphService(ps)
+bs = BatchService(ps, ts)
+# Los endpoints son async y llaman a los servicios a través del executor
+ex = AsyncExecutor(ps)
+aps = AsyncProjectService(ps, ex)
+ats = AsyncTaskService(ts, ex)
 
 # Default Body to avoid function calls in defaults
 _DEFAULT_BODY = Body(...)
 
+
+def _json_page(
+    content: bytes,
+    next_cursor: Optional[str] = None,
+) -> Response:
+    # El cuerpo sigue siendo una lista; el cursor siguiente va en cabecera
+    headers = {}
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = str(next_cursor)
+    return Response(content, media_type="application/json", headers=headers)
+
+
+# ---------- Versiones (ETag) ---------- #
+
+
+def _etag(
+    revision: int,
+) -> str:
+    return f'"{ps.epoch}-{revision}"'
+
+
+def _project_etag(
+    project_id: str,
+) -> str:
+    if project_id not in ps.projects:
+        raise HTTPException(404, "Proyecto no encontrado")
+    return _etag(ps.revision(project_id))
+
+
+def _task_etag(
+    project_id: str,
+    task_id: str,
+) -> str:
+    try:
+        task = ps.task_index(project_id).get_task(task_id)
+    except KeyError:
+        raise HTTPException(404, "Proyecto no encontrado")
+    if task is None:
+        raise HTTPException(404, "Tarea no encontrada")
+    return _etag(ps.task_revision(project_id, task_id))
+
+
+def _task_json(
+    project_id: str,
+    task_id: str,
+) -> Tuple[str, str]:
+    # Versión y cuerpo bajo el mismo lock: un escritor no se cuela entre ambos
+    with ps.locks.read(project_id):
+        etag = _task_etag(project_id, task_id)
+        task = ps.task_index(project_id).get_task(task_id)
+        return etag, task.json(by_alias=True)
+
+
+def _listing_etag() -> str:
+    # Cualquier mutación cambia la generación, sea cual sea el filtro. La
+    # generación es propia de cada proceso, como ``instance``
+    return f'"{ps.instance}-g{ps.generation}"'
+
+
+def _matches(
+    header: Optional[str],
+    etag: str,
+) -> bool:
+    tags = {tag.strip() for tag in header.split(",")}
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def _not_modified(
+    if_none_match: Optional[str],
+    etag: str,
+) -> Optional[Response]:
+    if if_none_match and _matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+
+def _check_version(
+    if_match: Optional[str],
+    etag: str,
+):
+    """412 si el cliente escribe sobre una versión que ya no es la actual."""
+    if if_match and not _matches(if_match, etag):
+        raise HTTPException(412, "El recurso ha cambiado (If-Match)")
+
+
+def _if_match_project(
+    if_match: Optional[str],
+    project_id: str,
+) -> Callable[[], None]:
+    # Precondición que el executor comprueba dentro del lock de escritura
+    return lambda: _check_version(if_match, _project_etag(project_id))
+
+
+def _if_match_task(
+    if_match: Optional[str],
+    project_id: str,
+    task_id: str,
+) -> Callable[[], None]:
+    return lambda: _check_version(if_match, _task_etag(project_id, task_id))
+
+
 # ---------- Proyectos ---------- #
 
 
@@ -24,225 +172,888 @@ _DEFAULT_BODY = Body(...)
     "/projects",
     response_model=list[Project],
 )
-def list_projects():
-    return list(ps.projects.values())
+async def list_projects(
+    owner: Optional[str] = None,
+    status: Optional[Status] = None,
+    tag: Optional[str] = None,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    fields: Optional[str] = Query(None, description="p. ej. id,nombre"),
+    exclude: Optional[str] = Query(None, description="p. ej. tasks,history"),
+    view: View = View.full,
+    if_none_match: Optional[str] = Header(None),
+):
+    await ex.sync()
+    etag = _listing_etag()
+    not_modified = _not_modified(if_none_match, etag)
+    if not_modified is not None:
+        return not_modified
+    ids = None
+    if owner or status or tag or start or end:
+        projects = await ex.read(qs.projects, owner, status, tag, start, end)
+        ids = [p.id for p in projects]
+    try:
+        # JSON ya serializado: evita revalidar el árbol en cada sondeo
+        content, next_cursor = await aps.list_json(
+            ids,
+            cursor,
+            limit,
+            view,
+            parse_keys(fields),
+            parse_keys(exclude),
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    response = _json_page(content, next_cursor)
+    response.headers["ETag"] = etag
+    return response
 
 
 @app.get(
     "/projects/{project_id}",
     response_model=Project,
 )
-def get_project(
+async def get_project(
     project_id: str,
+    if_none_match: Optional[str] = Header(None),
 ):
-    try:
-        return ps.projects[project_id]
-    except KeyError:
-        raise HTTPException(404, "Proyecto no encontrado")
+    await ex.sync()
+    etag = _project_etag(project_id)
+    not_modified = _not_modified(if_none_match, etag)
+    if not_modified is not None:
+        return not_modified
+    content = await aps.project_json(project_id)
+    return Response(
+        content,
+        media_type="application/json",
+        headers={"ETag": etag},
+    )
 
 
 @app.post(
     "/projects",
     response_model=Project,
 )
-def create_project(
+async def create_project(
+    response: Response,
     payload: Dict[str, Any] = _DEFAULT_BODY,
     user: str = "system",
 ):
     try:
-        return ps.create(payload, user=user)
+        project = await aps.create(payload, user=user)
     except ValueError as e:
         raise HTTPException(400, str(e))
+    response.headers["ETag"] = _project_etag(project.id)
+    return project
 
 
 @app.put(
     "/projects/{project_id}",
     response_model=Project,
 )
-def update_project(
+async def update_project(
     project_id: str,
+    response: Response,
     updates: Dict[str, Any] = _DEFAULT_BODY,
     user: str = "system",
+    if_match: Optional[str] = Header(None),
+):
+    project = await aps.update(
+        project_id,
+        updates,
+        user,
+        precondition=_if_match_project(if_match, project_id),
+    )
+    response.headers["ETag"] = _project_etag(project_id)
+    return project
+
+
+@app.patch(
+    "/projects/{project_id}",
+    response_model=Project,
+)
+async def patch_project(
+    project_id: str,
+    response: Response,
+    patch: Dict[str, Any] = _DEFAULT_BODY,
+    user: str = "system",
+    if_match: Optional[str] = Header(None),
 ):
+    """JSON Merge Patch de los campos del proyecto (claves por alias)."""
     try:
-        return ps.update(project_id, updates, user)
-    except KeyError:
-        raise HTTPException(404, "Proyecto no encontrado")
+        project = await aps.patch(
+            project_id,
+            patch,
+            user,
+            precondition=_if_match_project(if_match, project_id),
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    response.headers["ETag"] = _project_etag(project_id)
+    return project
 
 
 @app.patch(
     "/projects/{project_id}/close",
     response_model=Project,
 )
-def close_project(
+async def close_project(
     project_id: str,
+    response: Response,
     user: str = "system",
+    if_match: Optional[str] = Header(None),
+):
+    project = await aps.close(
+        project_id,
+        user,
+        precondition=_if_match_project(if_match, project_id),
+    )
+    response.headers["ETag"] = _project_etag(project_id)
+    return project
+
+
+@app.delete(
+    "/projects/{project_id}",
+)
+async def delete_project(
+    project_id: str,
+    user: str = "system",
+    if_match: Optional[str] = Header(None),
+):
+    removed = await aps.delete(
+        project_id,
+        user,
+        precondition=_if_match_project(if_match, project_id),
+    )
+    return {"deleted": removed.id}
+
+
+@app.get(
+    "/projects/{project_id}/history",
+    response_model=HistoryPage,
+)
+async def get_project_history(
+    project_id: str,
+    cursor: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+):
+    try:
+        return await aps.history(project_id, cursor, limit)
+    except KeyError:
+        raise HTTPException(404, "Proyecto no encontrado")
+
+
+# ---------- Dependencias ---------- #
+
+
+@app.get(
+    "/projects/{project_id}/graph",
+    response_model=ProjectGraph,
+)
+async def get_dependency_graph(
+    project_id: str,
 ):
+    """Tareas en orden topológico con su planificación (inicio y fin más
+    tempranos y más tardíos, holgura) según sus dependencias y fechas."""
     try:
-        return ps.close(project_id, user)
+        # Puede recorrer todas las tareas: fuera del loop
+        return await ex.read(gs.graph, project_id, offload=True)
     except KeyError:
         raise HTTPException(404, "Proyecto no encontrado")
 
 
+@app.get(
+    "/projects/{project_id}/critical-path",
+    response_model=CriticalPath,
+)
+async def get_critical_path(
+    project_id: str,
+):
+    try:
+        return await ex.read(
+            gs.critical_path,
+            project_id,
+            project_id=project_id,
+        )
+    except KeyError:
+        raise HTTPException(404, "Proyecto no encontrado")
+
+
+# ---------- Campos personalizados ---------- #
+
+
+def _field_schemas(
+    project_id: str,
+) -> Dict[str, CustomFieldSchema]:
+    with ps.locks.read(project_id):
+        return dict(ps.projects[project_id].field_schemas)
+
+
+@app.get(
+    "/projects/{project_id}/fields",
+    response_model=Dict[str, CustomFieldSchema],
+)
+async def list_field_schemas(
+    project_id: str,
+):
+    try:
+        return await ex.read(
+            _field_schemas,
+            project_id,
+            project_id=project_id,
+        )
+    except KeyError:
+        raise HTTPException(404, "Proyecto no encontrado")
+
+
+@app.put(
+    "/projects/{project_id}/fields/{name}",
+    response_model=CustomFieldSchema,
+)
+async def set_field_schema(
+    project_id: str,
+    name: str,
+    schema: CustomFieldSchema,
+    user: str = "system",
+):
+    try:
+        return await aps.set_field_schema(project_id, name, schema, user)
+    except (KeyError, ValueError) as e:
+        raise HTTPException(
+            404 if isinstance(e, KeyError) else 400,
+            str(e),
+        )
+
+
 @app.delete(
-    "/projects/{project_id}",
+    "/projects/{project_id}/fields/{name}",
 )
-def delete_project(
+async def delete_field_schema(
     project_id: str,
+    name: str,
     user: str = "system",
 ):
     try:
-        removed = ps.delete(project_id, user)
-        return {"deleted": removed.id}
+        await aps.delete_field_schema(project_id, name, user)
+        return {"deleted": name}
+    except KeyError as e:
+        raise HTTPException(404, str(e))
+
+
+# ---------- Tareas ---------- #
+
+
+@app.get(
+    "/projects/{project_id}/tasks",
+    response_model=List[Task],
+)
+async def list_tasks(
+    project_id: str,
+    where: Optional[str] = Query(None, alias="filter"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    fields: Optional[str] = Query(None, description="p. ej. id,title"),
+    exclude: Optional[str] = Query(None, description="p. ej. subtasks"),
+    view: View = View.full,
+    if_none_match: Optional[str] = Header(None),
+):
+    await ex.sync()
+    etag = _project_etag(project_id)
+    not_modified = _not_modified(if_none_match, etag)
+    if not_modified is not None:
+        return not_modified
+    try:
+        tasks, next_cursor = page(
+            await ex.read(
+                qs.filter_tasks,
+                project_id,
+                where,
+                project_id=project_id,
+            ),
+            cursor,
+            limit,
+        )
+        content = tasks_json(
+            tasks,
+            view,
+            parse_keys(fields),
+            parse_keys(exclude),
+        )
     except KeyError:
         raise HTTPException(404, "Proyecto no encontrado")
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    response = _json_page(content, next_cursor)
+    response.headers["ETag"] = etag
+    return response
 
 
-# ---------- Tareas ---------- #
+@app.get(
+    "/projects/{project_id}/tasks/{task_id}",
+    response_model=Task,
+)
+async def get_task(
+    project_id: str,
+    task_id: str,
+    if_none_match: Optional[str] = Header(None),
+):
+    etag, body = await ex.read(
+        _task_json,
+        project_id,
+        task_id,
+        project_id=project_id,
+    )
+    not_modified = _not_modified(if_none_match, etag)
+    if not_modified is not None:
+        return not_modified
+    return Response(
+        body,
+        media_type="application/json",
+        headers={"ETag": etag},
+    )
 
 
 @app.post(
     "/projects/{project_id}/tasks",
     response_model=Task,
 )
-def add_task(
+async def add_task(
     project_id: str,
+    response: Response,
     payload: Dict[str, Any] = _DEFAULT_BODY,
     user: str = "system",
 ):
     try:
-        return ts.add_task(project_id, payload, user)
+        task = await ats.add_task(project_id, payload, user)
     except (KeyError, ValueError) as e:
         raise HTTPException(
             404 if isinstance(e, KeyError) else 400,
             str(e),
         )
+    response.headers["ETag"] = _task_etag(project_id, task.id)
+    return task
 
 
 @app.put(
     "/projects/{project_id}/tasks/{task_id}",
     response_model=Task,
 )
-def update_task(
+async def update_task(
     project_id: str,
     task_id: str,
+    response: Response,
     updates: Dict[str, Any] = _DEFAULT_BODY,
     user: str = "system",
+    if_match: Optional[str] = Header(None),
 ):
     try:
-        return ts.update_task(project_id, task_id, updates, user)
-    except KeyError as e:
-        raise HTTPException(404, str(e))
+        task = await ats.update_task(
+            project_id,
+            task_id,
+            updates,
+            user,
+            precondition=_if_match_task(if_match, project_id, task_id),
+        )
+    except (KeyError, ValueError) as e:
+        raise HTTPException(
+            404 if isinstance(e, KeyError) else 400,
+            str(e),
+        )
+    response.headers["ETag"] = _task_etag(project_id, task.id)
+    return task
 
 
 @app.patch(
-    "/projects/{project_id}/tasks/{task_id}/close",
+    "/projects/{project_id}/tasks/{task_id}",
     response_model=Task,
 )
-def close_task(
+async def patch_task(
     project_id: str,
     task_id: str,
+    response: Response,
+    patch: Dict[str, Any] = _DEFAULT_BODY,
     user: str = "system",
+    if_match: Optional[str] = Header(None),
 ):
+    """JSON Merge Patch de los campos de la tarea (claves por alias)."""
     try:
-        return ts.close_task(project_id, task_id, user)
-    except KeyError as e:
-        raise HTTPException(404, str(e))
+        task = await ats.patch_task(
+            project_id,
+            task_id,
+            patch,
+            user,
+            precondition=_if_match_task(if_match, project_id, task_id),
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    response.headers["ETag"] = _task_etag(project_id, task_id)
+    return task
+
+
+@app.patch(
+    "/projects/{project_id}/tasks/{task_id}/close",
+    response_model=Task,
+)
+async def close_task(
+    project_id: str,
+    task_id: str,
+    response: Response,
+    user: str = "system",
+    if_match: Optional[str] = Header(None),
+):
+    task = await ats.close_task(
+        project_id,
+        task_id,
+        user,
+        precondition=_if_match_task(if_match, project_id, task_id),
+    )
+    response.headers["ETag"] = _task_etag(project_id, task_id)
+    return task
 
 
 @app.delete(
     "/projects/{project_id}/tasks/{task_id}",
 )
-def delete_task(
+async def delete_task(
     project_id: str,
     task_id: str,
     user: str = "system",
+    if_match: Optional[str] = Header(None),
 ):
     try:
-        ts.delete_task(project_id, task_id, user)
-        return {"deleted": task_id}
-    except KeyError as e:
-        raise HTTPException(404, str(e))
+        await ats.delete_task(
+            project_id,
+            task_id,
+            user,
+            precondition=_if_match_task(if_match, project_id, task_id),
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {"deleted": task_id}
+
+
+# ---------- Lotes ---------- #
+
+
+@app.post(
+    "/batch",
+    response_model=List[BatchResult],
+)
+async def apply_batch(
+    operations: List[BatchOperation],
+    user: str = "system",
+):
+    """Aplica todas las operaciones o ninguna, con una sola escritura."""
+    try:
+        return await ex.write(bs.apply, operations, user)
+    except BatchError as e:
+        raise HTTPException(
+            404 if isinstance(e.error, KeyError) else 400,
+            {"index": e.index, "error": str(e)},
+        )
+
+
+# ---------- Exportación ---------- #
+
+# Cuerpo de /import que se mantiene en memoria antes de pasar a disco
+_SPOOL_SIZE = 8 * 1024 * 1024
+
+
+@app.get(
+    "/export",
+)
+async def export_projects():
+    """Volcado NDJSON de todos los proyectos, uno por línea."""
+    return StreamingResponse(
+        export_ndjson(ps),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.post(
+    "/import",
+)
+async def import_projects(
+    request: Request,
+    replace: bool = False,
+    user: str = "system",
+):
+    """Importa un volcado NDJSON: todo o nada, en una sola escritura."""
+    with tempfile.SpooledTemporaryFile(_SPOOL_SIZE) as body:
+        async for chunk in request.stream():
+            body.write(chunk)
+        body.seek(0)
+        try:
+            # Validación y restauración pesadas: fuera del loop
+            count = await ex.write(
+                import_ndjson,
+                ps,
+                body,
+                user,
+                replace,
+                offload=True,
+            )
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+    return {"imported": count}
+
+
+# ---------- Consultas ---------- #
+
+
+@app.get(
+    "/tasks",
+    response_model=List[TaskMatch],
+)
+async def find_tasks(
+    assignee: Optional[str] = None,
+    status: Optional[Status] = None,
+    tag: Optional[str] = None,
+    owner: Optional[str] = None,
+    where: Optional[str] = Query(None, alias="filter"),
+):
+    try:
+        # Con filtro se lee cada proyecto con su lock: fuera del loop
+        return await ex.read(
+            qs.tasks,
+            assignee,
+            status,
+            tag,
+            owner,
+            where,
+            offload=bool(where),
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+@app.get(
+    "/tasks/overlapping",
+    response_model=List[TaskMatch],
+)
+async def tasks_overlapping(
+    start: datetime = Query(..., alias="from"),
+    end: datetime = Query(..., alias="to"),
+):
+    if start > end:
+        raise HTTPException(400, "'from' es posterior a 'to'")
+    return await ex.read(qs.overlapping, start, end)
+
+
+@app.get(
+    "/tasks/overdue",
+    response_model=List[TaskMatch],
+)
+async def tasks_overdue():
+    return await ex.read(qs.overdue)
+
+
+@app.get(
+    "/tasks/due-soon",
+    response_model=List[TaskMatch],
+)
+async def tasks_due_soon(
+    within: int = Query(7, ge=0, description="Días"),
+):
+    return await ex.read(qs.due_soon, timedelta(days=within))
+
+
+@app.get(
+    "/search",
+    response_model=List[SearchHit],
+)
+async def search(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=200),
+):
+    return await ex.read(qs.search, q, limit)
 
 
 # ---------- Subtareas ---------- #
+# Las subtareas comparten la versión (ETag) de su tarea
 
 
 @app.post(
     "/projects/{project_id}/tasks/{task_id}/subtasks",
     response_model=Subtask,
 )
-def add_subtask(
+async def add_subtask(
     project_id: str,
     task_id: str,
+    response: Response,
     payload: Dict[str, Any] = _DEFAULT_BODY,
     user: str = "system",
+    if_match: Optional[str] = Header(None),
 ):
     try:
-        return ts.add_subtask(project_id, task_id, payload, user)
+        subtask = await ats.add_subtask(
+            project_id,
+            task_id,
+            payload,
+            user,
+            precondition=_if_match_task(if_match, project_id, task_id),
+        )
     except (KeyError, ValueError) as e:
         raise HTTPException(
             404 if isinstance(e, KeyError) else 400,
             str(e),
         )
+    response.headers["ETag"] = _task_etag(project_id, task_id)
+    return subtask
 
 
 @app.put(
     "/projects/{project_id}/tasks/{task_id}/subtasks/{sub_id}",
     response_model=Subtask,
 )
-def update_subtask(
+async def update_subtask(
     project_id: str,
     task_id: str,
     sub_id: str,
+    response: Response,
     updates: Dict[str, Any] = _DEFAULT_BODY,
     user: str = "system",
+    if_match: Optional[str] = Header(None),
 ):
     try:
-        return ts.update_subtask(project_id, task_id, sub_id, updates, user)
-    except KeyError as e:
-        raise HTTPException(404, str(e))
+        subtask = await ats.update_subtask(
+            project_id,
+            task_id,
+            sub_id,
+            updates,
+            user,
+            precondition=_if_match_task(if_match, project_id, task_id),
+        )
+    except (KeyError, ValueError) as e:
+        raise HTTPException(
+            404 if isinstance(e, KeyError) else 400,
+            str(e),
+        )
+    response.headers["ETag"] = _task_etag(project_id, task_id)
+    return subtask
+
+
+@app.patch(
+    "/projects/{project_id}/tasks/{task_id}/subtasks/{sub_id}",
+    response_model=Subtask,
+)
+async def patch_subtask(
+    project_id: str,
+    task_id: str,
+    sub_id: str,
+    response: Response,
+    patch: Dict[str, Any] = _DEFAULT_BODY,
+    user: str = "system",
+    if_match: Optional[str] = Header(None),
+):
+    try:
+        subtask = await ats.patch_subtask(
+            project_id,
+            task_id,
+            sub_id,
+            patch,
+            user,
+            precondition=_if_match_task(if_match, project_id, task_id),
+        )
+    except (KeyError, ValueError) as e:
+        raise HTTPException(
+            404 if isinstance(e, KeyError) else 400,
+            str(e),
+        )
+    response.headers["ETag"] = _task_etag(project_id, task_id)
+    return subtask
 
 
 @app.patch(
     "/projects/{project_id}/tasks/{task_id}/subtasks/{sub_id}/close",
     response_model=Subtask,
 )
-def close_subtask(
+async def close_subtask(
     project_id: str,
     task_id: str,
     sub_id: str,
+    response: Response,
     user: str = "system",
+    if_match: Optional[str] = Header(None),
 ):
     try:
-        return ts.close_subtask(project_id, task_id, sub_id, user)
+        subtask = await ats.close_subtask(
+            project_id,
+            task_id,
+            sub_id,
+            user,
+            precondition=_if_match_task(if_match, project_id, task_id),
+        )
     except KeyError as e:
         raise HTTPException(404, str(e))
+    response.headers["ETag"] = _task_etag(project_id, task_id)
+    return subtask
 
 
 @app.delete(
     "/projects/{project_id}/tasks/{task_id}/subtasks/{sub_id}",
 )
-def delete_subtask(
+async def delete_subtask(
     project_id: str,
     task_id: str,
     sub_id: str,
     user: str = "system",
+    if_match: Optional[str] = Header(None),
 ):
     try:
-        ts.delete_subtask(project_id, task_id, sub_id, user)
+        await ats.delete_subtask(
+            project_id,
+            task_id,
+            sub_id,
+            user,
+            precondition=_if_match_task(if_match, project_id, task_id),
+        )
         return {"deleted": sub_id}
     except KeyError as e:
         raise HTTPException(404, str(e))
 
 
+# ---------- Eventos en vivo ---------- #
+# Cada cambio persistido: proyecto, tarea o subtarea afectada y revisión
+# nueva (ver ``backend/events.py``). Sustituyen al sondeo periódico; quien
+# no puede mantener una conexión abierta usa ``GET /changes``
+
+
+def _events(
+    subscription: Subscription,
+):
+    # Con varios procesos, los cambios de los demás se traen sin esperar
+    # a que llegue una petición a este
+    interval = KEEPALIVE if ps.cluster is None else 1.0
+    return subscription.stream(interval, ex.sync)
+
+
+@app.get(
+    "/events",
+)
+async def stream_events(
+    project: Optional[List[str]] = Query(None),
+):
+    """Server-sent events: ``change`` por cambio y, si el cliente no da
+    abasto, un ``resync`` final (hay que recargar y reconectar)."""
+    subscription = ps.events.subscribe(project)
+
+    async def body():
+        try:
+            async for event in _events(subscription):
+                if event is None:
+                    yield b": keep-alive\n\n"
+                    continue
+                kind = "resync" if event["type"] == "resync" else "change"
+                yield (
+                    f"id: {event['seq']}\nevent: {kind}\n"
+                    f"data: {json.dumps(event)}\n\n"
+                ).encode()
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/events/ws")
+async def events_socket(
+    websocket: WebSocket,
+    project: Optional[List[str]] = Query(None),
+):
+    """Los mismos eventos por WebSocket. El cliente puede cambiar el
+    filtro enviando ``{"projects": [...]}`` (``null``: todos)."""
+    await websocket.accept()
+    subscription = ps.events.subscribe(project)
+
+    async def send():
+        # Termina tras un ``resync``
+        async for event in _events(subscription):
+            if event is not None:
+                await websocket.send_json(event)
+        await websocket.close()
+
+    async def receive():
+        while True:
+            message = await websocket.receive_json()
+            try:
+                projects = message["projects"]
+                if projects is not None:
+                    projects = set(projects)
+            except (KeyError, TypeError):
+                await websocket.close(1003, "Se esperaba {'projects': [...]}")
+                return
+            subscription.projects = projects
+
+    # Lo que acabe primero (desconexión, filtro inválido o resync) cierra
+    tasks = [asyncio.create_task(send()), asyncio.create_task(receive())]
+    try:
+        done, _ = await asyncio.wait(
+            tasks,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        for task in done:
+            # Desconexión del cliente: no queda nadie a quien avisar
+            task.exception()
+    finally:
+        for task in tasks:
+            task.cancel()
+        subscription.close()
+
+
+@app.get(
+    "/changes",
+)
+async def list_changes(
+    since: Optional[str] = Query(None, description="cursor de la anterior"),
+    project: Optional[List[str]] = Query(None),
+    limit: int = Query(500, ge=1, le=5000),
+):
+    """Sincronización por cursor, sin conexión abierta: lo creado,
+    cambiado o borrado desde ``since`` con su estado actual.
+
+    ``resync: true`` pide recargarlo todo y seguir desde el ``cursor``
+    devuelto (obtenido antes de recargar). Los cursores son de cada
+    proceso de la API.
+    """
+    await ex.sync()
+    try:
+        # Espera al bus y toma el lock de cada proyecto: fuera del loop
+        content = await ex.read(
+            changes_json,
+            ps,
+            since,
+            project,
+            limit,
+            offload=True,
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return Response(content, media_type="application/json")
+
+
+# ---------- Ciclo de vida ---------- #
+
+
+@app.on_event("shutdown")
+def flush_storage():
+    # Vacía la escritura diferida y los eventos pendientes antes de salir
+    ps.storage.close()
+    ps.bus.close()
+
+
 # ---------- Root ---------- #
 
 
 @app.get(
     "/",
 )
-def root():
+async def root():
     return {"message": "Taskflow Manager running"}
 
 
@@ -0,0 +1,196 @@
+# =============================================================
+# file: async_service.py
+# =============================================================
+import asyncio
+from typing import Any, Callable, FrozenSet, Optional, TypeVar
+
+from .project_service import ProjectService
+from .task_service import TaskService
+from .working_set import LazyProjectMap
+
+Result = TypeVar("Result")
+
+
+class AsyncExecutor:
+    """Ejecuta las llamadas a los servicios síncronos desde el event loop.
+
+    Las llamadas sobre un proyecto (``project_id``) toman su lock
+    lector-escritor: escrituras en proyectos distintos no se esperan. Si
+    el almacenamiento no espera a disco (escritura diferida), corren en el
+    propio loop sin saltar a un hilo, pero solo si el lock está libre; si
+    no, esperan en un hilo para no parar el loop. Las lecturas son en
+    memoria y tampoco saltan, salvo en modo perezoso, donde pueden hidratar
+    desde disco. Las escrituras sin proyecto (lotes, importación) van
+    siempre a un hilo: bloquean varios proyectos.
+
+    Con varios procesos, cada llamada trae antes los cambios de los demás
+    (``ProjectService.sync``) y las escrituras van siempre a un hilo:
+    pueden esperar al lock de otro proceso.
+    """
+
+    def __init__(
+        self,
+        project_service: ProjectService,
+    ):
+        self.ps = project_service
+
+    @property
+    def blocking_writes(self) -> bool:
+        return self.ps.cluster is not None or self.ps.storage.blocking_writes
+
+    @property
+    def blocking_reads(self) -> bool:
+        return isinstance(self.ps.projects, LazyProjectMap)
+
+    async def sync(self):
+        cluster = self.ps.cluster
+        if cluster is not None and cluster.changed():
+            await asyncio.to_thread(self.ps.sync)
+
+    async def read(
+        self,
+        fn: Callable[..., Result],
+        *args,
+        offload: bool = False,
+        project_id: Optional[str] = None,
+        **kwargs,
+    ) -> Result:
+        await self.sync()
+        inline = not (offload or self.blocking_reads)
+        if inline and project_id is None:
+            return fn(*args, **kwargs)
+        if inline:
+            lock = self.ps.locks.project(project_id)
+            if lock.acquire_read(blocking=False):
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    lock.release_read()
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    async def write(
+        self,
+        fn: Callable[..., Result],
+        *args,
+        precondition: Optional[Callable[[], Any]] = None,
+        offload: bool = False,
+        project_id: Optional[str] = None,
+        **kwargs,
+    ) -> Result:
+        """Ejecuta ``fn`` con el lock de escritura del proyecto tomado.
+
+        ``precondition`` (p. ej. la comprobación de ``If-Match``) corre
+        dentro del mismo lock, así que nadie escribe entre ambas.
+        """
+        await self.sync()
+        locks = self.ps.locks
+
+        def call() -> Result:
+            if precondition is not None:
+                precondition()
+            return fn(*args, **kwargs)
+
+        def locked() -> Result:
+            if project_id is None:
+                return call()
+            with locks.write(project_id):
+                return call()
+
+        inline = not (offload or self.blocking_writes or self.blocking_reads)
+        if inline and project_id is not None:
+            lock = locks.acquire_write(project_id, blocking=False)
+            if lock is not None:
+                try:
+                    return call()
+                finally:
+                    locks.release_write(project_id, lock)
+        return await asyncio.to_thread(locked)
+
+
+class AsyncService:
+    """Fachada async de un servicio síncrono: cada método público pasa a
+    ser una corrutina que se ejecuta a través de ``AsyncExecutor``."""
+
+    # Métodos que mutan (lock de escritura) y lecturas que van a disco
+    WRITES: FrozenSet[str] = frozenset()
+    BLOCKING: FrozenSet[str] = frozenset()
+
+    def __init__(
+        self,
+        service,
+        executor: AsyncExecutor,
+    ):
+        self.service = service
+        self.executor = executor
+
+    def __getattr__(
+        self,
+        name: str,
+    ):
+        attr = getattr(self.service, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        executor = self.executor
+        run = executor.write if name in self.WRITES else executor.read
+
+        async def call(*args, **kwargs):
+            # Los métodos sobre un proyecto reciben su id primero; el resto
+            # (altas, listados) no bloquea ninguno de antemano
+            if args and isinstance(args[0], str):
+                kwargs.setdefault("project_id", args[0])
+            if name in self.BLOCKING:
+                kwargs.setdefault("offload", True)
+            return await run(attr, *args, **kwargs)
+
+        return call
+
+
+class AsyncProjectService(AsyncService):
+    WRITES = frozenset(
+        {
+            "create",
+            "update",
+            "patch",
+            "close",
+            "delete",
+            "restore",
+            "set_field_schema",
+            "delete_field_schema",
+        }
+    )
+    # ``list_json`` recorre todos los proyectos, con el lock de cada uno
+    BLOCKING = frozenset({"history", "list_json"})
+
+    def __init__(
+        self,
+        project_service: ProjectService,
+        executor: Optional[AsyncExecutor] = None,
+    ):
+        super().__init__(
+            project_service,
+            executor or AsyncExecutor(project_service),
+        )
+
+
+class AsyncTaskService(AsyncService):
+    WRITES = frozenset(
+        {
+            "add_task",
+            "update_task",
+            "patch_task",
+            "close_task",
+            "delete_task",
+            "add_subtask",
+            "update_subtask",
+            "patch_subtask",
+            "close_subtask",
+            "delete_subtask",
+        }
+    )
+
+    def __init__(
+        self,
+        task_service: TaskService,
+        executor: AsyncExecutor,
+    ):
+        super().__init__(task_service, executor)
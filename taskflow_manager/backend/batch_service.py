@@ -0,0 +1,99 @@
+# =============================================================
+# file: batch_service.py
+# =============================================================
+from typing import List
+
+from .models import BatchAction, BatchOperation, BatchResult
+from .project_service import ProjectService
+from .task_service import TaskService
+
+
+class BatchError(Exception):
+    """Fallo de la operación ``index`` de un lote; no se ha aplicado
+    ninguna."""
+
+    def __init__(
+        self,
+        index: int,
+        error: Exception,
+    ):
+        self.index = index
+        self.error = error
+        # str(KeyError) añade comillas al mensaje
+        if isinstance(error, KeyError) and error.args:
+            message = error.args[0]
+        else:
+            message = str(error)
+        super().__init__(f"Operación {index}: {message}")
+
+
+class BatchService:
+    """Aplica lotes de operaciones como una sola unidad de trabajo."""
+
+    def __init__(
+        self,
+        project_service: ProjectService,
+        task_service: TaskService,
+    ):
+        self.ps = project_service
+        self.ts = task_service
+
+    def _apply(
+        self,
+        op: BatchOperation,
+        user: str,
+    ) -> str:
+        """Ejecuta la operación y devuelve el id del objeto afectado."""
+        ps, ts = self.ps, self.ts
+        pid, tid, sid, data = op.project_id, op.task_id, op.subtask_id, op.data
+        action = op.op
+        if action == BatchAction.create_project:
+            return ps.create({**data, "id": pid}, user).id
+        if action == BatchAction.update_project:
+            return ps.update(pid, data, user).id
+        if action == BatchAction.close_project:
+            return ps.close(pid, user).id
+        if action == BatchAction.delete_project:
+            return ps.delete(pid, user).id
+        if action in (BatchAction.add_task, BatchAction.add_subtask):
+            if "id" not in data:
+                raise ValueError("Falta 'id' en data")
+        if action == BatchAction.add_task:
+            return ts.add_task(pid, data, user).id
+        if tid is None:
+            raise ValueError("Falta task_id")
+        if action == BatchAction.update_task:
+            return ts.update_task(pid, tid, data, user).id
+        if action == BatchAction.close_task:
+            return ts.close_task(pid, tid, user).id
+        if action == BatchAction.delete_task:
+            ts.delete_task(pid, tid, user)
+            return tid
+        if action == BatchAction.add_subtask:
+            return ts.add_subtask(pid, tid, data, user).id
+        if sid is None:
+            raise ValueError("Falta subtask_id")
+        if action == BatchAction.update_subtask:
+            return ts.update_subtask(pid, tid, sid, data, user).id
+        if action == BatchAction.close_subtask:
+            return ts.close_subtask(pid, tid, sid, user).id
+        ts.delete_subtask(pid, tid, sid, user)
+        return sid
+
+    def apply(
+        self,
+        operations: List[BatchOperation],
+        user: str,
+    ) -> List[BatchResult]:
+        """Todo o nada: un único persist y un solo lote de historial por
+        proyecto. Lanza ``BatchError`` con la primera operación fallida."""
+        results = []
+        with self.ps.transaction():
+            for index, op in enumerate(operations):
+                self.ps.track(op.project_id)
+                try:
+                    target = self._apply(op, user)
+                except (KeyError, ValueError) as e:
+                    raise BatchError(index, e) from e
+                results.append(BatchResult(index=index, op=op.op, id=target))
+        return results
@@ -0,0 +1,274 @@
+# =============================================================
+# file: bus.py
+# =============================================================
+import logging
+import os
+import threading
+from collections import deque
+from typing import Callable, Deque, List, Optional, Tuple, Type, Union
+
+from .models import Project, Subtask, Task
+
+logger = logging.getLogger("events")
+
+# Eventos en espera por suscriptor asíncrono; si se llena, se descartan y
+# el suscriptor recibe ``EventsLost``
+BUS_QUEUE = int(os.environ.get("TASKFLOW_BUS_QUEUE", "10000"))
+
+
+# ---------- Eventos de dominio ---------- #
+
+
+class DomainEvent:
+    """Cambio ya aplicado en memoria a un proyecto, con su revisión nueva.
+
+    Los objetos (``project``, ``task``...) son los vivos del servicio: un
+    suscriptor asíncrono puede verlos ya con cambios posteriores.
+    """
+
+    def __init__(
+        self,
+        project_id: str,
+    ):
+        self.project_id = project_id
+        self.revision = 0
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.project_id!r}, r{self.revision})"
+
+
+class ProjectEvent(DomainEvent):
+    """``deep``: pueden haber cambiado también todas sus tareas."""
+
+    def __init__(
+        self,
+        project_id: str,
+        project: Optional[Project],
+        deep: bool = True,
+    ):
+        super().__init__(project_id)
+        self.project = project
+        self.deep = deep or project is None
+
+
+class ProjectCreated(ProjectEvent):
+    pass
+
+
+class ProjectUpdated(ProjectEvent):
+    pass
+
+
+class ProjectDeleted(ProjectEvent):
+    pass
+
+
+class ProjectReplaced(ProjectEvent):
+    """El proyecto entero cambia de golpe (``project`` None si ya no
+    existe): deshacer una transacción o recargarlo tras cambiarlo otro
+    proceso."""
+
+
+class TaskEvent(DomainEvent):
+    def __init__(
+        self,
+        project: Project,
+        task_id: str,
+        task: Optional[Task],
+    ):
+        super().__init__(project.id)
+        self.project = project
+        self.task_id = task_id
+        self.task = task
+
+
+class TaskCreated(TaskEvent):
+    pass
+
+
+class TaskUpdated(TaskEvent):
+    pass
+
+
+class TaskDeleted(TaskEvent):
+    pass
+
+
+class SubtaskEvent(TaskEvent):
+    """``task`` es la tarea que la contiene, ya con el cambio."""
+
+    def __init__(
+        self,
+        project: Project,
+        task_id: str,
+        task: Task,
+        subtask_id: str,
+        subtask: Optional[Subtask],
+    ):
+        super().__init__(project, task_id, task)
+        self.subtask_id = subtask_id
+        self.subtask = subtask
+
+
+class SubtaskCreated(SubtaskEvent):
+    pass
+
+
+class SubtaskUpdated(SubtaskEvent):
+    pass
+
+
+class SubtaskDeleted(SubtaskEvent):
+    pass
+
+
+class EventsLost:
+    """Solo para suscriptores asíncronos: su cola se llenó y se han
+    descartado eventos. Deben reconstruir su estado desde cero."""
+
+    def __repr__(self) -> str:
+        return "EventsLost()"
+
+
+Handler = Callable[[Union[DomainEvent, EventsLost]], None]
+EventTypes = Tuple[Type[DomainEvent], ...]
+
+
+# ---------- Bus ---------- #
+
+
+class AsyncSubscriber:
+    """Cola acotada y un hilo que entrega los eventos de uno en uno."""
+
+    def __init__(
+        self,
+        handler: Handler,
+        types: EventTypes,
+        maxsize: int = BUS_QUEUE,
+    ):
+        self.handler = handler
+        self.types = types
+        self.maxsize = maxsize
+        self._events: Deque[Union[DomainEvent, EventsLost]] = deque()
+        self._cond = threading.Condition()
+        # Eventos recibidos y ya entregados (o descartados)
+        self._received = 0
+        self._done = 0
+        self._closed = False
+        self._worker = threading.Thread(
+            target=self._run,
+            name=f"bus-{getattr(handler, '__qualname__', 'handler')}",
+            daemon=True,
+        )
+        self._worker.start()
+
+    def put(
+        self,
+        event: DomainEvent,
+    ):
+        with self._cond:
+            if self._closed:
+                return
+            if len(self._events) >= self.maxsize:
+                # Nunca se espera al suscriptor: se descarta lo pendiente
+                self._done += len(self._events)
+                self._events.clear()
+                self._events.append(EventsLost())
+                self._received += 1
+            self._events.append(event)
+            self._received += 1
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not (self._events or self._closed):
+                    self._cond.wait()
+                if not self._events:
+                    return
+                event = self._events.popleft()
+            try:
+                self.handler(event)
+            except Exception:
+                logger.exception("Fallo en %s", self._worker.name)
+            finally:
+                with self._cond:
+                    self._done += 1
+                    self._cond.notify_all()
+
+    def join(self):
+        """Espera a que se haya entregado lo encolado hasta ahora (no lo
+        que llegue mientras)."""
+        with self._cond:
+            target = self._received
+            while self._done < target and self._worker.is_alive():
+                self._cond.wait()
+
+    def close(self):
+        """Entrega lo pendiente y para el hilo."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join()
+
+
+class EventBus:
+    """Bus de eventos de dominio de ``ProjectService``.
+
+    - Suscriptores síncronos: se llaman al publicar, dentro de la mutación
+      (y de su transacción), con el lock de escritura del proyecto y
+      ``locks.shared`` tomados. Para lo que debe quedar al día antes de
+      responder, como los índices; han de ser rápidos y no esperar a
+      ningún otro proyecto.
+    - Suscriptores asíncronos: cada uno en su hilo con su cola acotada,
+      fuera de la petición. Reciben los eventos ya confirmados
+      (``dispatch``, tras el commit) y en orden.
+    """
+
+    def __init__(self):
+        self._sync: List[Tuple[EventTypes, Handler]] = []
+        self._async: List[AsyncSubscriber] = []
+
+    def subscribe(
+        self,
+        handler: Handler,
+        *types: Type[DomainEvent],
+        asynchronous: bool = False,
+        maxsize: int = BUS_QUEUE,
+    ) -> Optional[AsyncSubscriber]:
+        """``handler`` recibe los eventos de ``types`` (por defecto, todos)
+        y de sus subclases."""
+        types = types or (DomainEvent,)
+        if not asynchronous:
+            self._sync.append((types, handler))
+            return None
+        subscriber = AsyncSubscriber(handler, types, maxsize)
+        self._async.append(subscriber)
+        return subscriber
+
+    def publish(
+        self,
+        event: DomainEvent,
+    ):
+        """Entrega a los suscriptores síncronos."""
+        for types, handler in self._sync:
+            if isinstance(event, types):
+                handler(event)
+
+    def dispatch(
+        self,
+        event: DomainEvent,
+    ):
+        """Encola para los asíncronos, una vez confirmado el cambio."""
+        for subscriber in self._async:
+            if isinstance(event, subscriber.types):
+                subscriber.put(event)
+
+    def join(self):
+        """Espera a que los asíncronos reciban lo ya despachado."""
+        for subscriber in self._async:
+            subscriber.join()
+
+    def close(self):
+        for subscriber in self._async:
+            subscriber.close()
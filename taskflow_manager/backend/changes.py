@@ -0,0 +1,164 @@
+# =============================================================
+# file: changes.py
+# =============================================================
+import json
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .events import Event
+from .project_service import ProjectService
+from .views import model_json
+
+# Clave de una entidad: (project_id,), (project_id, task_id) o
+# (project_id, task_id, subtask_id)
+Key = Tuple[str, ...]
+
+# Campos propios de un proyecto, sin sus tareas ni historial
+PROJECT_FIELDS_EXCLUDE = {"tasks", "history"}
+
+
+def cursor(
+    ps: ProjectService,
+    seq: int,
+) -> str:
+    # Los ``seq`` empiezan de cero en cada proceso, como las revisiones en
+    # los ETag: ``instance`` los distingue
+    return f"{ps.instance}-{seq}"
+
+
+def _parse_cursor(
+    ps: ProjectService,
+    since: str,
+) -> Optional[int]:
+    instance, _, seq = since.rpartition("-")
+    if not seq.isdigit():
+        raise ValueError(f"Cursor no válido: {since}")
+    return int(seq) if instance == ps.instance else None
+
+
+def _key(
+    event: Event,
+) -> Key:
+    return tuple(
+        event[name] for name in ("project", "task", "subtask") if name in event
+    )
+
+
+def _whole(
+    event: Optional[Event],
+) -> bool:
+    # La entrada incluye (o borra) todo lo que cuelga de ella: una tarea
+    # lleva sus subtareas y un proyecto profundo, sus tareas
+    if event is None:
+        return False
+    if event["type"] != "project":
+        return True
+    return event["deep"] or event["op"] == "delete"
+
+
+def compact(
+    events: Iterable[Event],
+) -> List[Tuple[int, Event]]:
+    """Un evento por entidad (el último) junto al ``seq`` del primero que
+    resume, por orden de este; se omite lo que ya va dentro de una entrada
+    de su proyecto o tarea."""
+    latest: Dict[Key, Event] = {}
+    first: Dict[Key, int] = {}
+    # Entradas que cuelgan de cada proyecto o tarea, a cualquier nivel
+    descendants: Dict[Key, Set[Key]] = {}
+
+    def drop(key: Key):
+        for child in descendants.pop(key, ()):
+            latest.pop(child, None)
+            first.pop(child, None)
+            descendants.pop(child, None)
+
+    for event in events:
+        key = _key(event)
+        if any(_whole(latest.get(key[:i])) for i in range(1, len(key))):
+            continue
+        previous = latest.get(key)
+        if _whole(event):
+            drop(key)
+        elif _whole(previous) and event["op"] == "put":
+            # Cambio de los campos del proyecto tras uno profundo
+            event = {**event, "deep": True}
+        # Una entidad ya presente conserva su posición
+        latest[key] = event
+        first.setdefault(key, event["seq"])
+        for i in range(1, len(key)):
+            descendants.setdefault(key[:i], set()).add(key)
+    return [(first[key], event) for key, event in latest.items()]
+
+
+def _entry(
+    ps: ProjectService,
+    event: Event,
+) -> bytes:
+    """La entidad tal como está ahora, o su tombstone si ya no existe."""
+    key = _key(event)
+    project_id = key[0]
+    entry = {"type": event["type"]}
+    entry.update(zip(("project", "task", "subtask"), key))
+    data = None
+    with ps.locks.read(project_id):
+        project = ps.projects.get(project_id)
+        if project is not None and len(key) == 1:
+            entry["revision"] = ps.revision(project_id)
+            if event["deep"]:
+                data = ps.project_json(project_id)
+            else:
+                data = model_json(project, exclude=PROJECT_FIELDS_EXCLUDE)
+        elif project is not None:
+            entry["revision"] = ps.task_revision(project_id, key[1])
+            index = ps.task_index(project_id)
+            obj = index.get_task(key[1])
+            if obj is not None and len(key) == 3:
+                obj = index.get_subtask(obj, key[2])
+            if obj is not None:
+                data = model_json(obj)
+    if project is None:
+        entry["revision"] = ps.revision(project_id)
+    entry["op"] = "delete" if data is None else "put"
+    head = json.dumps(entry).encode()
+    if data is None:
+        return head
+    return head[:-1] + b', "data": ' + data + b"}"
+
+
+def changes_json(
+    ps: ProjectService,
+    since: Optional[str] = None,
+    projects: Optional[List[str]] = None,
+    limit: int = 500,
+) -> bytes:
+    """Lo creado, cambiado o borrado (tombstones) después del cursor
+    ``since``, con el estado actual de cada entidad.
+
+    Responde ``resync`` (y un cursor para empezar) si no hay cursor, si es
+    de otro proceso o si los cambios posteriores ya han salido del
+    registro acotado de eventos: hay que volver a cargarlo todo. Con
+    ``more``, quedan cambios: se piden con el ``cursor`` devuelto.
+    """
+    seq = None if since is None else _parse_cursor(ps, since)
+    # El registro se llena desde el hilo del bus: se espera a lo ya
+    # confirmado para que el cliente vea sus propios cambios
+    ps.bus.join()
+    if seq is None:
+        last, events = ps.events.last, None
+    else:
+        last, events = ps.events.since(seq)
+    result = {"cursor": cursor(ps, last), "resync": events is None}
+    if events is None:
+        return json.dumps({**result, "more": False, "changes": []}).encode()
+    if projects is not None:
+        wanted = set(projects)
+        events = [e for e in events if e["project"] in wanted]
+    entries = compact(events)
+    more = len(entries) > limit
+    if more:
+        # Todo evento hasta el cursor va en alguna entrada de esta página
+        result["cursor"] = cursor(ps, entries[limit][0] - 1)
+        entries = entries[:limit]
+    head = json.dumps({**result, "more": more, "changes": []}).encode()
+    parts = b",".join(_entry(ps, event) for _, event in entries)
+    return head[:-2] + parts + b"]}"
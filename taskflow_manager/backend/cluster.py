@@ -0,0 +1,285 @@
+# =============================================================
+# file: cluster.py
+# =============================================================
+import fcntl
+import json
+import os
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .persistence import DATA_DIR, STORAGE_MODE, WRITE_BEHIND
+
+# Procesos de la API sobre el mismo almacenamiento (``serve --workers``)
+WORKERS = int(os.environ.get("TASKFLOW_WORKERS", "1"))
+CLUSTER_DIR = DATA_DIR / "cluster"
+# Bytes del registro de cambios a partir de los que se compacta
+CHANGES_LIMIT = int(os.environ.get("TASKFLOW_CHANGES_LIMIT", str(1 << 20)))
+
+# Backends que varios procesos pueden compartir: SQLite se coordina solo y
+# los shards son un fichero por proyecto
+SHARED_MODES = ("sqlite", "sharded")
+
+# Rangos de un byte del fichero de locks (``lockf``)
+TRANSACTIONS_SLOT = 0
+LOG_SLOT = 1
+MANIFEST_SLOT = 2
+PROJECT_SLOTS = 1024
+FIRST_PROJECT_SLOT = 3
+
+# Cambio de un proyecto publicado por un proceso:
+#   {"p": project_id, "r": revisión, "b": revisión base de todas las
+#    tareas (cambio profundo) o None, "t": {task_id: revisión}, "w": autor}
+Change = dict
+
+
+def check_shared(
+    mode: str = STORAGE_MODE,
+    write_behind: bool = WRITE_BEHIND,
+):
+    """``ValueError`` si la configuración no admite varios procesos."""
+    if mode not in SHARED_MODES:
+        raise ValueError(
+            f"TASKFLOW_STORAGE={mode} no admite varios procesos: el fichero "
+            f"JSON único tiene un solo escritor. Usa "
+            f"{' o '.join(SHARED_MODES)}"
+        )
+    if write_behind:
+        raise ValueError(
+            "TASKFLOW_WRITE_BEHIND no admite varios procesos: los demás "
+            "leerían del disco antes de que llegue cada cambio"
+        )
+
+
+def record_change(
+    changes: Dict[str, Change],
+    project_id: str,
+    revision: int,
+    task_id: Optional[str] = None,
+    deep: bool = False,
+):
+    """Acumula en ``changes`` un ``_touch`` del proyecto."""
+    change = changes.setdefault(
+        project_id,
+        {"p": project_id, "r": revision, "b": None, "t": {}},
+    )
+    change["r"] = revision
+    if deep:
+        change["b"] = revision
+        change["t"] = {}
+    elif task_id is not None:
+        change["t"][task_id] = revision
+
+
+def merge_change(
+    old: Optional[Change],
+    new: Change,
+) -> Change:
+    """Un cambio equivalente a aplicar ``old`` y después ``new``."""
+    if old is None or new["b"] is not None:
+        return new
+    return {
+        **new,
+        "b": old["b"],
+        "t": {**old["t"], **new["t"]},
+    }
+
+
+class ClusterSync:
+    """Coordinación entre los procesos que comparten un almacenamiento.
+
+    - Locks entre procesos con ``lockf`` sobre rangos de ``lock``: uno por
+      proyecto (por hash, ``PROJECT_SLOTS`` rangos), otro para las
+      transacciones, otro para el registro de cambios y otro para el
+      manifiesto de los shards. Cada rango lleva además un lock de hilo:
+      los de ``lockf`` son por proceso.
+    - ``changes.log``: cada proceso añade una línea por proyecto que
+      modifica (con su revisión nueva) al soltar el lock del proyecto, ya
+      escrito en disco. Los demás leen lo nuevo y recargan solo esos
+      proyectos. La primera línea guarda el ``epoch`` común de los ETag y
+      cuántas veces se ha compactado (a un cambio por proyecto, pasado
+      ``CHANGES_LIMIT``): así se sabe que hay que releerlo desde el
+      principio, aunque el fichero nuevo reutilice el inodo del anterior.
+    """
+
+    def __init__(
+        self,
+        directory: Path = CLUSTER_DIR,
+        limit: int = CHANGES_LIMIT,
+    ):
+        directory.mkdir(parents=True, exist_ok=True)
+        self.log_path = directory / "changes.log"
+        self.limit = limit
+        self.worker = f"{os.getpid()}-{format(time.time_ns(), 'x')}"
+        # Nunca se cierra: cerrar cualquier descriptor del fichero soltaría
+        # todos los locks del proceso
+        self._fd = os.open(directory / "lock", os.O_RDWR | os.O_CREAT)
+        self._slots = [
+            threading.Lock() for _ in range(FIRST_PROJECT_SLOT + PROJECT_SLOTS)
+        ]
+        # Lectura del registro: cabecera, posición, último ``stat`` visto y
+        # cambios aún sin aplicar
+        self._guard = threading.Lock()
+        self._header = b""
+        self._offset = 0
+        self._seen: Optional[tuple] = None
+        self._pending: Dict[str, Change] = {}
+        self.epoch = self._init_log()
+
+    # ---------- Locks ---------- #
+
+    def _lock(
+        self,
+        slot: int,
+    ):
+        self._slots[slot].acquire()
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, slot)
+        except BaseException:
+            self._slots[slot].release()
+            raise
+
+    def _unlock(
+        self,
+        slot: int,
+    ):
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, slot)
+        finally:
+            self._slots[slot].release()
+
+    @staticmethod
+    def _project_slot(
+        project_id: str,
+    ) -> int:
+        slot = zlib.crc32(project_id.encode()) % PROJECT_SLOTS
+        return FIRST_PROJECT_SLOT + slot
+
+    def lock_project(
+        self,
+        project_id: str,
+    ):
+        self._lock(self._project_slot(project_id))
+
+    def unlock_project(
+        self,
+        project_id: str,
+    ):
+        self._unlock(self._project_slot(project_id))
+
+    def lock_transactions(self):
+        self._lock(TRANSACTIONS_SLOT)
+
+    def unlock_transactions(self):
+        self._unlock(TRANSACTIONS_SLOT)
+
+    def lock_manifest(self):
+        self._lock(MANIFEST_SLOT)
+
+    def unlock_manifest(self):
+        self._unlock(MANIFEST_SLOT)
+
+    # ---------- Registro de cambios ---------- #
+
+    def _init_log(self) -> str:
+        self._lock(LOG_SLOT)
+        try:
+            if not self.log_path.exists() or not self.log_path.stat().st_size:
+                header = {"epoch": format(time.time_ns(), "x"), "c": 0}
+                self.log_path.write_text(json.dumps(header) + "\n")
+            with self.log_path.open("rb") as f:
+                return json.loads(f.readline())["epoch"]
+        finally:
+            self._unlock(LOG_SLOT)
+
+    def publish(
+        self,
+        change: Change,
+    ):
+        """Añade el cambio al registro (con el lock del proyecto tomado)."""
+        line = json.dumps({**change, "w": self.worker}) + "\n"
+        self._lock(LOG_SLOT)
+        try:
+            # Se abre cada vez: otro proceso puede haberlo compactado
+            with self.log_path.open("ab") as f:
+                f.write(line.encode())
+                size = f.tell()
+            if size > self.limit:
+                self._compact()
+        finally:
+            self._unlock(LOG_SLOT)
+
+    def _compact(self):
+        with self.log_path.open("rb") as f:
+            header = json.loads(f.readline())
+            latest: Dict[str, Change] = {}
+            for line in f:
+                change = json.loads(line)
+                previous = latest.get(change["p"])
+                latest[change["p"]] = merge_change(previous, change)
+        tmp = self.log_path.with_suffix(".tmp")
+        with tmp.open("wb") as f:
+            header["c"] += 1
+            f.write(json.dumps(header).encode() + b"\n")
+            for change in latest.values():
+                f.write(json.dumps(change).encode() + b"\n")
+        os.replace(tmp, self.log_path)
+
+    def changed(self) -> bool:
+        """Barato (un ``stat``): ¿hay cambios de otros sin aplicar?"""
+        if self._pending:
+            return True
+        try:
+            stat = os.stat(self.log_path)
+        except FileNotFoundError:
+            return False
+        return self._seen != (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def poll(self):
+        """Lee las líneas nuevas del registro y acumula los cambios de otros
+        procesos; tras una compactación se relee desde el principio."""
+        with self._guard:
+            # Si se compacta entre medias se sigue leyendo el ya abierto
+            with self.log_path.open("rb") as f:
+                stat = os.fstat(f.fileno())
+                self._seen = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+                header = f.readline()
+                if header != self._header:
+                    self._header, self._offset = header, len(header)
+                f.seek(self._offset)
+                data = f.read()
+            # Una línea a medio escribir se lee en la siguiente pasada
+            end = data.rfind(b"\n") + 1
+            self._offset += end
+            for line in data[:end].splitlines():
+                change = json.loads(line)
+                if change.get("w") == self.worker:
+                    continue
+                project_id = change["p"]
+                self._pending[project_id] = merge_change(
+                    self._pending.get(project_id),
+                    change,
+                )
+
+    def pending(self) -> List[str]:
+        """Proyectos con cambios de otros procesos por aplicar."""
+        with self._guard:
+            return list(self._pending)
+
+    def take(
+        self,
+        project_id: str,
+    ) -> Optional[Change]:
+        """Saca el cambio pendiente del proyecto (con su lock tomado)."""
+        with self._guard:
+            return self._pending.pop(project_id, None)
+
+
+def get_cluster() -> Optional[ClusterSync]:
+    """``ClusterSync`` si la API corre en varios procesos."""
+    if WORKERS <= 1:
+        return None
+    check_shared()
+    return ClusterSync()
@@ -0,0 +1,294 @@
+# =============================================================
+# file: custom_fields.py
+# =============================================================
+import operator
+import re
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from .indexes import ServiceIndex
+from .models import CustomFieldSchema, FieldIndexKind, FieldType, Project, Task
+
+OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+_VALUE = operator.itemgetter(0)
+_AND = re.compile(r"\s+AND\s+", re.IGNORECASE)
+_CONDITION = re.compile(r"^\s*([\w.-]+)\s*(!=|>=|<=|=|>|<)\s*(.*?)\s*$")
+
+
+class Condition(NamedTuple):
+    field: str
+    op: str
+    value: Any
+
+
+def parse_filter(
+    text: str,
+) -> List[Condition]:
+    """``"sprint=42 AND estimate>5"`` -> lista de condiciones (valores en
+    texto, sin tipar)."""
+    conditions = []
+    for part in _AND.split(text.strip()):
+        match = _CONDITION.match(part)
+        if not match or not match.group(3):
+            raise ValueError(f"Condición no válida: {part!r}")
+        field, op, value = match.groups()
+        conditions.append(Condition(field, op, value.strip("'\"")))
+    return conditions
+
+
+# ---------- Tipos ---------- #
+
+
+def coerce(
+    schema: CustomFieldSchema,
+    value: Any,
+) -> Any:
+    """Valor tipado según el esquema; ``ValueError`` si no encaja."""
+    kind = schema.type
+    if kind == FieldType.int:
+        if isinstance(value, bool) or (
+            isinstance(value, float) and not value.is_integer()
+        ):
+            raise ValueError(f"{value!r} no es un entero")
+        return int(value)
+    if kind == FieldType.float:
+        if isinstance(value, bool):
+            raise ValueError(f"{value!r} no es un número")
+        return float(value)
+    if kind == FieldType.date:
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        return date.fromisoformat(str(value)[:10])
+    value = str(value)
+    if kind == FieldType.enum and value not in schema.values:
+        raise ValueError(f"{value!r} no está en {schema.values}")
+    return value
+
+
+def _stored(
+    value: Any,
+) -> Any:
+    # Forma JSON con la que se guarda en campos_personalizados
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def normalize(
+    schemas: Dict[str, CustomFieldSchema],
+    values: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Valida y normaliza los campos con esquema; el resto pasa tal cual."""
+    result = dict(values)
+    for name, value in values.items():
+        schema = schemas.get(name)
+        if schema is None or value is None:
+            continue
+        try:
+            result[name] = _stored(coerce(schema, value))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Campo '{name}': {e}")
+    return result
+
+
+def _untyped(
+    value: Any,
+) -> Any:
+    # Sin esquema: número si lo parece, texto en otro caso
+    if isinstance(value, str):
+        for kind in (int, float):
+            try:
+                return kind(value)
+            except ValueError:
+                pass
+    return value
+
+
+def _typed(
+    schema: Optional[CustomFieldSchema],
+    value: Any,
+) -> Any:
+    if schema is None:
+        return _untyped(value)
+    try:
+        return coerce(schema, value)
+    except (TypeError, ValueError):
+        return None
+
+
+def matches(
+    task: Task,
+    condition: Condition,
+    schema: Optional[CustomFieldSchema],
+) -> bool:
+    value = task.custom_fields.get(condition.field)
+    if value is None:
+        return condition.op == "!="
+    value = _typed(schema, value)
+    try:
+        return OPERATORS[condition.op](value, condition.value)
+    except TypeError:
+        # Tipos no comparables (p. ej. texto contra número)
+        return False
+
+
+def type_conditions(
+    schemas: Dict[str, CustomFieldSchema],
+    conditions: List[Condition],
+) -> List[Condition]:
+    """Tipa el valor de cada condición con el esquema de su campo."""
+    typed = []
+    for condition in conditions:
+        schema = schemas.get(condition.field)
+        if schema is None:
+            value = _untyped(condition.value)
+        else:
+            try:
+                value = coerce(schema, condition.value)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Campo '{condition.field}': {e}")
+        typed.append(condition._replace(value=value))
+    return typed
+
+
+# ---------- Índice ---------- #
+
+
+class CustomFieldIndex(ServiceIndex):
+    """Índices hash (igualdad) y ordenados (rangos) por campo y proyecto.
+
+    Solo se indexan los campos cuyo esquema declara ``index``; al cambiar
+    los esquemas de un proyecto se reindexan sus tareas.
+    """
+
+    def __init__(self):
+        self._schemas: Dict[str, Dict[str, CustomFieldSchema]] = {}
+        # (project_id, campo) -> valor -> ids de tarea
+        self._hash: Dict[Tuple[str, str], Dict[Any, Set[str]]] = {}
+        # (project_id, campo) -> [(valor, task_id)] ordenado
+        self._sorted: Dict[Tuple[str, str], List[Tuple[Any, str]]] = {}
+        # (project_id, task_id) -> [(campo, valor, tipo de índice)]
+        self._entries: Dict[Tuple[str, str], List[tuple]] = {}
+        super().__init__()
+
+    def project_changed(
+        self,
+        project_id: str,
+        project: Optional[Project],
+        deep: bool,
+    ):
+        if project is not None and not deep:
+            # Un cambio de esquemas obliga a reindexar las tareas
+            deep = self._schemas.get(project_id) != project.field_schemas
+        super().project_changed(project_id, project, deep)
+
+    def _index_project(
+        self,
+        project: Project,
+    ):
+        self._schemas[project.id] = dict(project.field_schemas)
+
+    def _unindex_project(
+        self,
+        project_id: str,
+    ):
+        self._schemas.pop(project_id, None)
+
+    def _index_task(
+        self,
+        project: Project,
+        task: Task,
+    ):
+        entries = []
+        for name, schema in project.field_schemas.items():
+            if schema.index is None or name not in task.custom_fields:
+                continue
+            value = _typed(schema, task.custom_fields[name])
+            if value is None:
+                continue
+            key = (project.id, name)
+            if schema.index == FieldIndexKind.hash:
+                values = self._hash.setdefault(key, {})
+                values.setdefault(value, set()).add(task.id)
+            else:
+                insort(self._sorted.setdefault(key, []), (value, task.id))
+            entries.append((name, value, schema.index))
+        self._entries[(project.id, task.id)] = entries
+
+    def _unindex_task(
+        self,
+        project_id: str,
+        task_id: str,
+    ):
+        entries = self._entries.pop((project_id, task_id), [])
+        for name, value, kind in entries:
+            key = (project_id, name)
+            if kind == FieldIndexKind.hash:
+                values = self._hash[key]
+                values[value].discard(task_id)
+                if not values[value]:
+                    del values[value]
+                if not values:
+                    del self._hash[key]
+            else:
+                items = self._sorted[key]
+                del items[bisect_left(items, (value, task_id))]
+                if not items:
+                    del self._sorted[key]
+
+    def _lookup(
+        self,
+        project_id: str,
+        condition: Condition,
+    ) -> Optional[List[str]]:
+        schema = self._schemas.get(project_id, {}).get(condition.field)
+        kind = schema.index if schema is not None else None
+        key = (project_id, condition.field)
+        if kind == FieldIndexKind.hash and condition.op == "=":
+            return sorted(self._hash.get(key, {}).get(condition.value, ()))
+        if kind != FieldIndexKind.sorted or condition.op == "!=":
+            return None
+        items = self._sorted.get(key, [])
+        lo, hi = 0, len(items)
+        value = condition.value
+        if condition.op in ("=", ">="):
+            lo = bisect_left(items, value, key=_VALUE)
+        elif condition.op == ">":
+            lo = bisect_right(items, value, key=_VALUE)
+        if condition.op in ("=", "<="):
+            hi = bisect_right(items, value, key=_VALUE)
+        elif condition.op == "<":
+            hi = bisect_left(items, value, key=_VALUE)
+        return [task_id for _, task_id in items[lo:hi]]
+
+    def candidates(
+        self,
+        project_id: str,
+        conditions: List[Condition],
+    ) -> Tuple[Optional[List[str]], List[Condition]]:
+        """Tareas que cumplen las condiciones indexadas (``None`` si no hay
+        ninguna) y las condiciones que quedan por comprobar."""
+        result: Optional[List[str]] = None
+        residual = []
+        for condition in conditions:
+            try:
+                ids = self._lookup(project_id, condition)
+            except TypeError:
+                ids = None
+            if ids is None:
+                residual.append(condition)
+            elif result is None:
+                result = ids
+            else:
+                keep = set(ids)
+                result = [task_id for task_id in result if task_id in keep]
+        return result, residual
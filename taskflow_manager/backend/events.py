@@ -0,0 +1,234 @@
+# =============================================================
+# file: events.py
+# =============================================================
+import asyncio
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from .bus import DomainEvent, EventsLost, ProjectEvent, SubtaskEvent
+
+# Eventos por cliente en espera de enviarse; si se llena, el cliente es
+# demasiado lento y se le pide que vuelva a cargar
+EVENTS_QUEUE = int(os.environ.get("TASKFLOW_EVENTS_QUEUE", "1000"))
+# Segundos sin eventos tras los que se manda un keep-alive
+KEEPALIVE = 15.0
+# Últimos eventos que se conservan para ``GET /changes``
+CHANGELOG_SIZE = int(os.environ.get("TASKFLOW_CHANGELOG_SIZE", "10000"))
+
+# Cambio persistido, tal como se publica a los clientes en vivo:
+#   {"seq": n, "project": id, "revision": r, "type": "project" | "task" |
+#    "subtask", "op": "put" | "delete", "task": id, "subtask": id,
+#    "deep": bool}
+# ``task``/``subtask`` solo en los de ese tipo; ``deep`` solo en los de
+# proyecto (True si pudieron cambiar todas sus tareas)
+Event = dict
+
+
+def feed_event(
+    event: DomainEvent,
+) -> Event:
+    """Versión compacta (ids y revisión) de un evento de dominio."""
+    data: Event = {"project": event.project_id, "revision": event.revision}
+    if isinstance(event, ProjectEvent):
+        current = event.project
+        data.update(type="project", deep=event.deep)
+    elif isinstance(event, SubtaskEvent):
+        current = event.subtask
+        data.update(
+            type="subtask",
+            task=event.task_id,
+            subtask=event.subtask_id,
+        )
+    else:
+        current = event.task
+        data.update(type="task", task=event.task_id)
+    data["op"] = "delete" if current is None else "put"
+    return data
+
+
+class Subscription:
+    """Cola acotada de eventos de un cliente (SSE o WebSocket).
+
+    ``projects`` filtra por proyecto (None: todos) y se puede cambiar en
+    cualquier momento. Si la cola se llena, se vacía y queda solo un
+    evento ``resync``: el cliente debe volver a cargar lo que muestra.
+    """
+
+    def __init__(
+        self,
+        feed: "EventFeed",
+        projects: Optional[Iterable[str]] = None,
+        maxsize: int = EVENTS_QUEUE,
+    ):
+        self.feed = feed
+        self.projects: Optional[Set[str]] = None
+        if projects:
+            self.projects = set(projects)
+        self.loop = asyncio.get_running_loop()
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(maxsize)
+        self.closed = False
+
+    def matches(
+        self,
+        event: Event,
+    ) -> bool:
+        projects = self.projects
+        return projects is None or event["project"] in projects
+
+    def _put(
+        self,
+        event: Event,
+    ):
+        # Siempre en el loop del cliente
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"seq": event["seq"], "type": "resync"})
+            self.closed = True
+
+    async def stream(
+        self,
+        interval: float = KEEPALIVE,
+        on_idle: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> AsyncIterator[Optional[Event]]:
+        """Eventos según llegan; ``None`` tras ``KEEPALIVE`` segundos sin
+        ninguno. Sin eventos se llama a ``on_idle`` cada ``interval``
+        segundos. Termina después de un ``resync``."""
+        last = time.monotonic()
+        while True:
+            try:
+                event = await asyncio.wait_for(self.queue.get(), interval)
+            except asyncio.TimeoutError:
+                if on_idle is not None:
+                    await on_idle()
+                if time.monotonic() - last >= KEEPALIVE:
+                    last = time.monotonic()
+                    yield None
+                continue
+            last = time.monotonic()
+            yield event
+            if event["type"] == "resync":
+                return
+
+    def close(self):
+        self.closed = True
+        self.feed.unsubscribe(self)
+
+
+class EventFeed:
+    """Reparte los cambios de ``ProjectService`` entre los clientes
+    suscritos.
+
+    Es un suscriptor asíncrono de su bus (``handle``): recibe los cambios
+    ya confirmados, en orden, fuera de la petición. ``publish`` solo
+    numera el evento y lo pasa al loop de cada cliente, sin esperar a
+    ninguno.
+
+    Los últimos ``CHANGELOG_SIZE`` eventos se conservan para quien se
+    sincroniza a intervalos (``since``) en lugar de quedarse escuchando.
+    """
+
+    def __init__(
+        self,
+        size: int = CHANGELOG_SIZE,
+    ):
+        self._lock = threading.Lock()
+        self._subscriptions: Set[Subscription] = set()
+        self._seq = itertools.count(1)
+        self._log: Deque[Event] = deque(maxlen=size)
+        self.last = 0
+
+    def subscribe(
+        self,
+        projects: Optional[Iterable[str]] = None,
+    ) -> Subscription:
+        """Nueva suscripción; hay que llamarlo desde el event loop."""
+        subscription = Subscription(self, projects)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(
+        self,
+        subscription: Subscription,
+    ):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def handle(
+        self,
+        event: Union[DomainEvent, EventsLost],
+    ):
+        if isinstance(event, EventsLost):
+            self.reset()
+        else:
+            self.publish(feed_event(event))
+
+    def reset(self):
+        """Se han perdido eventos: todos los clientes y cursores vuelven a
+        empezar (``resync``)."""
+        with self._lock:
+            self.last = next(self._seq)
+            self._log.clear()
+            for subscription in list(self._subscriptions):
+                try:
+                    subscription.loop.call_soon_threadsafe(
+                        subscription._put,
+                        {"seq": self.last, "type": "resync"},
+                    )
+                except RuntimeError:
+                    self._subscriptions.discard(subscription)
+
+    def publish(
+        self,
+        event: Event,
+    ):
+        # Numerar y encolar bajo el mismo lock: cada cliente recibe los
+        # eventos en orden de ``seq``
+        with self._lock:
+            event["seq"] = self.last = next(self._seq)
+            self._log.append(event)
+            for subscription in list(self._subscriptions):
+                if not subscription.matches(event):
+                    continue
+                try:
+                    subscription.loop.call_soon_threadsafe(
+                        subscription._put,
+                        event,
+                    )
+                except RuntimeError:
+                    # Loop ya cerrado: el cliente no llegó a darse de baja
+                    self._subscriptions.discard(subscription)
+
+    def since(
+        self,
+        seq: int,
+    ) -> Tuple[int, Optional[List[Event]]]:
+        """Último ``seq`` y los eventos posteriores a ``seq``; ``None`` si
+        alguno ya no está en el registro (o ``seq`` no es de aquí)."""
+        with self._lock:
+            last = self.last
+            first = self._log[0]["seq"] if self._log else last + 1
+            if not first - 1 <= seq <= last:
+                return last, None
+            start = seq - first + 1
+            return last, list(itertools.islice(self._log, start, None))
@@ -0,0 +1,129 @@
+# =============================================================
+# file: formats.py
+# =============================================================
+import gzip
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - dependencia opcional
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - dependencia opcional
+    zstandard = None
+
+# json: legible, indentado (formato histórico)
+# json-min: sin espacios; usa orjson si está instalado
+# msgpack: binario
+FORMATS = ("json", "json-min", "msgpack")
+COMPRESSIONS = ("none", "gzip", "zstd")
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def _require(module, name: str):
+    if module is None:
+        raise RuntimeError(
+            f"El paquete '{name}' no está instalado: "
+            f"pip install taskflow-manager[fast]"
+        )
+    return module
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+
+def encode(
+    obj: Any,
+    fmt: str = "json",
+    compression: Optional[str] = None,
+) -> bytes:
+    """Serializa ``obj`` en el formato y compresión indicados."""
+    if fmt == "json":
+        data = json.dumps(
+            obj,
+            ensure_ascii=False,
+            indent=2,
+            default=str,
+        ).encode("utf-8")
+    elif fmt == "json-min":
+        if orjson is not None:
+            data = orjson.dumps(obj, default=_default)
+        else:
+            data = json.dumps(
+                obj,
+                ensure_ascii=False,
+                separators=(",", ":"),
+                default=str,
+            ).encode("utf-8")
+    elif fmt == "msgpack":
+        data = _require(msgpack, "msgpack").packb(
+            obj,
+            default=_default,
+            use_bin_type=True,
+        )
+    else:
+        raise ValueError(f"Formato desconocido: {fmt}")
+
+    if compression in (None, "none"):
+        return data
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    if compression == "zstd":
+        return _require(zstandard, "zstandard").ZstdCompressor().compress(data)
+    raise ValueError(f"Compresión desconocida: {compression}")
+
+
+def _decompress(
+    data: bytes,
+) -> Tuple[bytes, str]:
+    if data.startswith(GZIP_MAGIC):
+        return gzip.decompress(data), "gzip"
+    if data.startswith(ZSTD_MAGIC):
+        decompressor = _require(zstandard, "zstandard").ZstdDecompressor()
+        return decompressor.decompressobj().decompress(data), "zstd"
+    return data, "none"
+
+
+def _is_json(
+    data: bytes,
+) -> bool:
+    return data.lstrip()[:1] in (b"[", b"{", b"")
+
+
+def decode(
+    data: bytes,
+) -> Any:
+    """Deserializa detectando compresión y formato por sus bytes mágicos."""
+    data, _ = _decompress(data)
+    if _is_json(data):
+        if orjson is not None:
+            return orjson.loads(data or b"null")
+        return json.loads(data or b"null")
+    return _require(msgpack, "msgpack").unpackb(data, raw=False)
+
+
+def detect(
+    data: bytes,
+) -> Tuple[str, str]:
+    """Devuelve ``(formato, compresión)`` de un documento serializado."""
+    data, compression = _decompress(data)
+    if not _is_json(data):
+        return "msgpack", compression
+    return ("json" if b"\n" in data[:64] else "json-min"), compression
@@ -0,0 +1,577 @@
+# =============================================================
+# file: graph.py
+# =============================================================
+import heapq
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .bus import DomainEvent, ProjectEvent, SubtaskEvent, TaskEvent
+from .intervals import naive_utc
+from .models import Project, Task
+
+ZERO = timedelta(0)
+
+# Planificación de una tarea: inicio y fin más tempranos, inicio y fin más
+# tardíos y holgura. Todo None si nada en el proyecto tiene fechas
+Schedule = Tuple[
+    Optional[datetime],
+    Optional[datetime],
+    Optional[datetime],
+    Optional[datetime],
+    Optional[timedelta],
+]
+
+
+def _span(
+    task: Task,
+) -> Tuple[Optional[datetime], timedelta]:
+    """Inicio planificado y duración (fin - inicio; cero si falta alguna
+    de las dos fechas)."""
+    start = naive_utc(task.start_date)
+    end = naive_utc(task.end_date)
+    if start is None or end is None:
+        return start, ZERO
+    return start, max(end - start, ZERO)
+
+
+def _invalid(
+    task_id: str,
+    dep: str,
+    existing,
+) -> str:
+    if dep == task_id:
+        return f"La tarea {task_id} depende de sí misma"
+    if dep not in existing:
+        return f"La tarea {task_id} depende de {dep}, que no existe"
+    return f"Dependencia circular entre {task_id} y {dep}"
+
+
+class DependencyGraph:
+    """Grafo de dependencias (``Task.dependencies``) de un proyecto y su
+    planificación por camino crítico.
+
+    Cada tarea tiene un rango y toda dependencia va de un rango menor a uno
+    mayor (orden topológico). Al añadir una dependencia que lo incumple se
+    reordena solo la zona entre ambas (Pearce-Kelly), y ahí mismo se ve si
+    cerraría un ciclo.
+
+    Las fechas no se recalculan en cada cambio: se anotan las tareas
+    cambiadas y la siguiente consulta (``refresh``) propaga todo lo
+    pendiente de una vez, en orden de rango, y se para en cuanto un valor
+    no cambia:
+
+    - hacia delante, el inicio más temprano: el máximo entre su fecha de
+      inicio y el fin más temprano de sus dependencias (sin ninguna de las
+      dos, el origen: el inicio del proyecto o, si no tiene, el primero de
+      sus tareas);
+    - hacia atrás, lo que queda desde su inicio hasta el final del camino
+      más largo que sale de ella (``tail``). El inicio más tardío es el fin
+      del proyecto menos ``tail``, así que un cambio del fin del proyecto
+      no obliga a recorrer nada.
+
+    Los datos guardados antes de validar dependencias pueden traer ids que
+    no existen o ciclos: esas dependencias no forman arista y quedan en
+    ``ignored``.
+    """
+
+    def __init__(
+        self,
+        project: Project,
+        strict: bool = False,
+    ):
+        self.deps: Dict[str, List[str]] = {}
+        self.dependents: Dict[str, Set[str]] = {}
+        self.rank: Dict[str, int] = {}
+        self.start: Dict[str, Optional[datetime]] = {}
+        self.duration: Dict[str, timedelta] = {}
+        self.earliest: Dict[str, Optional[datetime]] = {}
+        self.earliest_finish: Dict[str, Optional[datetime]] = {}
+        self.tail: Dict[str, timedelta] = {}
+        self.ignored: Dict[str, List[str]] = {}
+        # id que aún no existe -> tareas que dependen de él
+        self._missing: Dict[str, Set[str]] = {}
+        # Tareas por recalcular hacia delante y hacia atrás. Las consultas
+        # solo tienen el lock de lectura del proyecto: ``refresh`` se
+        # protege con ``_guard``
+        self._stale: Tuple[Set[str], Set[str]] = (set(), set())
+        self._guard = threading.Lock()
+        tasks = {task.id: task for task in project.tasks}
+        for task_id, task in tasks.items():
+            self.deps[task_id] = []
+            self.dependents[task_id] = set()
+            self.start[task_id], self.duration[task_id] = _span(task)
+        # Fechas de inicio ordenadas, para el origen
+        self._starts = sorted(filter(None, self.start.values()))
+        self._project_start = naive_utc(project.start_date)
+        self.origin = self._origin()
+        order = self._sort(tasks, strict)
+        self.rank = {task_id: i for i, task_id in enumerate(order)}
+        self._next_rank = len(order)
+        self._forward(order)
+        self._backward(order)
+
+    def _sort(
+        self,
+        tasks: Dict[str, Task],
+        strict: bool,
+    ) -> List[str]:
+        # DFS por las dependencias: cada tarea sale después de todas ellas.
+        # Una dependencia hacia una tarea aún en la pila cerraría un ciclo
+        order: List[str] = []
+        done: Set[str] = set()
+        for root in tasks:
+            if root in done:
+                continue
+            done.add(root)
+            path = {root}
+            stack = [(root, iter(dict.fromkeys(tasks[root].dependencies)))]
+            while stack:
+                task_id, deps = stack[-1]
+                for dep in deps:
+                    if dep not in tasks or dep in path:
+                        if strict:
+                            raise ValueError(_invalid(task_id, dep, tasks))
+                        self._ignore(task_id, dep)
+                        continue
+                    self.deps[task_id].append(dep)
+                    self.dependents[dep].add(task_id)
+                    if dep not in done:
+                        done.add(dep)
+                        path.add(dep)
+                        deps = iter(dict.fromkeys(tasks[dep].dependencies))
+                        stack.append((dep, deps))
+                        break
+                else:
+                    stack.pop()
+                    path.discard(task_id)
+                    order.append(task_id)
+        return order
+
+    def _ignore(
+        self,
+        task_id: str,
+        dep: str,
+    ):
+        self.ignored.setdefault(task_id, []).append(dep)
+        if dep not in self.deps:
+            self._missing.setdefault(dep, set()).add(task_id)
+
+    # ---------- Validación ---------- #
+
+    def check(
+        self,
+        task_id: str,
+        dependencies: Iterable[str],
+        new_id: Optional[str] = None,
+    ):
+        """``ValueError`` si dar a la tarea (nueva o no) estas dependencias
+        dejaría ids que no existen o un ciclo. Las que ya tenía guardadas se
+        aceptan tal cual; ``new_id`` es su id tras renombrarla."""
+        new_id = new_id or task_id
+        if new_id != task_id:
+            self.check_remove(task_id)
+        known = set(self.deps.get(task_id, ()))
+        known.update(self.ignored.get(task_id, ()))
+        for dep in dependencies:
+            if dep in known:
+                continue
+            if dep in (task_id, new_id) or dep not in self.rank:
+                raise ValueError(_invalid(new_id, dep, self.rank))
+            cycle = self._path(task_id, dep)
+            if cycle is not None:
+                raise ValueError(
+                    "Dependencia circular: " + " -> ".join(cycle + [task_id])
+                )
+
+    def check_remove(
+        self,
+        task_id: str,
+    ):
+        """``ValueError`` si otras tareas dependen de esta."""
+        dependents = self.dependents.get(task_id)
+        if dependents:
+            names = ", ".join(sorted(dependents))
+            raise ValueError(
+                f"Las tareas {names} dependen de {task_id}: quita antes "
+                f"esas dependencias"
+            )
+
+    def _path(
+        self,
+        source: str,
+        target: str,
+    ) -> Optional[List[str]]:
+        """Camino de dependientes de ``source`` a ``target``, si lo hay.
+
+        Todo lo alcanzable tiene rango mayor que ``source``: no se pasa
+        del de ``target``."""
+        if source not in self.rank or target not in self.rank:
+            return None
+        limit = self.rank[target]
+        if limit < self.rank[source]:
+            return None
+        parents: Dict[str, Optional[str]] = {source: None}
+        stack = [source]
+        while stack:
+            node = stack.pop()
+            if node == target:
+                path = [node]
+                while parents[path[-1]] is not None:
+                    path.append(parents[path[-1]])
+                return path[::-1]
+            for child in self.dependents[node]:
+                if child not in parents and self.rank[child] <= limit:
+                    parents[child] = node
+                    stack.append(child)
+        return None
+
+    # ---------- Cambios ---------- #
+
+    def task_changed(
+        self,
+        task_id: str,
+        task: Optional[Task],
+    ):
+        """Aplica el alta, cambio o baja (``task`` None) de una tarea; hay
+        que recalcular lo que depende de ella y lo que la precede."""
+        if task is None:
+            if task_id not in self.rank:
+                return
+            forward, backward = self._remove(task_id)
+        else:
+            forward, backward = {task_id}, {task_id}
+            if task_id not in self.rank:
+                self._add(task_id)
+                forward |= self._resolve(task_id)
+            start, self.duration[task_id] = _span(task)
+            self._set_start(task_id, start)
+            backward |= self._set_deps(task_id, task.dependencies)
+        forward |= self._reanchor()
+        self._stale[0].update(forward)
+        self._stale[1].update(backward)
+
+    def project_changed(
+        self,
+        project: Project,
+    ):
+        """Cambio de los campos del proyecto: solo importa su inicio."""
+        self._project_start = naive_utc(project.start_date)
+        self._stale[0].update(self._reanchor())
+
+    def _origin(self) -> Optional[datetime]:
+        if self._project_start is not None:
+            return self._project_start
+        return self._starts[0] if self._starts else None
+
+    def _reanchor(self) -> Set[str]:
+        """Si ha cambiado el origen, las tareas que parten de él."""
+        origin = self._origin()
+        if origin == self.origin:
+            return set()
+        self.origin = origin
+        return {
+            task_id
+            for task_id, start in self.start.items()
+            if start is None and not self.deps[task_id]
+        }
+
+    def _set_start(
+        self,
+        task_id: str,
+        start: Optional[datetime],
+    ):
+        previous = self.start.get(task_id)
+        if previous is not None:
+            del self._starts[bisect_left(self._starts, previous)]
+        if start is not None:
+            insort(self._starts, start)
+        self.start[task_id] = start
+
+    def _add(
+        self,
+        task_id: str,
+    ):
+        self.rank[task_id] = self._next_rank
+        self._next_rank += 1
+        self.deps[task_id] = []
+        self.dependents[task_id] = set()
+
+    def _resolve(
+        self,
+        task_id: str,
+    ) -> Set[str]:
+        # Tareas guardadas con una dependencia a este id antes de existir
+        resolved = set()
+        for dependent in self._missing.pop(task_id, ()):
+            if self._add_edge(task_id, dependent):
+                ignored = self.ignored[dependent]
+                ignored.remove(task_id)
+                if not ignored:
+                    del self.ignored[dependent]
+                resolved.add(dependent)
+        return resolved
+
+    def _remove(
+        self,
+        task_id: str,
+    ) -> Tuple[Set[str], Set[str]]:
+        self._set_start(task_id, None)
+        backward = set(self.deps.pop(task_id))
+        for dep in backward:
+            self.dependents[dep].discard(task_id)
+        # Solo con datos sin validar: sus dependientes quedan a la espera
+        forward = self.dependents.pop(task_id)
+        for dependent in forward:
+            self.deps[dependent].remove(task_id)
+            self._ignore(dependent, task_id)
+        for dep in self.ignored.pop(task_id, ()):
+            waiting = self._missing.get(dep)
+            if waiting is not None:
+                waiting.discard(task_id)
+                if not waiting:
+                    del self._missing[dep]
+        for values in (
+            self.rank,
+            self.start,
+            self.duration,
+            self.earliest,
+            self.earliest_finish,
+            self.tail,
+        ):
+            values.pop(task_id, None)
+        return forward, backward
+
+    def _set_deps(
+        self,
+        task_id: str,
+        dependencies: Iterable[str],
+    ) -> Set[str]:
+        """Deja las aristas de ``task_id`` como en ``dependencies``; devuelve
+        las dependencias añadidas o quitadas."""
+        wanted = list(dict.fromkeys(dependencies))
+        changed = set()
+        kept = []
+        for dep in self.deps[task_id]:
+            if dep in wanted:
+                kept.append(dep)
+            else:
+                self.dependents[dep].discard(task_id)
+                changed.add(dep)
+        for dep in self.ignored.pop(task_id, ()):
+            waiting = self._missing.get(dep)
+            if waiting is not None:
+                waiting.discard(task_id)
+                if not waiting:
+                    del self._missing[dep]
+        self.deps[task_id] = kept
+        for dep in wanted:
+            if dep in kept:
+                continue
+            if self._add_edge(dep, task_id):
+                changed.add(dep)
+            else:
+                self._ignore(task_id, dep)
+        return changed
+
+    def _add_edge(
+        self,
+        dep: str,
+        task_id: str,
+    ) -> bool:
+        """Añade ``dep -> task_id``; False si ``dep`` no existe o si
+        cerraría un ciclo."""
+        if dep not in self.rank or dep == task_id:
+            return False
+        lower, upper = self.rank[task_id], self.rank[dep]
+        if upper > lower:
+            # Solo se reordena lo que queda entre ambos rangos: lo que
+            # sale de ``task_id`` pasa detrás de lo que llega a ``dep``
+            after = self._reach(task_id, self.dependents, upper, True)
+            if dep in after:
+                return False
+            before = self._reach(dep, self.deps, lower, False)
+            nodes = sorted(before, key=self.rank.__getitem__)
+            nodes += sorted(after, key=self.rank.__getitem__)
+            ranks = sorted(self.rank[node] for node in nodes)
+            self.rank.update(zip(nodes, ranks))
+        self.deps[task_id].append(dep)
+        self.dependents[dep].add(task_id)
+        return True
+
+    def _reach(
+        self,
+        source: str,
+        edges,
+        bound: int,
+        ascending: bool,
+    ) -> Set[str]:
+        seen = {source}
+        stack = [source]
+        while stack:
+            for node in edges[stack.pop()]:
+                rank = self.rank[node]
+                inside = rank <= bound if ascending else rank >= bound
+                if inside and node not in seen:
+                    seen.add(node)
+                    stack.append(node)
+        return seen
+
+    def _forward(
+        self,
+        seeds: Iterable[str],
+    ):
+        # En orden de rango: cada tarea se recalcula una vez, después de
+        # todas sus dependencias
+        heap = [(self.rank[t], t) for t in set(seeds) if t in self.rank]
+        heapq.heapify(heap)
+        queued = {task_id for _, task_id in heap}
+        while heap:
+            _, task_id = heapq.heappop(heap)
+            bounds = [self.earliest_finish[d] for d in self.deps[task_id]]
+            bounds.append(self.start[task_id])
+            # Sin fechas en todo el proyecto no hay nada que planificar
+            earliest = max(filter(None, bounds), default=self.origin)
+            finish = None
+            if earliest is not None:
+                finish = earliest + self.duration[task_id]
+            self.earliest[task_id] = earliest
+            unchanged = task_id in self.earliest_finish
+            if unchanged and self.earliest_finish[task_id] == finish:
+                continue
+            self.earliest_finish[task_id] = finish
+            for dependent in self.dependents[task_id]:
+                if dependent not in queued:
+                    queued.add(dependent)
+                    heapq.heappush(heap, (self.rank[dependent], dependent))
+
+    def _backward(
+        self,
+        seeds: Iterable[str],
+    ):
+        heap = [(-self.rank[t], t) for t in set(seeds) if t in self.rank]
+        heapq.heapify(heap)
+        queued = {task_id for _, task_id in heap}
+        while heap:
+            _, task_id = heapq.heappop(heap)
+            tail = self.duration[task_id] + max(
+                (self.tail[d] for d in self.dependents[task_id]),
+                default=ZERO,
+            )
+            if self.tail.get(task_id) == tail:
+                continue
+            self.tail[task_id] = tail
+            for dep in self.deps[task_id]:
+                if dep not in queued:
+                    queued.add(dep)
+                    heapq.heappush(heap, (-self.rank[dep], dep))
+
+    # ---------- Consultas ---------- #
+
+    def refresh(self):
+        """Recalcula las fechas pendientes de los últimos cambios."""
+        with self._guard:
+            forward, backward = self._stale
+            if forward:
+                self._forward(forward)
+                forward.clear()
+            if backward:
+                self._backward(backward)
+                backward.clear()
+
+    def order(self) -> List[str]:
+        """Ids en orden topológico: cada tarea tras sus dependencias."""
+        return sorted(self.rank, key=self.rank.__getitem__)
+
+    def finish(self) -> Optional[datetime]:
+        """Fin más temprano del proyecto."""
+        self.refresh()
+        finishes = filter(None, self.earliest_finish.values())
+        return max(finishes, default=self.origin)
+
+    def schedule(
+        self,
+        task_id: str,
+        finish: Optional[datetime],
+    ) -> Schedule:
+        """Planificación de la tarea; ``finish`` es el de ``finish()``."""
+        earliest = self.earliest[task_id]
+        if earliest is None or finish is None:
+            return None, None, None, None, None
+        latest = finish - self.tail[task_id]
+        return (
+            earliest,
+            self.earliest_finish[task_id],
+            latest,
+            latest + self.duration[task_id],
+            latest - earliest,
+        )
+
+    def critical_path(self) -> List[str]:
+        """Cadena de tareas sin holgura que marca el fin del proyecto."""
+        finish = self.finish()
+        last = [t for t, f in self.earliest_finish.items() if f == finish]
+        if finish is None or not last:
+            return []
+        path = [max(last, key=self.rank.__getitem__)]
+        while True:
+            # La dependencia que acaba justo cuando empieza la actual
+            current = path[-1]
+            start = self.earliest[current]
+            deps = self.deps[current]
+            tight = [d for d in deps if self.earliest_finish[d] == start]
+            if not tight:
+                break
+            path.append(max(tight, key=self.rank.__getitem__))
+        return path[::-1]
+
+
+class DependencyGraphs:
+    """Grafos de los proyectos ya consultados, al día con cada mutación.
+
+    Es un suscriptor síncrono del bus de ``ProjectService``: se actualizan
+    dentro de la mutación, con el lock de escritura del proyecto tomado.
+    Un cambio profundo del proyecto (tareas sustituidas, deshacer una
+    transacción, recarga desde otro proceso) descarta su grafo, que se
+    reconstruye en el siguiente uso.
+    """
+
+    def __init__(
+        self,
+        lock: Optional[threading.RLock] = None,
+    ):
+        self._lock = lock or threading.RLock()
+        self._graphs: Dict[str, DependencyGraph] = {}
+
+    def get(
+        self,
+        project: Project,
+    ) -> DependencyGraph:
+        """Grafo del proyecto; hay que tener su lock tomado."""
+        with self._lock:
+            graph = self._graphs.get(project.id)
+        if graph is None:
+            graph = DependencyGraph(project)
+            with self._lock:
+                graph = self._graphs.setdefault(project.id, graph)
+        return graph
+
+    def handle(
+        self,
+        event: DomainEvent,
+    ):
+        # Las subtareas no tienen dependencias ni cambian las fechas
+        if isinstance(event, SubtaskEvent):
+            return
+        with self._lock:
+            graph = self._graphs.get(event.project_id)
+            if graph is None:
+                return
+            if isinstance(event, ProjectEvent):
+                if event.deep:
+                    del self._graphs[event.project_id]
+                else:
+                    graph.project_changed(event.project)
+            elif isinstance(event, TaskEvent):
+                graph.task_changed(event.task_id, event.task)
@@ -0,0 +1,80 @@
+from typing import List
+
+from .graph import ZERO, DependencyGraph
+from .locks import reads_project
+from .models import CriticalPath, ProjectGraph, TaskSchedule
+from .project_service import ProjectService
+
+
+class GraphService:
+    """Grafo de dependencias y camino crítico de cada proyecto.
+
+    Los grafos los mantiene ``ProjectService`` (``dependency_graph``) en
+    cada mutación; aquí solo se leen, con el lock de lectura del proyecto.
+    """
+
+    def __init__(self, project_service: ProjectService):
+        self.ps = project_service
+        self.locks = project_service.locks
+
+    def _tasks(
+        self,
+        graph: DependencyGraph,
+        task_ids: List[str],
+    ) -> List[TaskSchedule]:
+        finish = graph.finish()
+        tasks = []
+        for task_id in task_ids:
+            start, end, latest, latest_end, slack = graph.schedule(
+                task_id,
+                finish,
+            )
+            tasks.append(
+                TaskSchedule(
+                    id=task_id,
+                    dependencies=graph.deps[task_id],
+                    dependents=sorted(
+                        graph.dependents[task_id],
+                        key=graph.rank.__getitem__,
+                    ),
+                    earliest_start=start,
+                    earliest_finish=end,
+                    latest_start=latest,
+                    latest_finish=latest_end,
+                    slack=slack,
+                    critical=slack == ZERO,
+                )
+            )
+        return tasks
+
+    @reads_project
+    def graph(
+        self,
+        project_id: str,
+    ) -> ProjectGraph:
+        graph = self.ps.dependency_graph(project_id)
+        return ProjectGraph(
+            project_id=project_id,
+            start=graph.origin,
+            finish=graph.finish(),
+            tasks=self._tasks(graph, graph.order()),
+            ignored=graph.ignored,
+        )
+
+    @reads_project
+    def critical_path(
+        self,
+        project_id: str,
+    ) -> CriticalPath:
+        graph = self.ps.dependency_graph(project_id)
+        path = graph.critical_path()
+        start = graph.earliest[path[0]] if path else graph.origin
+        finish = graph.finish()
+        duration = None if finish is None else finish - start
+        return CriticalPath(
+            project_id=project_id,
+            start=start,
+            finish=finish,
+            duration=duration,
+            tasks=self._tasks(graph, path),
+        )
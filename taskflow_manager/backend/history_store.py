@@ -0,0 +1,136 @@
+# =============================================================
+# file: history_store.py
+# =============================================================
+import json
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from .models import HistoryEntry
+
+
+def _dump_entry(
+    entry: HistoryEntry,
+) -> str:
+    return json.dumps(
+        entry.dict(),
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+
+
+class HistoryStore:
+    """Historial append-only por proyecto, en segmentos JSONL.
+
+    Cada proyecto tiene su directorio con segmentos de ``segment_size``
+    entradas (``000000.jsonl``, ``000001.jsonl``...). El cursor de
+    paginación es la posición de la entrada dentro del historial, así
+    que localizar una página solo abre el segmento que la contiene.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        segment_size: int = 1000,
+    ):
+        self.directory = directory
+        self.segment_size = segment_size
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _project_dir(
+        self,
+        project_id: str,
+    ) -> Path:
+        return self.directory / quote(project_id, safe="")
+
+    def _segment(
+        self,
+        project_id: str,
+        number: int,
+    ) -> Path:
+        return self._project_dir(project_id) / f"{number:06d}.jsonl"
+
+    def count(
+        self,
+        project_id: str,
+    ) -> int:
+        """Nº de entradas guardadas (cacheado tras la primera lectura)."""
+        if project_id in self._counts:
+            return self._counts[project_id]
+        segments = sorted(self._project_dir(project_id).glob("*.jsonl"))
+        total = 0
+        if segments:
+            last = segments[-1]
+            with last.open("rb") as f:
+                lines = sum(1 for _ in f)
+            total = int(last.stem) * self.segment_size + lines
+        self._counts[project_id] = total
+        return total
+
+    def append(
+        self,
+        project_id: str,
+        entries: List[HistoryEntry],
+    ):
+        if not entries:
+            return
+        with self._lock:
+            seq = self.count(project_id)
+            self._project_dir(project_id).mkdir(parents=True, exist_ok=True)
+            by_segment: Dict[int, List[str]] = {}
+            for entry in entries:
+                number = seq // self.segment_size
+                by_segment.setdefault(number, []).append(_dump_entry(entry))
+                seq += 1
+            for number, lines in by_segment.items():
+                path = self._segment(project_id, number)
+                with path.open("a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+            self._counts[project_id] = seq
+
+    def read(
+        self,
+        project_id: str,
+        cursor: int = 0,
+        limit: int = 50,
+    ) -> Tuple[List[HistoryEntry], Optional[int]]:
+        """Devuelve hasta ``limit`` entradas desde ``cursor`` y el cursor
+        de la siguiente página (``None`` si no hay más)."""
+        total = self.count(project_id)
+        entries: List[HistoryEntry] = []
+        seq = max(cursor, 0)
+        while seq < total and len(entries) < limit:
+            number, offset = divmod(seq, self.segment_size)
+            path = self._segment(project_id, number)
+            with path.open("r", encoding="utf-8") as f:
+                for i, line in enumerate(f):
+                    if i < offset:
+                        continue
+                    entries.append(HistoryEntry.parse_obj(json.loads(line)))
+                    seq += 1
+                    if len(entries) >= limit:
+                        break
+            if seq % self.segment_size and len(entries) < limit:
+                # Segmento incompleto: no hay más entradas
+                break
+        return entries, (seq if seq < total else None)
+
+    def forget(
+        self,
+        project_id: str,
+    ):
+        """Olvida el nº de entradas cacheado (otro proceso ha escrito)."""
+        with self._lock:
+            self._counts.pop(project_id, None)
+
+    def delete(
+        self,
+        project_id: str,
+    ):
+        with self._lock:
+            shutil.rmtree(self._project_dir(project_id), ignore_errors=True)
+            self._counts.pop(project_id, None)
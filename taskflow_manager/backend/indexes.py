@@ -0,0 +1,257 @@
+# =============================================================
+# file: indexes.py
+# =============================================================
+from typing import (
+    Dict,
+    Generic,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from .bus import DomainEvent, ProjectEvent, TaskEvent
+from .models import Project, Task
+
+Doc = TypeVar("Doc", bound=Hashable)
+# Referencia a una tarea dentro de los índices: (project_id, task_id)
+TaskRef = Tuple[str, str]
+
+
+class InvertedIndex(Generic[Doc]):
+    """Término -> documentos, con el mapa inverso para poder desindexar."""
+
+    def __init__(self):
+        self.postings: Dict[Hashable, Set[Doc]] = {}
+        self._terms: Dict[Doc, Set[Hashable]] = {}
+
+    def add(
+        self,
+        doc: Doc,
+        terms: Iterable[Hashable],
+    ):
+        terms = set(terms)
+        self._terms[doc] = terms
+        for term in terms:
+            self.postings.setdefault(term, set()).add(doc)
+
+    def remove(
+        self,
+        doc: Doc,
+    ):
+        for term in self._terms.pop(doc, ()):
+            docs = self.postings[term]
+            docs.discard(doc)
+            if not docs:
+                del self.postings[term]
+
+    def get(
+        self,
+        term: Hashable,
+    ) -> Set[Doc]:
+        return self.postings.get(term, set())
+
+    def documents(self) -> Set[Doc]:
+        return set(self._terms)
+
+    def clear(self):
+        self.postings.clear()
+        self._terms.clear()
+
+
+def status_value(
+    status,
+) -> str:
+    # Las actualizaciones pueden dejar el estado como str en lugar de Status
+    return getattr(status, "value", status)
+
+
+class ServiceIndex:
+    """Índice secundario que ``ProjectService`` mantiene en cada mutación.
+
+    Se construye en la primera consulta (``ProjectService.ensure_index``)
+    y a partir de ahí se actualiza con los eventos de dominio del bus del
+    servicio (``handle``, suscriptor síncrono). Las subclases solo
+    implementan los cuatro métodos ``_index_*``/``_unindex_*``.
+    """
+
+    def __init__(self):
+        self.built = False
+        # project_id -> ids de tarea indexados
+        self._tasks: Dict[str, Set[str]] = {}
+
+    def rebuild(
+        self,
+        projects: Iterable[Project],
+    ):
+        self.clear()
+        for project in projects:
+            self.project_changed(project.id, project, deep=True)
+        self.built = True
+
+    def clear(self):
+        for project_id in list(self._tasks):
+            self.project_changed(project_id, None, deep=True)
+
+    def handle(
+        self,
+        event: DomainEvent,
+    ):
+        if not self.built:
+            return
+        if isinstance(event, ProjectEvent):
+            self.project_changed(event.project_id, event.project, event.deep)
+        elif isinstance(event, TaskEvent):
+            # Un cambio de subtarea reindexa la tarea que la contiene
+            self.task_changed(event.project, event.task_id, event.task)
+
+    def project_changed(
+        self,
+        project_id: str,
+        project: Optional[Project],
+        deep: bool,
+    ):
+        """``deep=False``: solo cambian los campos propios del proyecto."""
+        if deep or project is None:
+            for task_id in self._tasks.pop(project_id, set()):
+                self._unindex_task(project_id, task_id)
+        self._unindex_project(project_id)
+        if project is None:
+            return
+        self._index_project(project)
+        if deep:
+            self._tasks[project_id] = set()
+            for task in project.tasks:
+                self.task_changed(project, task.id, task)
+
+    def task_changed(
+        self,
+        project: Project,
+        task_id: str,
+        task: Optional[Task],
+    ):
+        task_ids = self._tasks.setdefault(project.id, set())
+        if task_id in task_ids:
+            self._unindex_task(project.id, task_id)
+            task_ids.discard(task_id)
+        if task is not None:
+            self._index_task(project, task)
+            task_ids.add(task_id)
+
+    # ---------- A implementar ---------- #
+
+    def _index_project(
+        self,
+        project: Project,
+    ):
+        pass
+
+    def _unindex_project(
+        self,
+        project_id: str,
+    ):
+        pass
+
+    def _index_task(
+        self,
+        project: Project,
+        task: Task,
+    ):
+        pass
+
+    def _unindex_task(
+        self,
+        project_id: str,
+        task_id: str,
+    ):
+        pass
+
+
+class FieldIndex(ServiceIndex):
+    """Índices invertidos por responsable, asignado, etiqueta y estado."""
+
+    def __init__(self):
+        self.tasks: InvertedIndex[TaskRef] = InvertedIndex()
+        self.projects: InvertedIndex[str] = InvertedIndex()
+        super().__init__()
+
+    def _index_project(
+        self,
+        project: Project,
+    ):
+        terms = [("status", status_value(project.status))]
+        terms += [("owner", owner) for owner in project.owners]
+        terms += [("tag", tag) for tag in project.tags]
+        self.projects.add(project.id, terms)
+
+    def _unindex_project(
+        self,
+        project_id: str,
+    ):
+        self.projects.remove(project_id)
+
+    def _index_task(
+        self,
+        project: Project,
+        task: Task,
+    ):
+        terms = [("status", status_value(task.status))]
+        terms += [("assignee", name) for name in task.assignees]
+        terms += [("tag", tag) for tag in task.tags]
+        self.tasks.add((project.id, task.id), terms)
+
+    def _unindex_task(
+        self,
+        project_id: str,
+        task_id: str,
+    ):
+        self.tasks.remove((project_id, task_id))
+
+    @staticmethod
+    def _match(
+        index: InvertedIndex,
+        filters: Dict[str, Optional[str]],
+    ) -> Optional[Set]:
+        """Intersección de los filtros dados (``None`` si no hay ninguno)."""
+        result: Optional[Set] = None
+        # Empezar por la lista más corta abarata la intersección
+        sets: List[Set] = sorted(
+            (index.get(item) for item in filters.items() if item[1]),
+            key=len,
+        )
+        for docs in sets:
+            result = set(docs) if result is None else result & docs
+            if not result:
+                break
+        return result
+
+    def find_tasks(
+        self,
+        assignee: Optional[str] = None,
+        status: Optional[str] = None,
+        tag: Optional[str] = None,
+        owner: Optional[str] = None,
+    ) -> List[TaskRef]:
+        filters = {"assignee": assignee, "status": status, "tag": tag}
+        refs = self._match(self.tasks, filters)
+        if refs is None:
+            refs = self.tasks.documents()
+        if owner:
+            projects = self.projects.get(("owner", owner))
+            refs = {ref for ref in refs if ref[0] in projects}
+        return sorted(refs)
+
+    def find_projects(
+        self,
+        owner: Optional[str] = None,
+        status: Optional[str] = None,
+        tag: Optional[str] = None,
+    ) -> List[str]:
+        filters = {"owner": owner, "status": status, "tag": tag}
+        ids = self._match(self.projects, filters)
+        if ids is None:
+            ids = self.projects.documents()
+        return sorted(ids)
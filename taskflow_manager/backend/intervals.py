@@ -0,0 +1,190 @@
+# =============================================================
+# file: intervals.py
+# =============================================================
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from .indexes import ServiceIndex, TaskRef, status_value
+from .models import Project, Status, Task
+
+# Estados que ya no cuentan como pendientes para vencimientos
+DONE = frozenset(
+    {
+        Status.completed.value,
+        Status.closed.value,
+        Status.archived.value,
+    }
+)
+
+Interval = Tuple[datetime, datetime]
+
+
+def naive_utc(
+    value: Optional[datetime],
+) -> Optional[datetime]:
+    # Las fechas del modelo son UTC naive (utcnow); las que llegan con zona
+    # se pasan a UTC para poder compararlas.
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _interval(
+    obj,
+) -> Optional[Interval]:
+    """``[inicio, fin]``: sin fin queda abierto; sin inicio, es el fin."""
+    start = naive_utc(obj.start_date)
+    end = naive_utc(obj.end_date)
+    if start is None and end is None:
+        return None
+    start = start or end
+    end = end or datetime.max
+    return (min(start, end), max(start, end))
+
+
+def _first(
+    item: tuple,
+):
+    return item[0]
+
+
+class SortedIntervals:
+    """Intervalos en dos arrays ordenados, por inicio y por fin."""
+
+    def __init__(self):
+        self.intervals: Dict[tuple, Interval] = {}
+        self._starts: List[Tuple[datetime, tuple]] = []
+        self._ends: List[Tuple[datetime, tuple]] = []
+
+    def add(
+        self,
+        ref: tuple,
+        interval: Interval,
+    ):
+        self.intervals[ref] = interval
+        insort(self._starts, (interval[0], ref))
+        insort(self._ends, (interval[1], ref))
+
+    def remove(
+        self,
+        ref: tuple,
+    ):
+        interval = self.intervals.pop(ref, None)
+        if interval is None:
+            return
+        start, end = interval
+        del self._starts[bisect_left(self._starts, (start, ref))]
+        del self._ends[bisect_left(self._ends, (end, ref))]
+
+    def overlapping(
+        self,
+        start: datetime,
+        end: datetime,
+    ) -> Set[tuple]:
+        """Intervalos que solapan ``[start, end]``.
+
+        Se recorre el lado más corto: los que empiezan antes de ``end`` o
+        los que terminan después de ``start``.
+        """
+        started = bisect_right(self._starts, end, key=_first)
+        not_ended = bisect_left(self._ends, start, key=_first)
+        if started <= len(self._ends) - not_ended:
+            candidates = self._starts[:started]
+            return {ref for _, ref in candidates if self._end(ref) >= start}
+        candidates = self._ends[not_ended:]
+        return {ref for _, ref in candidates if self._start(ref) <= end}
+
+    def _start(
+        self,
+        ref: tuple,
+    ) -> datetime:
+        return self.intervals[ref][0]
+
+    def _end(
+        self,
+        ref: tuple,
+    ) -> datetime:
+        return self.intervals[ref][1]
+
+
+class DateIndex(ServiceIndex):
+    """Índice de fechas de inicio/fin de proyectos y tareas."""
+
+    def __init__(self):
+        self.tasks = SortedIntervals()
+        self.projects = SortedIntervals()
+        # Fechas de fin reales de tareas no terminadas, para vencimientos
+        self._deadlines: List[Tuple[datetime, TaskRef]] = []
+        self._deadline: Dict[TaskRef, datetime] = {}
+        super().__init__()
+
+    def _index_project(
+        self,
+        project: Project,
+    ):
+        interval = _interval(project)
+        if interval is not None:
+            self.projects.add((project.id,), interval)
+
+    def _unindex_project(
+        self,
+        project_id: str,
+    ):
+        self.projects.remove((project_id,))
+
+    def _index_task(
+        self,
+        project: Project,
+        task: Task,
+    ):
+        ref = (project.id, task.id)
+        interval = _interval(task)
+        if interval is not None:
+            self.tasks.add(ref, interval)
+        end = naive_utc(task.end_date)
+        if end is not None and status_value(task.status) not in DONE:
+            self._deadline[ref] = end
+            insort(self._deadlines, (end, ref))
+
+    def _unindex_task(
+        self,
+        project_id: str,
+        task_id: str,
+    ):
+        ref = (project_id, task_id)
+        self.tasks.remove(ref)
+        end = self._deadline.pop(ref, None)
+        if end is not None:
+            del self._deadlines[bisect_left(self._deadlines, (end, ref))]
+
+    def overlapping_tasks(
+        self,
+        start: datetime,
+        end: datetime,
+    ) -> List[TaskRef]:
+        refs = self.tasks.overlapping(naive_utc(start), naive_utc(end))
+        return sorted(refs, key=lambda ref: (self.tasks.intervals[ref], ref))
+
+    def overlapping_projects(
+        self,
+        start: datetime,
+        end: datetime,
+    ) -> List[str]:
+        refs = self.projects.overlapping(naive_utc(start), naive_utc(end))
+        return [ref[0] for ref in sorted(refs)]
+
+    def due_tasks(
+        self,
+        now: datetime,
+        until: Optional[datetime] = None,
+    ) -> List[TaskRef]:
+        """Tareas no terminadas que vencen antes de ``now`` (vencidas) o,
+        con ``until``, entre ``now`` y ``until`` (próximas a vencer)."""
+        now = naive_utc(now)
+        if until is None:
+            lo, hi = 0, bisect_left(self._deadlines, now, key=_first)
+        else:
+            lo = bisect_left(self._deadlines, now, key=_first)
+            hi = bisect_right(self._deadlines, naive_utc(until), key=_first)
+        return [ref for _, ref in self._deadlines[lo:hi]]
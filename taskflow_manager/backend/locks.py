@@ -0,0 +1,224 @@
+# =============================================================
+# file: locks.py
+# =============================================================
+import threading
+import weakref
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, Optional, Set
+
+
+class RWLock:
+    """Lock lector-escritor: varios lectores o un único escritor.
+
+    Reentrante por hilo: quien escribe puede volver a escribir o leer, y
+    quien lee puede volver a leer aunque haya escritores esperando. Fuera
+    de eso, un escritor en espera pasa por delante de los lectores nuevos
+    para no quedarse sin turno.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        # Hilo -> lecturas abiertas
+        self._readers: Dict[int, int] = {}
+        self._writer: Optional[int] = None
+        self._waiting = 0
+        # Profundidad de la escritura en curso (reentradas)
+        self.writes = 0
+
+    def acquire_read(
+        self,
+        blocking: bool = True,
+    ) -> bool:
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me and me not in self._readers:
+                while self._writer is not None or self._waiting:
+                    if not blocking:
+                        return False
+                    self._cond.wait()
+            self._readers[me] = self._readers.get(me, 0) + 1
+            return True
+
+    def release_read(self):
+        me = threading.get_ident()
+        with self._cond:
+            count = self._readers.pop(me) - 1
+            if count:
+                self._readers[me] = count
+            else:
+                self._cond.notify_all()
+
+    def acquire_write(
+        self,
+        blocking: bool = True,
+    ) -> bool:
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self.writes += 1
+                return True
+            if me in self._readers:
+                raise RuntimeError("No se puede pasar de lectura a escritura")
+            if self._writer is not None or self._readers:
+                if not blocking:
+                    return False
+                self._waiting += 1
+                try:
+                    while self._writer is not None or self._readers:
+                        self._cond.wait()
+                finally:
+                    self._waiting -= 1
+            self._writer = me
+            self.writes = 1
+            return True
+
+    def release_write(self):
+        with self._cond:
+            self.writes -= 1
+            if not self.writes:
+                self._writer = None
+                self._cond.notify_all()
+
+
+class ProjectLocks:
+    """Locks del servicio de proyectos.
+
+    - Uno lector-escritor por proyecto: las escrituras en proyectos
+      distintos avanzan en paralelo y las lecturas no se esperan entre sí.
+    - ``structure``: breve, alrededor de altas, bajas y recorridos del mapa
+      de proyectos.
+    - ``shared``: breve, para lo común a todos (revisiones, cachés e
+      índices secundarios).
+    - ``transactions``: serializa las unidades de trabajo, que retienen
+      varios proyectos a la vez.
+
+    Orden de adquisición: ``transactions`` -> proyecto -> ``shared`` ->
+    ``structure``. Con ``shared`` o ``structure`` tomados nunca se espera
+    a un proyecto.
+
+    ``on_acquire``/``on_release`` se llaman al tomar y al soltar del todo
+    la escritura de un proyecto (p. ej. para coordinarse con otros
+    procesos).
+    """
+
+    def __init__(
+        self,
+        pinned: Optional[Set[str]] = None,
+        on_acquire: Optional[Callable[[str], None]] = None,
+        on_release: Optional[Callable[[str], None]] = None,
+    ):
+        self.structure = threading.RLock()
+        self.shared = threading.RLock()
+        self.transactions = threading.RLock()
+        # Proyectos que no se pueden expulsar del LRU (modo perezoso):
+        # quien escribe muta el objeto en memoria hasta persistirlo
+        self.pinned = pinned
+        self.on_acquire = on_acquire
+        self.on_release = on_release
+        self._guard = threading.Lock()
+        # Cada lock vive mientras alguien lo tiene o lo espera
+        self._projects: "weakref.WeakValueDictionary[str, RWLock]" = (
+            weakref.WeakValueDictionary()
+        )
+
+    def project(
+        self,
+        project_id: str,
+    ) -> RWLock:
+        with self._guard:
+            lock = self._projects.get(project_id)
+            if lock is None:
+                lock = self._projects[project_id] = RWLock()
+            return lock
+
+    def acquire_write(
+        self,
+        project_id: str,
+        blocking: bool = True,
+    ) -> Optional[RWLock]:
+        """Toma el lock de escritura del proyecto; ``None`` si no se pudo
+        sin esperar."""
+        lock = self.project(project_id)
+        if not lock.acquire_write(blocking):
+            return None
+        if lock.writes > 1:
+            return lock
+        if self.pinned is not None:
+            self.pinned.add(project_id)
+        if self.on_acquire is not None:
+            try:
+                self.on_acquire(project_id)
+            except BaseException:
+                self._release(project_id, lock)
+                raise
+        return lock
+
+    def release_write(
+        self,
+        project_id: str,
+        lock: RWLock,
+    ):
+        if lock.writes > 1:
+            lock.release_write()
+            return
+        try:
+            if self.on_release is not None:
+                self.on_release(project_id)
+        finally:
+            self._release(project_id, lock)
+
+    def _release(
+        self,
+        project_id: str,
+        lock: RWLock,
+    ):
+        if self.pinned is not None:
+            self.pinned.discard(project_id)
+        lock.release_write()
+
+    @contextmanager
+    def write(
+        self,
+        project_id: str,
+    ) -> Iterator[None]:
+        lock = self.acquire_write(project_id)
+        try:
+            yield
+        finally:
+            self.release_write(project_id, lock)
+
+    @contextmanager
+    def read(
+        self,
+        project_id: str,
+    ) -> Iterator[None]:
+        lock = self.project(project_id)
+        lock.acquire_read()
+        try:
+            yield
+        finally:
+            lock.release_read()
+
+
+def writes_project(method):
+    """El método recibe ``project_id`` primero y lo muta: se ejecuta con el
+    lock de escritura del proyecto (``self.locks``)."""
+
+    @wraps(method)
+    def wrapper(self, project_id, *args, **kwargs):
+        with self.locks.write(project_id):
+            return method(self, project_id, *args, **kwargs)
+
+    return wrapper
+
+
+def reads_project(method):
+    """Como ``writes_project``, con el lock de lectura."""
+
+    @wraps(method)
+    def wrapper(self, project_id, *args, **kwargs):
+        with self.locks.read(project_id):
+            return method(self, project_id, *args, **kwargs)
+
+    return wrapper
@@ -1,11 +1,15 @@
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 
+from pydantic import VERSION as PYDANTIC_VERSION
 from pydantic import BaseModel, Field, validator
 
+PYDANTIC_V2 = PYDANTIC_VERSION.startswith("2.")
+
 
 class Status(str, Enum):
     pending = "pending"
@@ -23,6 +27,11 @@ class HistoryEntry(BaseModel):
     details: Optional[Dict[str, Any]] = None
 
 
+class HistoryPage(BaseModel):
+    entries: List[HistoryEntry]
+    next_cursor: Optional[int] = None
+
+
 class Attachment(BaseModel):
     name: str
     url: str
@@ -102,6 +111,32 @@ class Task(BaseModel):
         default_factory=dict,
         alias="campos_personalizados",
     )
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class FieldType(str, Enum):
+    str = "str"
+    int = "int"
+    float = "float"
+    date = "date"
+    enum = "enum"
+
+
+class FieldIndexKind(str, Enum):
+    hash = "hash"
+    sorted = "sorted"
+
+
+class CustomFieldSchema(BaseModel):
+    """Tipo (y opcionalmente índice) de un campo personalizado de tarea."""
+
+    type: FieldType = FieldType.str
+    values: List[str] = Field(
+        default_factory=list,
+        alias="valores",
+    )
+    index: Optional[FieldIndexKind] = None
 
 
 class Project(BaseModel):
@@ -136,3 +171,238 @@ class Project(BaseModel):
         default_factory=dict,
         alias="campos_personalizados",
     )
+    field_schemas: Dict[str, CustomFieldSchema] = Field(
+        default_factory=dict,
+        alias="esquema_campos",
+    )
+
+
+class TaskMatch(BaseModel):
+    """Tarea devuelta por una consulta entre proyectos."""
+
+    project_id: str
+    task: Task
+
+
+class SearchHit(BaseModel):
+    """Resultado de búsqueda de texto: proyecto, tarea o subtarea."""
+
+    kind: str
+    project_id: str
+    task_id: Optional[str] = None
+    subtask_id: Optional[str] = None
+    title: str
+    score: float
+
+
+class TaskSchedule(BaseModel):
+    """Tarea en el grafo de dependencias, planificada por camino crítico.
+
+    La duración es ``fecha_fin - fecha_inicio`` (cero si falta alguna) y
+    ``fecha_inicio`` es el inicio más temprano permitido. Las que no tienen
+    fecha ni dependencias parten del inicio del proyecto o, si no tiene,
+    del primero de sus tareas."""
+
+    id: str
+    dependencies: List[str]
+    dependents: List[str]
+    # Sin fechas en todo el proyecto no hay planificación
+    earliest_start: Optional[datetime] = None
+    earliest_finish: Optional[datetime] = None
+    latest_start: Optional[datetime] = None
+    latest_finish: Optional[datetime] = None
+    slack: Optional[timedelta] = None
+    critical: bool = False
+
+
+class ProjectGraph(BaseModel):
+    """Tareas de un proyecto en orden topológico."""
+
+    project_id: str
+    start: Optional[datetime] = None
+    finish: Optional[datetime] = None
+    tasks: List[TaskSchedule]
+    # Dependencias guardadas sin validar que no forman parte del grafo
+    # (ids que no existen o ciclos), por tarea
+    ignored: Dict[str, List[str]] = Field(default_factory=dict)
+
+
+class CriticalPath(BaseModel):
+    """Cadena de tareas sin holgura que fija el fin del proyecto."""
+
+    project_id: str
+    start: Optional[datetime] = None
+    finish: Optional[datetime] = None
+    duration: Optional[timedelta] = None
+    tasks: List[TaskSchedule]
+
+
+class BatchAction(str, Enum):
+    create_project = "create_project"
+    update_project = "update_project"
+    close_project = "close_project"
+    delete_project = "delete_project"
+    add_task = "add_task"
+    update_task = "update_task"
+    close_task = "close_task"
+    delete_task = "delete_task"
+    add_subtask = "add_subtask"
+    update_subtask = "update_subtask"
+    close_subtask = "close_subtask"
+    delete_subtask = "delete_subtask"
+
+
+class BatchOperation(BaseModel):
+    """Una operación de ``POST /batch``; ``data`` es el cuerpo que
+    recibiría el endpoint equivalente."""
+
+    op: BatchAction
+    project_id: str
+    task_id: Optional[str] = None
+    subtask_id: Optional[str] = None
+    data: Dict[str, Any] = Field(default_factory=dict)
+
+
+class BatchResult(BaseModel):
+    index: int
+    op: BatchAction
+    id: str
+
+
+# ---------- Construcción sin validación ---------- #
+
+# Súbelo al cambiar campos de los modelos: los datos guardados con otra
+# versión se vuelven a validar al cargarlos.
+SCHEMA_VERSION = 2
+
+
+def _parse_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+@lru_cache(maxsize=None)
+def _fields(model) -> Tuple[Tuple[str, str, Any, Any], ...]:
+    """(nombre, alias, default, default_factory) de cada campo."""
+    # pydantic 2 expone model_fields; __fields__ queda como alias obsoleto
+    fields = getattr(model, "model_fields", None) or model.__fields__
+    return tuple(
+        (name, f.alias or name, f.default, f.default_factory)
+        for name, f in fields.items()
+    )
+
+
+@lru_cache(maxsize=None)
+def field_names(model) -> Dict[str, str]:
+    """Alias o nombre -> nombre del campo, para proyecciones por clave."""
+    names = {}
+    for name, alias, _, _ in _fields(model):
+        names[name] = name
+        names[alias] = name
+    return names
+
+
+@lru_cache(maxsize=None)
+def field_aliases(model) -> Dict[str, str]:
+    """Nombre del campo -> clave con la que aparece en el JSON."""
+    return {name: alias for name, alias, _, _ in _fields(model)}
+
+
+def _new(
+    model,
+    values: Dict[str, Any],
+    fields_set: set,
+):
+    # Equivale a ``construct`` sin su bucle por campo, que en pydantic 2
+    # resuelve cada default y resulta más lento que la propia validación.
+    obj = model.__new__(model)
+    object.__setattr__(obj, "__dict__", values)
+    if PYDANTIC_V2:
+        object.__setattr__(obj, "__pydantic_fields_set__", fields_set)
+        object.__setattr__(obj, "__pydantic_extra__", None)
+        object.__setattr__(obj, "__pydantic_private__", None)
+    else:
+        object.__setattr__(obj, "__fields_set__", fields_set)
+    return obj
+
+
+def _construct(
+    model,
+    raw: Dict[str, Any],
+    **nested,
+):
+    """Instancia ``model`` sin validar, aceptando alias y fechas en texto."""
+    values = {}
+    fields_set = set()
+    for name, alias, default, factory in _fields(model):
+        if alias in raw:
+            values[name] = raw[alias]
+        elif name in raw:
+            values[name] = raw[name]
+        else:
+            values[name] = factory() if factory else default
+            continue
+        fields_set.add(name)
+    for name, build in nested.items():
+        if values[name] is not None:
+            values[name] = build(values[name])
+    return _new(model, values, fields_set)
+
+
+def _datetimes(*names):
+    return {name: _parse_datetime for name in names}
+
+
+def _many(model, **nested):
+    return lambda items: [_construct(model, item, **nested) for item in items]
+
+
+def _mapping(model, **nested):
+    return lambda items: {
+        key: _construct(model, item, **nested) for key, item in items.items()
+    }
+
+
+def construct_project(
+    raw: Dict[str, Any],
+) -> Project:
+    """Construye un ``Project`` de confianza sin pasar por pydantic.
+
+    Solo para datos escritos por el propio servicio con el mismo
+    ``SCHEMA_VERSION``; cualquier otro origen debe usar ``parse_obj``.
+    """
+    history = _many(HistoryEntry, **_datetimes("timestamp"))
+    subtasks = _many(
+        Subtask,
+        status=Status,
+        history=history,
+        **_datetimes("created_at", "updated_at"),
+    )
+    tasks = _many(
+        Task,
+        status=Status,
+        subtasks=subtasks,
+        history=history,
+        attachments=_many(Attachment),
+        notifications=_many(Notification, **_datetimes("timestamp")),
+        **_datetimes("start_date", "end_date", "created_at", "updated_at"),
+    )
+    project = _construct(
+        Project,
+        raw,
+        status=Status,
+        tasks=tasks,
+        history=history,
+        field_schemas=_mapping(
+            CustomFieldSchema,
+            type=FieldType,
+            index=FieldIndexKind,
+        ),
+        **_datetimes("start_date", "end_date"),
+    )
+    for task in project.tasks:
+        for subtask in task.subtasks:
+            # Equivalente al validador Subtask.set_updated
+            subtask.updated_at = subtask.updated_at or subtask.created_at
+    return project
@@ -0,0 +1,65 @@
+# =============================================================
+# file: patches.py
+# =============================================================
+from typing import Any, Dict, FrozenSet
+
+from pydantic import BaseModel
+
+from .models import Project, Subtask, Task, field_aliases, field_names
+
+# Campos que un PATCH no toca: el id y las colecciones con endpoints propios
+# (quedan fuera también de la revalidación, que así no recorre las tareas)
+NESTED: Dict[type, FrozenSet[str]] = {
+    Project: frozenset({"tasks", "history", "field_schemas"}),
+    Task: frozenset({"subtasks", "history"}),
+    Subtask: frozenset({"history"}),
+}
+
+
+def merge_patch(
+    target: Any,
+    patch: Any,
+) -> Any:
+    """JSON Merge Patch (RFC 7396): los objetos se fusionan clave a clave y
+    ``null`` borra la clave; cualquier otro valor sustituye al anterior."""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def patch_values(
+    obj: BaseModel,
+    patch: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Valores nuevos (por nombre de campo) tras aplicar ``patch`` a
+    ``obj``, ya validados por el modelo. ``obj`` no se modifica.
+
+    Las claves van por alias (como en el JSON) o por nombre de campo; una
+    clave a ``null`` devuelve el campo a su valor por defecto.
+    """
+    model = type(obj)
+    names = field_names(model)
+    aliases = field_aliases(model)
+    nested = NESTED[model]
+    data = obj.dict(by_alias=True, exclude=set(nested))
+    patched = []
+    for key, value in patch.items():
+        name = names.get(key)
+        if name is None:
+            raise ValueError(f"Campo desconocido: '{key}'")
+        if name == "id" or name in nested:
+            raise ValueError(f"'{key}' no se puede modificar con PATCH")
+        alias = aliases[name]
+        if value is None:
+            data.pop(alias, None)
+        else:
+            data[alias] = merge_patch(data.get(alias), value)
+        patched.append(name)
+    validated = model.parse_obj(data)
+    return {name: getattr(validated, name) for name in patched}
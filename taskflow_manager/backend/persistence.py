@@ -1,31 +1,731 @@
 # =============================================================
 # file: persistence.py
 # =============================================================
+import hashlib
 import json
+import logging
+import os
+import threading
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Optional, Set, Tuple, Union
+from urllib.parse import quote
 
-from .models import Project
+from .formats import decode, encode
+from .history_store import HistoryStore
+from .models import (
+    PYDANTIC_V2,
+    SCHEMA_VERSION,
+    HistoryEntry,
+    Project,
+    Status,
+    Subtask,
+    Task,
+    construct_project,
+)
 
-DATA_PATH = Path("/data/projects.json")
+logger = logging.getLogger("persistence")
 
+DATA_DIR = Path(os.environ.get("TASKFLOW_DATA_DIR", "/data"))
+DATA_PATH = DATA_DIR / "projects.json"
+SHARDS_DIR = DATA_DIR / "projects"
+HISTORY_DIR = DATA_DIR / "history"
+SQLITE_PATH = DATA_DIR / "projects.db"
 
-def _ensure_file():
-    DATA_PATH.parent.mkdir(parents=True, exist_ok=True)
-    if not DATA_PATH.exists():
-        DATA_PATH.write_text("[]", encoding="utf-8")
+# "journal": cada mutación añade un registro al journal (append-only)
+# "snapshot": cada mutación reescribe projects.json completo
+# "sharded": un fichero JSON por proyecto en projects/<id>.json
+# "sqlite": tablas normalizadas en projects.db
+STORAGE_MODE = os.environ.get("TASKFLOW_STORAGE", "journal")
+# Nº de registros en el journal que disparan una compactación
+COMPACT_EVERY = int(os.environ.get("TASKFLOW_COMPACT_EVERY", "500"))
+# Escritura diferida en un hilo aparte, agrupando cambios por ventana
+WRITE_BEHIND = os.environ.get("TASKFLOW_WRITE_BEHIND", "0") == "1"
+DURABILITY = os.environ.get("TASKFLOW_DURABILITY", "batched")
+COMMIT_WINDOW = float(os.environ.get("TASKFLOW_COMMIT_WINDOW", "0.05"))
+# Formato en disco de snapshot y shards (la lectura lo autodetecta)
+FORMAT = os.environ.get("TASKFLOW_FORMAT", "json")
+COMPRESSION = os.environ.get("TASKFLOW_COMPRESSION", "none")
+# Hidratación perezosa: solo se mantienen en memoria CACHE_SIZE proyectos
+LAZY_LOAD = os.environ.get("TASKFLOW_LAZY", "0") == "1"
+# Carga sin validación de datos propios cuyo checksum y versión coinciden.
+# Con pydantic 2 la validación compilada ya es más rápida que construir
+# los modelos desde Python, así que por defecto solo se activa en la 1.
+TRUSTED_LOAD = (
+    os.environ.get("TASKFLOW_TRUSTED_LOAD", "0" if PYDANTIC_V2 else "1") == "1"
+)
+CACHE_SIZE = int(os.environ.get("TASKFLOW_CACHE_SIZE", "1000"))
 
 
-def load_projects() -> Dict[str, Project]:
-    _ensure_file()
-    with DATA_PATH.open("r", encoding="utf-8") as f:
-        raw = json.load(f)
-    projects = {proj["id"]: Project.parse_obj(proj) for proj in raw}
-    return projects
+def _dump_compact(obj) -> str:
+    return json.dumps(
+        obj,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
 
 
-def save_projects(projects: Dict[str, Project]):
-    _ensure_file()
-    serializable = [proj.dict(by_alias=True) for proj in projects.values()]
-    with DATA_PATH.open("w", encoding="utf-8") as f:
-        json.dump(serializable, f, ensure_ascii=False, indent=2, default=str)
+def _atomic_write(
+    path: Path,
+    obj,
+    fsync: bool = True,
+    fmt: str = "json",
+    compression: str = "none",
+):
+    """Escribe ``obj`` en un temporal y lo renombra sobre ``path``.
+
+    Devuelve los bytes escritos.
+    """
+    data = encode(obj, fmt, compression)
+    # Temporal propio de cada proceso e hilo: varios escriben el mismo
+    # manifiesto
+    owner = f"{os.getpid()}-{threading.get_ident()}"
+    tmp = path.with_name(f"{path.name}.{owner}.tmp")
+    with tmp.open("wb") as f:
+        f.write(data)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return data
+
+
+def _checksum(
+    data: bytes,
+) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _read(
+    path: Path,
+):
+    """Lee un documento detectando su formato y compresión."""
+    return decode(path.read_bytes())
+
+
+def project_summary(
+    project: Union[Project, dict],
+) -> dict:
+    """Entrada ligera del índice de proyectos (claves por alias)."""
+    if isinstance(project, dict):
+        return {
+            "id": project["id"],
+            "nombre": project.get("nombre"),
+            "status": project.get("status", Status.active.value),
+        }
+    return {
+        "id": project.id,
+        "nombre": project.name,
+        "status": Status(project.status).value,
+    }
+
+
+def _latest_documents(
+    ops: List[Tuple[str, tuple]],
+) -> Dict[str, Optional[Project]]:
+    """Reduce un lote de operaciones al estado final de cada proyecto.
+
+    Devuelve ``None`` para los proyectos borrados. Útil para backends
+    basados en documentos, que reescriben el proyecto entero.
+    """
+    latest: Dict[str, Optional[Project]] = {}
+    for name, args in ops:
+        if name == "delete_project":
+            latest[args[0]] = None
+        else:
+            latest[args[0].id] = args[0]
+    return latest
+
+
+class StorageBackend:
+    """Interfaz común de almacenamiento de proyectos.
+
+    Los métodos de tarea y subtarea reciben el proyecto completo para que
+    los backends basados en documentos puedan reescribirlo entero, mientras
+    que los backends por filas solo escriben lo que ha cambiado.
+    """
+
+    # Si es False las escrituras no esperan a fsync
+    fsync = True
+    # Historial fuera de los documentos de proyecto
+    history_store: Optional[HistoryStore] = None
+    # Si las escrituras esperan a disco (los servicios async las sacan del
+    # event loop)
+    blocking_writes = True
+    # ``ClusterSync`` si varios procesos comparten el almacenamiento; lo
+    # asigna ``ProjectService``
+    cluster = None
+
+    def load_all(self) -> Dict[str, Project]:
+        raise NotImplementedError
+
+    def load_index(self) -> Dict[str, dict]:
+        """Resumen ``id -> {id, nombre, status}`` de todos los proyectos.
+
+        Los backends que pueden leer proyectos sueltos lo implementan sin
+        hidratar ningún ``Project``.
+        """
+        projects = self.load_all()
+        return {pid: project_summary(p) for pid, p in projects.items()}
+
+    def get_project(
+        self,
+        project_id: str,
+    ) -> Optional[Project]:
+        raise NotImplementedError
+
+    def reload_project(
+        self,
+        project_id: str,
+    ) -> Optional[Project]:
+        """Relee el proyecto del disco tras un cambio de otro proceso,
+        sin fiarse de lo que el backend tenga en memoria."""
+        return self.get_project(project_id)
+
+    def put_project(
+        self,
+        project: Project,
+    ):
+        raise NotImplementedError
+
+    def put_project_fields(
+        self,
+        project: Project,
+    ):
+        """Persiste los campos propios del proyecto, sin sus tareas."""
+        self.put_project(project)
+
+    def delete_project(
+        self,
+        project_id: str,
+    ):
+        raise NotImplementedError
+
+    def put_task(
+        self,
+        project: Project,
+        task: Task,
+    ):
+        self.put_project(project)
+
+    def delete_task(
+        self,
+        project: Project,
+        task_id: str,
+    ):
+        self.put_project(project)
+
+    def put_subtask(
+        self,
+        project: Project,
+        task_id: str,
+        subtask: Subtask,
+    ):
+        self.put_project(project)
+
+    def delete_subtask(
+        self,
+        project: Project,
+        task_id: str,
+        sub_id: str,
+    ):
+        self.put_project(project)
+
+    def apply_batch(
+        self,
+        ops: List[Tuple[str, tuple]],
+    ):
+        """Aplica un lote de operaciones ``(método, argumentos)``."""
+        for name, args in ops:
+            getattr(self, name)(*args)
+
+    def append_history(
+        self,
+        project_id: str,
+        entries: List[HistoryEntry],
+    ):
+        self.history_store.append(project_id, entries)
+
+    def read_history(
+        self,
+        project_id: str,
+        cursor: int = 0,
+        limit: int = 50,
+    ) -> Tuple[List[HistoryEntry], Optional[int]]:
+        return self.history_store.read(project_id, cursor, limit)
+
+    def history_count(
+        self,
+        project_id: str,
+    ) -> int:
+        """Nº de entradas de historial guardadas: el cursor tras la
+        última."""
+        return self.history_store.count(project_id)
+
+    def delete_history(
+        self,
+        project_id: str,
+    ):
+        self.history_store.delete(project_id)
+
+    def unflushed(self) -> Set[str]:
+        """Proyectos con escrituras aceptadas que aún no han llegado al
+        backend (solo con escritura diferida)."""
+        return set()
+
+    def sync(self):
+        """Fuerza a disco lo escrito hasta ahora."""
+
+    def close(self):
+        pass
+
+
+# ---------- JSON (snapshot + journal) ---------- #
+
+
+class JsonFileStorage(StorageBackend):
+    """Fichero ``projects.json`` con journal opcional de solo-anexado.
+
+    Con ``journal=True`` cada escritura añade un registro compacto a
+    ``projects.journal`` y un hilo en segundo plano compacta el journal
+    sobre el snapshot cada ``compact_every`` registros.
+
+    Junto al snapshot se guarda ``projects.meta.json`` con la versión de
+    esquema y el checksum del fichero: si ambos coinciden al cargar, los
+    proyectos se construyen sin validar (``construct_project``).
+    """
+
+    def __init__(
+        self,
+        path: Path = DATA_PATH,
+        journal: bool = True,
+        compact_every: int = COMPACT_EVERY,
+        fmt: str = FORMAT,
+        compression: str = COMPRESSION,
+        history_dir: Path = HISTORY_DIR,
+    ):
+        self.path = path
+        self.format = fmt
+        self.compression = compression
+        self.history_store = HistoryStore(history_dir)
+        self.journal_path = path.with_suffix(".journal")
+        self.meta_path = path.with_suffix(".meta.json")
+        # Journal rotado durante una compactación en curso
+        self.compacting_path = path.with_suffix(".journal.compacting")
+        self.journal = journal
+        self.compact_every = compact_every
+        # Los proyectos no hidratados se guardan como dict sin validar
+        self._projects: Dict[str, Union[Project, dict]] = {}
+        # Ids cuyo dict viene de un snapshot sellado (no hace falta validar)
+        self._trusted: Set[str] = set()
+        self._lock = threading.Lock()
+        # Una sola escritura del snapshot a la vez, en orden: comparten el
+        # fichero temporal y una más antigua no debe pisar a otra más nueva
+        self._snapshot_lock = threading.Lock()
+        self._records = 0
+        self._compactor: Optional[threading.Thread] = None
+
+    def _ensure_file(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists():
+            self.path.write_text("[]", encoding="utf-8")
+
+    def _replay(
+        self,
+        path: Path,
+    ) -> int:
+        """Aplica los registros de ``path`` sobre el estado cargado."""
+        if not path.exists():
+            return 0
+        applied = 0
+        with path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Última línea truncada por una caída a mitad de escritura
+                    logger.warning("Registro de journal corrupto en %s", path)
+                    break
+                if record["op"] == "put":
+                    self._projects[record["id"]] = record["project"]
+                elif record["op"] == "del":
+                    self._projects.pop(record["id"], None)
+                self._trusted.discard(record["id"])
+                applied += 1
+        return applied
+
+    def _append(
+        self,
+        records: List[dict],
+    ):
+        lines = "".join(_dump_compact(record) + "\n" for record in records)
+        with self._lock:
+            with self.journal_path.open("a", encoding="utf-8") as f:
+                f.write(lines)
+            self._records += len(records)
+            pending = self._records
+        if pending >= self.compact_every:
+            self._compact_in_background()
+
+    def compact(self):
+        """Reescribe el snapshot y descarta el journal ya aplicado.
+
+        El journal activo se rota antes de serializar, de modo que las
+        mutaciones concurrentes siguen añadiéndose a un journal nuevo.
+        Si el proceso cae a mitad, el journal rotado se reaplica al cargar.
+        """
+        with self._snapshot_lock:
+            with self._lock:
+                serializable = self._serializable()
+                if self.journal_path.exists():
+                    os.replace(self.journal_path, self.compacting_path)
+                self._records = 0
+            self._write_snapshot(serializable)
+            if self.compacting_path.exists():
+                self.compacting_path.unlink()
+
+    def _compact_in_background(self):
+        def run():
+            try:
+                self.compact()
+            except Exception:
+                logger.exception("Fallo compactando el journal")
+
+        # Comprobar y arrancar de una vez: dos escrituras a la vez no deben
+        # lanzar dos compactaciones
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            self._compactor = threading.Thread(
+                target=run,
+                name="journal-compactor",
+                daemon=True,
+            )
+            self._compactor.start()
+
+    def _write_snapshot(
+        self,
+        serializable: list,
+    ):
+        data = _atomic_write(
+            self.path,
+            serializable,
+            self.fsync,
+            self.format,
+            self.compression,
+        )
+        self._seal(data)
+
+    def _seal(
+        self,
+        data: bytes,
+    ):
+        """Registra versión y checksum del snapshot recién escrito."""
+        _atomic_write(
+            self.meta_path,
+            {"schema_version": SCHEMA_VERSION, "checksum": _checksum(data)},
+            self.fsync,
+        )
+
+    def _is_sealed(
+        self,
+        data: bytes,
+    ) -> bool:
+        if not TRUSTED_LOAD or not self.meta_path.exists():
+            return False
+        try:
+            meta = _read(self.meta_path)
+        except ValueError:
+            return False
+        return meta.get("schema_version") == SCHEMA_VERSION and meta.get(
+            "checksum"
+        ) == _checksum(data)
+
+    def _serializable(self) -> list:
+        return [
+            proj if isinstance(proj, dict) else proj.dict(by_alias=True)
+            for proj in list(self._projects.values())
+        ]
+
+    def _load_raw(self) -> bytes:
+        self._ensure_file()
+        data = self.path.read_bytes()
+        self._projects = {proj["id"]: proj for proj in decode(data)}
+        self._trusted = set(self._projects) if self._is_sealed(data) else set()
+        if self.journal:
+            self._replay(self.compacting_path)
+            self._records = self._replay(self.journal_path)
+        return data
+
+    @staticmethod
+    def _put_record(
+        project: Project,
+    ) -> dict:
+        return {
+            "op": "put",
+            "id": project.id,
+            "project": project.dict(by_alias=True),
+        }
+
+    # ---------- StorageBackend ---------- #
+
+    def load_all(self) -> Dict[str, Project]:
+        data = self._load_raw()
+        sealed = bool(self._trusted)
+        projects = {pid: self.get_project(pid) for pid in list(self._projects)}
+        if not sealed and TRUSTED_LOAD:
+            # Snapshot validado entero: se sella para el próximo arranque
+            self._seal(data)
+        return projects
+
+    def load_index(self) -> Dict[str, dict]:
+        # La validación se difiere hasta el primer acceso a cada proyecto
+        self._load_raw()
+        projects = self._projects
+        return {pid: project_summary(p) for pid, p in projects.items()}
+
+    def get_project(
+        self,
+        project_id: str,
+    ) -> Optional[Project]:
+        project = self._projects.get(project_id)
+        if isinstance(project, dict):
+            if project_id in self._trusted:
+                project = construct_project(project)
+            else:
+                project = Project.parse_obj(project)
+            self._projects[project_id] = project
+        return project
+
+    def put_project(
+        self,
+        project: Project,
+    ):
+        self._projects[project.id] = project
+        if not self.journal:
+            self.save_all()
+            return
+        self._append([self._put_record(project)])
+
+    def delete_project(
+        self,
+        project_id: str,
+    ):
+        self._projects.pop(project_id, None)
+        if not self.journal:
+            self.save_all()
+            return
+        self._append([{"op": "del", "id": project_id}])
+
+    def save_all(self):
+        self._ensure_file()
+        if self.journal:
+            self.compact()
+            return
+        with self._snapshot_lock:
+            self._write_snapshot(self._serializable())
+
+    def apply_batch(
+        self,
+        ops: List[Tuple[str, tuple]],
+    ):
+        """Un único append al journal, o una única reescritura del fichero."""
+        records = []
+        for project_id, project in _latest_documents(ops).items():
+            if project is None:
+                self._projects.pop(project_id, None)
+                records.append({"op": "del", "id": project_id})
+            else:
+                self._projects[project_id] = project
+                records.append(self._put_record(project))
+        if not records:
+            return
+        if self.journal:
+            self._append(records)
+        else:
+            self.save_all()
+
+    def sync(self):
+        if self.journal and self.fsync and self.journal_path.exists():
+            with self.journal_path.open("a", encoding="utf-8") as f:
+                os.fsync(f.fileno())
+
+
+# ---------- JSON por proyecto ---------- #
+
+
+class ShardedJsonStorage(StorageBackend):
+    """Un fichero JSON por proyecto más un manifiesto con el índice.
+
+    Cada escritura reescribe solo el fichero del proyecto afectado; el
+    manifiesto (orden, nombre y estado de cada proyecto) solo cambia al
+    crear o borrar proyectos o al cambiar su nombre o estado.
+    """
+
+    def __init__(
+        self,
+        directory: Path = SHARDS_DIR,
+        fmt: str = FORMAT,
+        compression: str = COMPRESSION,
+        history_dir: Path = HISTORY_DIR,
+    ):
+        self.directory = directory
+        self.format = fmt
+        self.compression = compression
+        self.history_store = HistoryStore(history_dir)
+        self.manifest_path = directory / "manifest.json"
+        self._index: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _shard_path(
+        self,
+        project_id: str,
+    ) -> Path:
+        return self.directory / f"{quote(project_id, safe='')}.json"
+
+    def _update_manifest(
+        self,
+        project_id: str,
+        summary: Optional[dict],
+    ):
+        """Cambia (o quita, si ``summary`` es None) la entrada del proyecto.
+
+        Con varios procesos el manifiesto se relee con su lock tomado: el
+        ``_index`` propio no ve los proyectos que crean los demás.
+        """
+        cluster = self.cluster
+        if cluster is not None:
+            cluster.lock_manifest()
+        try:
+            if cluster is not None and self.manifest_path.exists():
+                entries = _read(self.manifest_path)["projects"]
+                self._index = {entry["id"]: entry for entry in entries}
+            if summary is None:
+                self._index.pop(project_id, None)
+            else:
+                self._index[project_id] = summary
+            _atomic_write(
+                self.manifest_path,
+                {"projects": list(self._index.values())},
+                self.fsync,
+            )
+        finally:
+            if cluster is not None:
+                cluster.unlock_manifest()
+
+    def load_index(self) -> Dict[str, dict]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entries = []
+        if self.manifest_path.exists():
+            entries = _read(self.manifest_path)["projects"]
+        index = {
+            entry["id"]: entry
+            for entry in entries
+            if self._shard_path(entry["id"]).exists()
+        }
+        # Ficheros huérfanos: caída entre escribir el shard y el manifiesto
+        known = {self._shard_path(pid).name for pid in index}
+        for path in sorted(self.directory.glob("*.json")):
+            if path.name not in known and path != self.manifest_path:
+                raw = _read(path)
+                index[raw["id"]] = project_summary(raw)
+        self._index = index
+        return dict(index)
+
+    def load_all(self) -> Dict[str, Project]:
+        projects: Dict[str, Project] = {}
+        for project_id in self.load_index():
+            project = self.get_project(project_id)
+            if project is not None:
+                projects[project.id] = project
+        return projects
+
+    def get_project(
+        self,
+        project_id: str,
+    ) -> Optional[Project]:
+        path = self._shard_path(project_id)
+        if not path.exists():
+            return None
+        return Project.parse_obj(_read(path))
+
+    def reload_project(
+        self,
+        project_id: str,
+    ) -> Optional[Project]:
+        project = self.get_project(project_id)
+        self.history_store.forget(project_id)
+        with self._lock:
+            if project is None:
+                self._index.pop(project_id, None)
+            else:
+                self._index[project_id] = project_summary(project)
+        return project
+
+    def put_project(
+        self,
+        project: Project,
+    ):
+        _atomic_write(
+            self._shard_path(project.id),
+            project.dict(by_alias=True),
+            self.fsync,
+            self.format,
+            self.compression,
+        )
+        summary = project_summary(project)
+        with self._lock:
+            if self._index.get(project.id) != summary:
+                self._update_manifest(project.id, summary)
+
+    def delete_project(
+        self,
+        project_id: str,
+    ):
+        path = self._shard_path(project_id)
+        if path.exists():
+            path.unlink()
+        with self._lock:
+            # Puede figurar en el manifiesto aunque lo creara otro proceso
+            if self.cluster is not None or project_id in self._index:
+                self._update_manifest(project_id, None)
+
+    def apply_batch(
+        self,
+        ops: List[Tuple[str, tuple]],
+    ):
+        """Reescribe cada shard afectado una sola vez."""
+        for project_id, project in _latest_documents(ops).items():
+            if project is None:
+                self.delete_project(project_id)
+            else:
+                self.put_project(project)
+
+
+def _make_storage(
+    mode: str,
+) -> StorageBackend:
+    if mode == "journal":
+        return JsonFileStorage(DATA_PATH, journal=True)
+    if mode == "snapshot":
+        return JsonFileStorage(DATA_PATH, journal=False)
+    if mode == "sharded":
+        return ShardedJsonStorage(SHARDS_DIR)
+    if mode == "sqlite":
+        from .sqlite_storage import SQLiteStorage
+
+        return SQLiteStorage(SQLITE_PATH)
+    raise ValueError(f"Modo de almacenamiento desconocido: {mode}")
+
+
+def get_storage(
+    mode: Optional[str] = None,
+    write_behind: Optional[bool] = None,
+) -> StorageBackend:
+    """Construye el backend configurado en ``TASKFLOW_STORAGE``."""
+    storage = _make_storage(mode or STORAGE_MODE)
+    if WRITE_BEHIND if write_behind is None else write_behind:
+        from .write_behind import WriteBehindStorage
+
+        storage = WriteBehindStorage(storage, DURABILITY, COMMIT_WINDOW)
+    return storage
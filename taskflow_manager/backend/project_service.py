@@ -1,13 +1,139 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    MutableMapping,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+)
 
-from .models import HistoryEntry, Project, Status
-from .persistence import load_projects, save_projects
+from .bus import (
+    DomainEvent,
+    EventBus,
+    ProjectCreated,
+    ProjectDeleted,
+    ProjectEvent,
+    ProjectReplaced,
+    ProjectUpdated,
+    SubtaskDeleted,
+    SubtaskEvent,
+    SubtaskUpdated,
+    TaskDeleted,
+    TaskEvent,
+    TaskUpdated,
+)
+from .cluster import Change, ClusterSync, record_change
+from .custom_fields import coerce
+from .events import EventFeed
+from .graph import DependencyGraph, DependencyGraphs
+from .indexes import ServiceIndex
+from .locks import ProjectLocks, RWLock, reads_project, writes_project
+from .models import (
+    CustomFieldSchema,
+    HistoryEntry,
+    HistoryPage,
+    Project,
+    Status,
+)
+from .patches import patch_values
+from .persistence import (
+    CACHE_SIZE,
+    LAZY_LOAD,
+    StorageBackend,
+    get_storage,
+    project_summary,
+)
+from .task_index import TaskIndex
+from .views import View, json_list, model_json, page, summary_json
+from .working_set import LazyProjectMap
 
 
-class ProjectService:
+class UnitOfWork:
+    """Escrituras e historial pendientes de una transacción en curso."""
+
     def __init__(self):
-        self.projects: Dict[str, Project] = load_projects()
+        # Estado previo de cada proyecto tocado (None si no existía)
+        self.originals: Dict[str, Optional[Project]] = {}
+        self.ops: List[Tuple[str, tuple]] = []
+        self.history: Dict[str, List[HistoryEntry]] = {}
+        self.deleted_history: Set[str] = set()
+        # Locks de escritura de los proyectos tocados, hasta el final
+        self.locks: List[Tuple[str, RWLock]] = []
+        # Eventos para los suscriptores asíncronos, que salen tras el commit
+        self.events: List[DomainEvent] = []
+
+
+class ProjectService:
+    def __init__(
+        self,
+        storage: Optional[StorageBackend] = None,
+        lazy: Optional[bool] = None,
+        cluster: Optional[ClusterSync] = None,
+    ):
+        self.storage = storage or get_storage()
+        # Otros procesos sobre el mismo almacenamiento: sus cambios ya
+        # publicados se leen antes de cargar, así que la carga los incluye
+        self.cluster = cluster
+        if cluster is not None:
+            self.storage.cluster = cluster
+            cluster.poll()
+        self.projects: MutableMapping[str, Project]
+        lazy = LAZY_LOAD if lazy is None else lazy
+        if lazy:
+            self.projects = LazyProjectMap(self.storage, CACHE_SIZE)
+        else:
+            self.projects = self.storage.load_all()
+        # Índices de tareas por proyecto; en modo perezoso se acotan como el
+        # LRU para no retener proyectos ya expulsados.
+        self._indexes: "OrderedDict[str, TaskIndex]" = OrderedDict()
+        self._index_capacity = CACHE_SIZE if lazy else None
+        # Revisión por proyecto: sube con cada mutación persistida
+        self.revisions: Dict[str, int] = {}
+        # Revisión en la que cambió cada tarea por última vez; las que no
+        # figuran toman la del último cambio que pudo afectar a todas
+        self._task_revisions: Dict[str, Dict[str, int]] = {}
+        self._tasks_revision: Dict[str, int] = {}
+        # Las revisiones empiezan de cero en cada proceso: el epoch las
+        # distingue en los ETag. Con varios procesos las revisiones se
+        # comparten por proyecto y el epoch es el del registro de cambios;
+        # ``instance`` sigue distinguiendo lo propio de cada proceso
+        self.instance = format(time.time_ns(), "x")
+        self.epoch = self.instance if cluster is None else cluster.epoch
+        # JSON ya serializado por proyecto, junto a la revisión de la que sale
+        self._serialized: Dict[str, Tuple[int, bytes]] = {}
+        self._listing: Tuple[int, bytes] = (-1, b"")
+        self._generation = 0
+        # Transacción en curso, por hilo: las peticiones concurrentes
+        # siguen escribiendo directamente
+        self._local = threading.local()
+        pinned = None
+        if isinstance(self.projects, LazyProjectMap):
+            pinned = self.projects.pinned
+        self.locks = ProjectLocks(pinned)
+        # Cambios propios aún sin publicar, por proyecto
+        self._unpublished: Dict[str, Change] = {}
+        # Eventos de dominio de cada mutación: los índices se actualizan
+        # dentro de ella y los clientes en vivo (``GET /events``) los
+        # reciben ya confirmados, desde el hilo de su suscripción
+        self.bus = EventBus()
+        self.events = EventFeed()
+        self.bus.subscribe(self.events.handle, asynchronous=True)
+        # Grafos de dependencias entre tareas, por proyecto
+        self.graphs = DependencyGraphs(self.locks.shared)
+        self.bus.subscribe(self.graphs.handle, ProjectEvent, TaskEvent)
+        if cluster is not None:
+            self.locks.on_acquire = self._claim
+            self.locks.on_release = self._publish
+            for project_id in cluster.pending():
+                self._set_revisions(project_id, cluster.take(project_id))
 
     # ---------- Helpers ---------- #
 
@@ -23,10 +149,491 @@ class ProjectService:
             user=user,
             details=details,
         )
-        project.history.append(entry)
+        if project.history:
+            # Historial embebido de versiones anteriores: se traslada al
+            # almacén de historial antes de la primera entrada nueva.
+            legacy, project.history = project.history, []
+            self._append_history(project.id, legacy)
+        self._append_history(project.id, [entry])
+
+    def _append_history(
+        self,
+        project_id: str,
+        entries: List[HistoryEntry],
+    ):
+        uow = self._uow
+        if uow is None:
+            self.storage.append_history(project_id, entries)
+        else:
+            uow.history.setdefault(project_id, []).extend(entries)
+
+    def _write(
+        self,
+        name: str,
+        *args,
+    ):
+        # Dentro de una transacción la escritura espera al commit
+        uow = self._uow
+        if uow is None:
+            getattr(self.storage, name)(*args)
+        else:
+            uow.ops.append((name, args))
+
+    @reads_project
+    def history(
+        self,
+        project_id: str,
+        cursor: int = 0,
+        limit: int = 50,
+    ) -> HistoryPage:
+        project = self.projects[project_id]
+        if project.history:
+            # Historial embebido aún no migrado: mismas posiciones que
+            # tendrá en el almacén de historial.
+            end = cursor + limit
+            entries = project.history[cursor:end]
+            next_cursor: Optional[int] = cursor + len(entries)
+            if next_cursor >= len(project.history):
+                next_cursor = None
+        else:
+            entries, next_cursor = self.storage.read_history(
+                project_id,
+                cursor,
+                limit,
+            )
+        return HistoryPage(entries=entries, next_cursor=next_cursor)
+
+    # ---------- Transacciones ---------- #
+
+    @property
+    def _uow(self) -> Optional[UnitOfWork]:
+        return getattr(self._local, "uow", None)
+
+    @contextmanager
+    def transaction(self) -> Iterator[UnitOfWork]:
+        """Unidad de trabajo: todo o nada.
+
+        Las escrituras y el historial se acumulan y se aplican al salir con
+        un único ``apply_batch``. Si algo falla, los proyectos registrados
+        con ``track`` vuelven a su estado previo. Una transacción anidada se
+        une a la exterior.
+
+        Cada proyecto registrado queda bloqueado para escritura hasta el
+        final; las transacciones se serializan entre sí para que dos no se
+        esperen mutuamente.
+        """
+        uow = self._uow
+        if uow is not None:
+            yield uow
+            return
+        with self.locks.transactions, self._cluster_transaction():
+            uow = self._local.uow = UnitOfWork()
+            try:
+                yield uow
+                self._local.uow = None
+                self._commit(uow)
+                for event in uow.events:
+                    self.bus.dispatch(event)
+            except BaseException:
+                self._local.uow = None
+                self._rollback(uow)
+                raise
+            finally:
+                for project_id, lock in reversed(uow.locks):
+                    self.locks.release_write(project_id, lock)
+
+    @contextmanager
+    def _cluster_transaction(self) -> Iterator[None]:
+        # Entre procesos las transacciones también van de una en una
+        if self.cluster is None:
+            yield
+            return
+        self.cluster.lock_transactions()
+        try:
+            yield
+        finally:
+            self.cluster.unlock_transactions()
+
+    def track(
+        self,
+        project_id: str,
+    ):
+        """Guarda el estado del proyecto antes de mutarlo dentro de una
+        transacción; fuera de ella no hace nada."""
+        uow = self._uow
+        if uow is None or project_id in uow.originals:
+            return
+        uow.locks.append((project_id, self.locks.acquire_write(project_id)))
+        project = self.projects.get(project_id)
+        original = None if project is None else project.copy(deep=True)
+        uow.originals[project_id] = original
+
+    def _commit(
+        self,
+        uow: UnitOfWork,
+    ):
+        if uow.ops:
+            self.storage.apply_batch(uow.ops)
+        for project_id in uow.deleted_history:
+            self.storage.delete_history(project_id)
+        for project_id, entries in uow.history.items():
+            self.storage.append_history(project_id, entries)
+
+    def _rollback(
+        self,
+        uow: UnitOfWork,
+    ):
+        for project_id, original in uow.originals.items():
+            with self.locks.structure:
+                if original is None:
+                    self.projects.pop(project_id, None)
+                else:
+                    self.projects[project_id] = original
+            with self.locks.shared:
+                self._indexes.pop(project_id, None)
+                self._touch(project_id, deep=True)
+                self._notify(ProjectReplaced(project_id, original))
+
+    def task_index(
+        self,
+        project_id: str,
+    ) -> TaskIndex:
+        """Índice de tareas del proyecto, reconstruido si está obsoleto."""
+        project = self.projects[project_id]
+        with self.locks.shared:
+            index = self._indexes.get(project_id)
+            if index is None or not index.is_current(project):
+                index = TaskIndex(project)
+                self._indexes[project_id] = index
+            self._indexes.move_to_end(project_id)
+            if self._index_capacity is not None:
+                while len(self._indexes) > self._index_capacity:
+                    self._indexes.popitem(last=False)
+        return index
+
+    def dependency_graph(
+        self,
+        project_id: str,
+    ) -> DependencyGraph:
+        """Grafo de dependencias del proyecto, construido en su primer uso;
+        hay que tener su lock tomado."""
+        return self.graphs.get(self.projects[project_id])
+
+    def register_index(
+        self,
+        index: ServiceIndex,
+    ):
+        self.bus.subscribe(index.handle, ProjectEvent, TaskEvent)
 
-    def _persist(self):
-        save_projects(self.projects)
+    def ensure_index(
+        self,
+        index: ServiceIndex,
+    ) -> ServiceIndex:
+        """Construye el índice en su primer uso (recorre los proyectos).
+
+        Consultar el índice requiere ``locks.shared``, el mismo lock con el
+        que se le avisa de los cambios.
+        """
+        with self.locks.shared:
+            if not index.built:
+                with self.locks.structure:
+                    projects = list(self.projects.values())
+                index.rebuild(projects)
+        return index
+
+    def _touch(
+        self,
+        project_id: str,
+        task_id: Optional[str] = None,
+        deep: bool = False,
+    ):
+        revision = self.revisions.get(project_id, 0) + 1
+        self.revisions[project_id] = revision
+        self._generation += 1
+        self._serialized.pop(project_id, None)
+        if deep:
+            self._task_revisions[project_id] = {}
+            self._tasks_revision[project_id] = revision
+        elif task_id is not None:
+            tasks = self._task_revisions.setdefault(project_id, {})
+            tasks[task_id] = revision
+        if self.cluster is not None:
+            record_change(
+                self._unpublished,
+                project_id,
+                revision,
+                task_id,
+                deep,
+            )
+
+    def _notify(
+        self,
+        event: DomainEvent,
+    ):
+        """Publica el evento de un cambio ya aplicado (con ``locks.shared``
+        tomado y la revisión ya subida). Los suscriptores asíncronos lo
+        reciben al confirmarse: dentro de una transacción, tras el commit."""
+        event.revision = self.revision(event.project_id)
+        self.bus.publish(event)
+        uow = self._uow
+        if uow is None:
+            self.bus.dispatch(event)
+        else:
+            uow.events.append(event)
+
+    # ---------- Varios procesos ---------- #
+
+    def _claim(
+        self,
+        project_id: str,
+    ):
+        """Al empezar a escribir un proyecto: lock entre procesos y, si otro
+        proceso lo cambió, recarga antes de mutarlo."""
+        self.cluster.lock_project(project_id)
+        try:
+            self.cluster.poll()
+            change = self.cluster.take(project_id)
+            if change is not None:
+                self._apply_change(project_id, change)
+        except BaseException:
+            self.cluster.unlock_project(project_id)
+            raise
+
+    def _publish(
+        self,
+        project_id: str,
+    ):
+        """Al terminar de escribir: publica la revisión nueva (ya en
+        disco) y suelta el lock entre procesos."""
+        try:
+            change = self._unpublished.pop(project_id, None)
+            if change is not None:
+                self.cluster.publish(change)
+        finally:
+            self.cluster.unlock_project(project_id)
+
+    def _set_revisions(
+        self,
+        project_id: str,
+        change: Change,
+    ):
+        self.revisions[project_id] = change["r"]
+        self._generation += 1
+        self._serialized.pop(project_id, None)
+        if change["b"] is not None:
+            self._tasks_revision[project_id] = change["b"]
+            self._task_revisions[project_id] = dict(change["t"])
+        else:
+            tasks = self._task_revisions.setdefault(project_id, {})
+            tasks.update(change["t"])
+
+    def _apply_change(
+        self,
+        project_id: str,
+        change: Change,
+    ):
+        # Con el lock de escritura del proyecto tomado
+        if change["r"] <= self.revision(project_id):
+            return
+        project = self.storage.reload_project(project_id)
+        with self.locks.structure:
+            if project is None:
+                self.projects.pop(project_id, None)
+            else:
+                self.projects[project_id] = project
+        with self.locks.shared:
+            self._indexes.pop(project_id, None)
+            self._set_revisions(project_id, change)
+            self._notify(ProjectReplaced(project_id, project))
+
+    def sync(self):
+        """Recarga los proyectos que otros procesos han cambiado."""
+        if self.cluster is None:
+            return
+        self.cluster.poll()
+        for project_id in self.cluster.pending():
+            # Solo el lock local: recargar no escribe nada
+            lock = self.locks.project(project_id)
+            lock.acquire_write()
+            try:
+                change = self.cluster.take(project_id)
+                if change is not None:
+                    self._apply_change(project_id, change)
+            finally:
+                lock.release_write()
+
+    def revision(
+        self,
+        project_id: str,
+    ) -> int:
+        return self.revisions.get(project_id, 0)
+
+    def task_revision(
+        self,
+        project_id: str,
+        task_id: str,
+    ) -> int:
+        """Revisión del proyecto en la que cambió la tarea por última vez
+        (ella o sus subtareas)."""
+        default = self._tasks_revision.get(project_id, 0)
+        return self._task_revisions.get(project_id, {}).get(task_id, default)
+
+    @property
+    def generation(self) -> int:
+        """Sube con cualquier mutación de cualquier proyecto."""
+        return self._generation
+
+    def project_ids(self) -> List[str]:
+        """Ids de los proyectos en este momento."""
+        with self.locks.structure:
+            return list(self.projects)
+
+    @reads_project
+    def project_json(
+        self,
+        project_id: str,
+    ) -> bytes:
+        """JSON del proyecto (por alias), reutilizado mientras no cambie."""
+        revision = self.revision(project_id)
+        cached = self._serialized.get(project_id)
+        if cached is not None and cached[0] == revision:
+            return cached[1]
+        data = self.projects[project_id].json(by_alias=True).encode()
+        self._serialized[project_id] = (revision, data)
+        return data
+
+    def projects_json(self) -> bytes:
+        """JSON de la lista completa de proyectos, cacheado igual."""
+        generation, data = self._listing
+        if generation == self._generation:
+            return data
+        generation = self._generation
+        data = json_list(self._parts(self.project_ids()))
+        self._listing = (generation, data)
+        return data
+
+    def _parts(
+        self,
+        ids: List[str],
+        fields: Optional[Set[str]] = None,
+        exclude: Optional[Set[str]] = None,
+    ) -> Iterator[bytes]:
+        # JSON de cada proyecto, saltando los borrados mientras se lista
+        projected = fields is not None or exclude is not None
+        for project_id in ids:
+            with self.locks.read(project_id):
+                project = self.projects.get(project_id)
+                if project is None:
+                    continue
+                if projected:
+                    part = model_json(project, fields, exclude)
+                else:
+                    part = self.project_json(project_id)
+            yield part
+
+    def summaries(self) -> List[dict]:
+        """Resumen de cada proyecto; en modo perezoso, sin hidratarlos."""
+        if isinstance(self.projects, LazyProjectMap):
+            return self.projects.summaries()
+        with self.locks.structure:
+            projects = list(self.projects.values())
+        return [project_summary(p) for p in projects]
+
+    def list_json(
+        self,
+        ids: Optional[List[str]] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        view: View = View.full,
+        fields: Optional[Set[str]] = None,
+        exclude: Optional[Set[str]] = None,
+    ) -> Tuple[bytes, Optional[str]]:
+        """Página de proyectos en JSON y el cursor de la siguiente.
+
+        ``ids`` acota y ordena los proyectos (por defecto, todos). Sin
+        proyección, cada proyecto sale del JSON cacheado por revisión.
+        """
+        projected = fields is not None or exclude is not None
+        if view == View.summary:
+            summaries = self.summaries()
+            if ids is not None:
+                by_id = {s["id"]: s for s in summaries}
+                summaries = [by_id[pid] for pid in ids if pid in by_id]
+            items, next_cursor = page(summaries, cursor, limit)
+            parts = (summary_json(s, fields, exclude) for s in items)
+            return json_list(parts), next_cursor
+        if ids is None and cursor is None and limit is None and not projected:
+            return self.projects_json(), None
+        ids, next_cursor = page(
+            self.project_ids() if ids is None else ids,
+            cursor,
+            limit,
+        )
+        return json_list(self._parts(ids, fields, exclude)), next_cursor
+
+    def _persist(
+        self,
+        project_id: str,
+        deep: bool = True,
+        event: Type[ProjectEvent] = ProjectUpdated,
+    ):
+        """Persiste el estado actual del proyecto (o su borrado).
+
+        Con ``deep=False`` solo se escriben los campos del proyecto y su
+        historial, sin reescribir sus tareas.
+        """
+        project = self.projects.get(project_id)
+        if project is None:
+            event = ProjectDeleted
+        with self.locks.shared:
+            self._touch(project_id, deep=deep)
+            self._notify(event(project_id, project, deep))
+        if project is None:
+            self._write("delete_project", project_id)
+        elif deep:
+            self._write("put_project", project)
+        else:
+            self._write("put_project_fields", project)
+
+    def _persist_task(
+        self,
+        project_id: str,
+        task_id: str,
+        event: Type[TaskEvent] = TaskUpdated,
+    ):
+        index = self.task_index(project_id)
+        project = index.project
+        task = index.get_task(task_id)
+        if task is None:
+            event = TaskDeleted
+        with self.locks.shared:
+            self._touch(project_id, task_id)
+            self._notify(event(project, task_id, task))
+        if task is None:
+            self._write("delete_task", project, task_id)
+        else:
+            self._write("put_task", project, task)
+
+    def _persist_subtask(
+        self,
+        project_id: str,
+        task_id: str,
+        sub_id: str,
+        event: Type[SubtaskEvent] = SubtaskUpdated,
+    ):
+        index = self.task_index(project_id)
+        project = index.project
+        task = index.tasks[task_id]
+        subtask = index.get_subtask(task, sub_id)
+        if subtask is None:
+            event = SubtaskDeleted
+        with self.locks.shared:
+            self._touch(project_id, task_id)
+            self._notify(event(project, task_id, task, sub_id, subtask))
+        if subtask is None:
+            self._write("delete_subtask", project, task_id, sub_id)
+        else:
+            self._write("put_subtask", project, task_id, subtask)
 
     # ---------- CRUD ---------- #
 
@@ -35,14 +642,37 @@ class ProjectService:
         data: Dict[str, Any],
         user: str,
     ) -> Project:
-        if data["id"] in self.projects:
-            raise ValueError(f"El proyecto {data['id']} ya existe")
-        project = Project.parse_obj(data)
-        self._record_history(project, "created", user)
-        self.projects[project.id] = project
-        self._persist()
+        with self.locks.write(data["id"]):
+            if data["id"] in self.projects:
+                raise ValueError(f"El proyecto {data['id']} ya existe")
+            project = Project.parse_obj(data)
+            DependencyGraph(project, strict=True)
+            self._record_history(project, "created", user)
+            with self.locks.structure:
+                self.projects[project.id] = project
+            self._persist(project.id, event=ProjectCreated)
         return project
 
+    def restore(
+        self,
+        project: Project,
+        user: str,
+        replace: bool = False,
+    ) -> Project:
+        """Da de alta un proyecto ya validado (importación) con el historial
+        que traiga embebido, que pasa al almacén de historial."""
+        with self.locks.write(project.id):
+            if project.id in self.projects:
+                if not replace:
+                    raise ValueError(f"El proyecto {project.id} ya existe")
+                self.delete(project.id, user)
+            self._record_history(project, "imported", user)
+            with self.locks.structure:
+                self.projects[project.id] = project
+            self._persist(project.id, event=ProjectCreated)
+        return project
+
+    @writes_project
     def update(
         self,
         project_id: str,
@@ -64,9 +694,29 @@ class ProjectService:
             user,
             details=updates,
         )
-        self._persist()
+        self._persist(project_id, deep="tasks" in updates)
         return project
 
+    @writes_project
+    def patch(
+        self,
+        project_id: str,
+        patch: Dict[str, Any],
+        user: str,
+    ) -> Project:
+        """Aplica un JSON Merge Patch a los campos propios del proyecto.
+
+        A diferencia de ``update``, las claves van por alias, los valores se
+        validan antes de tocar nada y los objetos se fusionan.
+        """
+        project = self.projects[project_id]
+        for field, value in patch_values(project, patch).items():
+            setattr(project, field, value)
+        self._record_history(project, "updated", user, details=patch)
+        self._persist(project_id, deep=False)
+        return project
+
+    @writes_project
     def close(
         self,
         project_id: str,
@@ -76,9 +726,10 @@ class ProjectService:
         project.status = Status.closed
         project.end_date = project.end_date or datetime.utcnow()
         self._record_history(project, "closed", user)
-        self._persist()
+        self._persist(project_id, deep=False)
         return project
 
+    @writes_project
     def delete(
         self,
         project_id: str,
@@ -86,6 +737,69 @@ class ProjectService:
     ):
         if project_id not in self.projects:
             raise KeyError("Proyecto no encontrado")
-        removed = self.projects.pop(project_id)
-        self._persist()
+        with self.locks.structure:
+            removed = self.projects.pop(project_id)
+        with self.locks.shared:
+            self._indexes.pop(project_id, None)
+        self._persist(project_id)
+        uow = self._uow
+        if uow is None:
+            self.storage.delete_history(project_id)
+        else:
+            uow.history.pop(project_id, None)
+            uow.deleted_history.add(project_id)
         return removed
+
+    # ---------- Esquemas de campos personalizados ---------- #
+
+    @writes_project
+    def set_field_schema(
+        self,
+        project_id: str,
+        name: str,
+        schema: CustomFieldSchema,
+        user: str,
+    ) -> CustomFieldSchema:
+        """Declara (o cambia) el tipo e índice de un campo de las tareas.
+
+        Falla con ``ValueError`` si algún valor existente no encaja.
+        """
+        project = self.projects[project_id]
+        if schema.type == "enum" and not schema.values:
+            raise ValueError("Un campo enum necesita 'valores'")
+        for task in project.tasks:
+            value = task.custom_fields.get(name)
+            if value is None:
+                continue
+            try:
+                coerce(schema, value)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Tarea '{task.id}', campo '{name}': {e}")
+        project.field_schemas[name] = schema
+        self._record_history(
+            project,
+            "field-schema-set",
+            user,
+            {"field": name, **schema.dict(by_alias=True)},
+        )
+        self._persist(project_id, deep=False)
+        return schema
+
+    @writes_project
+    def delete_field_schema(
+        self,
+        project_id: str,
+        name: str,
+        user: str,
+    ):
+        project = self.projects[project_id]
+        if name not in project.field_schemas:
+            raise KeyError("Campo sin esquema")
+        del project.field_schemas[name]
+        self._record_history(
+            project,
+            "field-schema-deleted",
+            user,
+            {"field": name},
+        )
+        self._persist(project_id, deep=False)
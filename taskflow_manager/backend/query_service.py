@@ -0,0 +1,202 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from .custom_fields import (
+    CustomFieldIndex,
+    matches,
+    parse_filter,
+    type_conditions,
+)
+from .indexes import FieldIndex
+from .intervals import DateIndex
+from .locks import reads_project
+from .models import Project, SearchHit, Status, Task, TaskMatch
+from .project_service import ProjectService
+from .search import SearchIndex, parse_doc
+
+
+class QueryService:
+    """Consultas entre proyectos resueltas con índices secundarios.
+
+    Los índices se consultan con ``locks.shared`` tomado; las tareas de un
+    proyecto se recorren con su lock de lectura.
+    """
+
+    def __init__(self, project_service: ProjectService):
+        self.ps = project_service
+        self.locks = project_service.locks
+        self.fields = FieldIndex()
+        self.ps.register_index(self.fields)
+        self.text = SearchIndex()
+        self.ps.register_index(self.text)
+        self.dates = DateIndex()
+        self.ps.register_index(self.dates)
+        self.custom = CustomFieldIndex()
+        self.ps.register_index(self.custom)
+
+    def _resolve(
+        self,
+        refs,
+    ) -> List[TaskMatch]:
+        matches = []
+        for project_id, task_id in refs:
+            try:
+                task = self.ps.task_index(project_id).get_task(task_id)
+            except KeyError:
+                # Proyecto borrado después de consultar el índice
+                continue
+            if task is not None:
+                matches.append(TaskMatch(project_id=project_id, task=task))
+        return matches
+
+    def tasks(
+        self,
+        assignee: Optional[str] = None,
+        status: Optional[Status] = None,
+        tag: Optional[str] = None,
+        owner: Optional[str] = None,
+        where: Optional[str] = None,
+    ) -> List[TaskMatch]:
+        with self.locks.shared:
+            index = self.ps.ensure_index(self.fields)
+            refs = index.find_tasks(
+                assignee=assignee,
+                status=status.value if status else None,
+                tag=tag,
+                owner=owner,
+            )
+        if where:
+            conditions = parse_filter(where)
+            allowed = {
+                (project_id, task.id)
+                for project_id in {ref[0] for ref in refs}
+                for task in self._filter(project_id, conditions)
+            }
+            refs = [ref for ref in refs if ref in allowed]
+        return self._resolve(refs)
+
+    # ---------- Campos personalizados ---------- #
+
+    @reads_project
+    def _filter(
+        self,
+        project_id: str,
+        conditions,
+    ) -> List[Task]:
+        project = self.ps.projects[project_id]
+        schemas = project.field_schemas
+        conditions = type_conditions(schemas, conditions)
+        with self.locks.shared:
+            index = self.ps.ensure_index(self.custom)
+            ids, residual = index.candidates(project_id, conditions)
+        if ids is None:
+            tasks = project.tasks
+        else:
+            found = self.ps.task_index(project_id).tasks
+            tasks = [found[task_id] for task_id in ids if task_id in found]
+        return [
+            task
+            for task in tasks
+            if all(matches(task, c, schemas.get(c.field)) for c in residual)
+        ]
+
+    @reads_project
+    def filter_tasks(
+        self,
+        project_id: str,
+        where: Optional[str] = None,
+    ) -> List[Task]:
+        """Tareas del proyecto que cumplen ``where`` (p. ej.
+        ``"sprint=42 AND estimate>5"``); los campos con índice se resuelven
+        sin recorrer las tareas."""
+        if not where:
+            return list(self.ps.projects[project_id].tasks)
+        return self._filter(project_id, parse_filter(where))
+
+    def projects(
+        self,
+        owner: Optional[str] = None,
+        status: Optional[Status] = None,
+        tag: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> List[Project]:
+        """Proyectos que cumplen los filtros; con ``start``/``end``, solo
+        los activos en algún momento de ese intervalo."""
+        with self.locks.shared:
+            index = self.ps.ensure_index(self.fields)
+            ids = index.find_projects(
+                owner=owner,
+                status=status.value if status else None,
+                tag=tag,
+            )
+            if start or end:
+                dates = self.ps.ensure_index(self.dates)
+                active = set(
+                    dates.overlapping_projects(
+                        start or datetime.min,
+                        end or datetime.max,
+                    )
+                )
+                ids = [pid for pid in ids if pid in active]
+        # Un proyecto borrado justo ahora puede seguir en el índice
+        projects = map(self.ps.projects.get, ids)
+        return [project for project in projects if project is not None]
+
+    # ---------- Fechas ---------- #
+
+    def overlapping(
+        self,
+        start: datetime,
+        end: datetime,
+    ) -> List[TaskMatch]:
+        """Tareas cuyo intervalo de fechas solapa ``[start, end]``."""
+        with self.locks.shared:
+            index = self.ps.ensure_index(self.dates)
+            refs = index.overlapping_tasks(start, end)
+        return self._resolve(refs)
+
+    def overdue(
+        self,
+        now: Optional[datetime] = None,
+    ) -> List[TaskMatch]:
+        """Tareas sin terminar cuya fecha de fin ya ha pasado."""
+        with self.locks.shared:
+            index = self.ps.ensure_index(self.dates)
+            refs = index.due_tasks(now or datetime.utcnow())
+        return self._resolve(refs)
+
+    def due_soon(
+        self,
+        within: timedelta,
+        now: Optional[datetime] = None,
+    ) -> List[TaskMatch]:
+        """Tareas sin terminar que vencen dentro de ``within``."""
+        now = now or datetime.utcnow()
+        with self.locks.shared:
+            index = self.ps.ensure_index(self.dates)
+            refs = index.due_tasks(now, now + within)
+        return self._resolve(refs)
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+    ) -> List[SearchHit]:
+        with self.locks.shared:
+            index = self.ps.ensure_index(self.text)
+            results = index.search(query, limit)
+        hits = []
+        for doc, score, title in results:
+            kind, project_id, task_id, sub_id = parse_doc(doc)
+            hits.append(
+                SearchHit(
+                    kind=kind,
+                    project_id=project_id,
+                    task_id=task_id,
+                    subtask_id=sub_id,
+                    title=title,
+                    score=round(score, 4),
+                )
+            )
+        return hits
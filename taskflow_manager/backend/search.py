@@ -0,0 +1,226 @@
+# =============================================================
+# file: search.py
+# =============================================================
+import math
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .indexes import ServiceIndex
+from .models import Project, Task
+
+# ("project", pid) | ("task", pid, tid) | ("subtask", pid, tid, sid)
+DocId = Tuple[str, ...]
+
+STOPWORDS = frozenset(
+    """
+    a al algo como con de del el ella en es esta este esto la las lo los mas
+    me mi no o para pero por que se sin su sus un una uno y ya
+    an and are as at be but by for from has in is it its of on or that the
+    this to was were will with
+    """.split()
+)
+
+# BM25
+K1 = 1.2
+B = 0.75
+# Peso de los términos que solo casan por prefijo frente a los exactos
+PREFIX_WEIGHT = 0.5
+MAX_EXPANSIONS = 50
+
+_WORD = re.compile(r"\w+")
+
+
+def _fold(
+    text: str,
+) -> str:
+    # Minúsculas y sin tildes: "Planificación" -> "planificacion"
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _stem(
+    token: str,
+) -> str:
+    # Plural regular en español e inglés: "tareas" -> "tarea", "bugs" -> "bug"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(
+    text: str,
+) -> List[str]:
+    tokens = _WORD.findall(_fold(text))
+    return [_stem(token) for token in tokens if token not in STOPWORDS]
+
+
+def _idf(
+    total: int,
+    frequency: int,
+) -> float:
+    return math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+
+
+def _texts(
+    obj,
+) -> Iterable[str]:
+    for value in (
+        getattr(obj, "name", None),
+        getattr(obj, "title", None),
+        obj.description,
+    ):
+        if value:
+            yield value
+    for value in getattr(obj, "custom_fields", {}).values():
+        if isinstance(value, str):
+            yield value
+
+
+def _title(
+    obj,
+) -> str:
+    return getattr(obj, "name", None) or getattr(obj, "title", "")
+
+
+class SearchIndex(ServiceIndex):
+    """Índice invertido de texto completo con ranking BM25.
+
+    Indexa nombre/título, descripción y los valores de texto de
+    ``custom_fields`` de proyectos, tareas y subtareas. La tokenización
+    pasa a minúsculas, quita tildes y stopwords (es/en) y reduce el plural
+    regular, y cada término de la consulta casa también por prefijo.
+    """
+
+    def __init__(self):
+        # término -> {doc: frecuencia}
+        self.postings: Dict[str, Dict[DocId, int]] = {}
+        self._terms: Dict[DocId, List[str]] = {}
+        self._lengths: Dict[DocId, int] = {}
+        self._titles: Dict[DocId, str] = {}
+        self._total_length = 0
+        # Vocabulario ordenado para expandir prefijos con bisect
+        self._vocabulary: List[str] = []
+        self._subtask_docs: Dict[Tuple[str, str], List[DocId]] = {}
+        super().__init__()
+
+    # ---------- Documentos ---------- #
+
+    def _add(
+        self,
+        doc: DocId,
+        obj,
+    ):
+        tokens = [t for text in _texts(obj) for t in tokenize(text)]
+        counts = Counter(tokens)
+        self._terms[doc] = list(counts)
+        for term, freq in counts.items():
+            docs = self.postings.get(term)
+            if docs is None:
+                docs = self.postings[term] = {}
+                insort(self._vocabulary, term)
+            docs[doc] = freq
+        self._lengths[doc] = len(tokens)
+        self._titles[doc] = _title(obj)
+        self._total_length += len(tokens)
+
+    def _remove(
+        self,
+        doc: DocId,
+    ):
+        if doc not in self._lengths:
+            return
+        self._total_length -= self._lengths.pop(doc)
+        del self._titles[doc]
+        for term in self._terms.pop(doc):
+            docs = self.postings[term]
+            del docs[doc]
+            if not docs:
+                del self.postings[term]
+                del self._vocabulary[bisect_left(self._vocabulary, term)]
+
+    def _index_project(
+        self,
+        project: Project,
+    ):
+        self._add(("project", project.id), project)
+
+    def _unindex_project(
+        self,
+        project_id: str,
+    ):
+        self._remove(("project", project_id))
+
+    def _index_task(
+        self,
+        project: Project,
+        task: Task,
+    ):
+        self._add(("task", project.id, task.id), task)
+        docs = []
+        for subtask in task.subtasks:
+            doc = ("subtask", project.id, task.id, subtask.id)
+            self._add(doc, subtask)
+            docs.append(doc)
+        self._subtask_docs[(project.id, task.id)] = docs
+
+    def _unindex_task(
+        self,
+        project_id: str,
+        task_id: str,
+    ):
+        self._remove(("task", project_id, task_id))
+        for doc in self._subtask_docs.pop((project_id, task_id), []):
+            self._remove(doc)
+
+    # ---------- Consulta ---------- #
+
+    def _expand(
+        self,
+        token: str,
+    ) -> List[Tuple[str, float]]:
+        """Término exacto más los del vocabulario que empiezan por él."""
+        terms = [(token, 1.0)] if token in self.postings else []
+        start = bisect_left(self._vocabulary, token)
+        end = start + MAX_EXPANSIONS
+        for term in self._vocabulary[start:end]:
+            if not term.startswith(token):
+                break
+            if term != token:
+                terms.append((term, PREFIX_WEIGHT))
+        return terms
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+    ) -> List[Tuple[DocId, float, str]]:
+        """Devuelve ``(doc, score, título)`` ordenados por relevancia."""
+        total = len(self._lengths)
+        if not total:
+            return []
+        average = self._total_length / total or 1.0
+        scores: Dict[DocId, float] = {}
+        for token in set(tokenize(query)):
+            for term, weight in self._expand(token):
+                docs = self.postings[term]
+                idf = _idf(total, len(docs))
+                for doc, freq in docs.items():
+                    norm = K1 * (1 - B + B * self._lengths[doc] / average)
+                    score = idf * freq * (K1 + 1) / (freq + norm)
+                    scores[doc] = scores.get(doc, 0.0) + weight * score
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        top = ranked[:limit]
+        return [(doc, score, self._titles[doc]) for doc, score in top]
+
+
+def parse_doc(
+    doc: DocId,
+) -> Tuple[str, str, Optional[str], Optional[str]]:
+    """``(kind, project_id, task_id, subtask_id)`` de un ``DocId``."""
+    kind, project_id, *rest = doc
+    task_id = rest[0] if rest else None
+    sub_id = rest[1] if len(rest) > 1 else None
+    return kind, project_id, task_id, sub_id
@@ -0,0 +1,809 @@
+# =============================================================
+# file: sqlite_storage.py
+# =============================================================
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .models import (
+    SCHEMA_VERSION,
+    HistoryEntry,
+    Project,
+    Status,
+    Subtask,
+    Task,
+    construct_project,
+)
+from .persistence import TRUSTED_LOAD, StorageBackend, _dump_compact
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    nombre TEXT NOT NULL,
+    descripcion TEXT,
+    status TEXT NOT NULL,
+    fecha_inicio TEXT,
+    fecha_fin TEXT,
+    responsables TEXT NOT NULL,
+    etiquetas TEXT NOT NULL,
+    campos_personalizados TEXT NOT NULL,
+    esquema_campos TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    project_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT,
+    status TEXT NOT NULL,
+    fecha_inicio TEXT,
+    fecha_fin TEXT,
+    asignados TEXT NOT NULL,
+    priority TEXT,
+    dependencies TEXT NOT NULL,
+    etiquetas TEXT NOT NULL,
+    campos_personalizados TEXT NOT NULL,
+    history TEXT NOT NULL,
+    created_at TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (project_id, id)
+);
+CREATE TABLE IF NOT EXISTS subtasks (
+    project_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT,
+    status TEXT NOT NULL,
+    history TEXT NOT NULL,
+    created_at TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (project_id, task_id, id)
+);
+CREATE TABLE IF NOT EXISTS attachments (
+    project_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    url TEXT NOT NULL,
+    type TEXT,
+    PRIMARY KEY (project_id, task_id, position)
+);
+CREATE TABLE IF NOT EXISTS notifications (
+    project_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    tipo TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    mensaje TEXT NOT NULL,
+    PRIMARY KEY (project_id, task_id, position)
+);
+CREATE TABLE IF NOT EXISTS history (
+    project_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    action TEXT NOT NULL,
+    user TEXT NOT NULL,
+    details TEXT,
+    PRIMARY KEY (project_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_projects_status ON projects (status);
+CREATE INDEX IF NOT EXISTS idx_projects_dates
+    ON projects (fecha_inicio, fecha_fin);
+CREATE INDEX IF NOT EXISTS idx_tasks_id ON tasks (id);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status);
+CREATE INDEX IF NOT EXISTS idx_tasks_start ON tasks (fecha_inicio);
+CREATE INDEX IF NOT EXISTS idx_tasks_end ON tasks (fecha_fin);
+CREATE INDEX IF NOT EXISTS idx_subtasks_status ON subtasks (status);
+CREATE INDEX IF NOT EXISTS idx_history_timestamp
+    ON history (project_id, timestamp);
+"""
+
+
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _dump_optional(value) -> Optional[str]:
+    return _dump_compact(value) if value is not None else None
+
+
+def _load_optional(value: Optional[str]):
+    return json.loads(value) if value is not None else None
+
+
+class SQLiteStorage(StorageBackend):
+    """Backend SQLite con tablas normalizadas y escrituras por fila.
+
+    Usa WAL para que las lecturas concurrentes no bloqueen al escritor:
+    cada hilo lee con su propia conexión, en una transacción de solo
+    lectura, y nunca ve la transacción a medias de otro hilo.
+    Las escrituras de una tarea solo tocan sus filas (y las de sus
+    subtareas, adjuntos y notificaciones); el historial se añade aparte
+    a la tabla ``history``.
+
+    Con ``fsync`` cada COMMIT espera a disco (``synchronous=FULL``); sin
+    él (``NORMAL``) el WAL solo se sincroniza en los checkpoints o en
+    ``sync``.
+
+    ``PRAGMA user_version`` guarda la versión de esquema de los datos: si
+    coincide con ``SCHEMA_VERSION`` las filas se cargan sin validar.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+    ):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(path),
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Conexiones de lectura, una por hilo (todas, para cerrarlas). Su
+        # lock no es ``_lock``, que el escritor retiene toda la transacción
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self.fsync = True
+        new = not self._conn.execute(
+            "SELECT name FROM sqlite_master WHERE name = 'projects'"
+        ).fetchone()
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        if new:
+            self._set_version()
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        self._trusted = TRUSTED_LOAD and version == SCHEMA_VERSION
+
+    @property
+    def fsync(self) -> bool:
+        return self._fsync
+
+    @fsync.setter
+    def fsync(
+        self,
+        value: bool,
+    ):
+        # WriteBehindStorage lo ajusta después de construir el backend
+        self._fsync = value
+        level = "FULL" if value else "NORMAL"
+        with self._lock:
+            self._conn.execute(f"PRAGMA synchronous={level}")
+
+    def _migrate(self):
+        """Añade a bases de datos antiguas las columnas nuevas."""
+        rows = self._conn.execute("PRAGMA table_info(projects)")
+        columns = {row["name"] for row in rows}
+        if "esquema_campos" not in columns:
+            self._conn.execute(
+                "ALTER TABLE projects "
+                "ADD COLUMN esquema_campos TEXT NOT NULL DEFAULT '{}'"
+            )
+
+    def _set_version(self):
+        # PRAGMA no admite parámetros; SCHEMA_VERSION es un entero propio
+        self._conn.execute(f"PRAGMA user_version = {int(SCHEMA_VERSION)}")
+
+    # ---------- Escritura ---------- #
+
+    def _write(
+        self,
+        fn,
+        *args,
+    ):
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                fn(cur, *args)
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+            cur.execute("COMMIT")
+
+    def _upsert_project_row(
+        self,
+        cur: sqlite3.Cursor,
+        project: Project,
+    ):
+        cur.execute(
+            """
+            INSERT INTO projects (
+                id, position, nombre, descripcion, status, fecha_inicio,
+                fecha_fin, responsables, etiquetas, campos_personalizados,
+                esquema_campos
+            ) VALUES (
+                :id,
+                (SELECT COALESCE(MAX(position), -1) + 1 FROM projects),
+                :nombre, :descripcion, :status, :fecha_inicio, :fecha_fin,
+                :responsables, :etiquetas, :campos_personalizados,
+                :esquema_campos
+            )
+            ON CONFLICT (id) DO UPDATE SET
+                nombre = excluded.nombre,
+                descripcion = excluded.descripcion,
+                status = excluded.status,
+                fecha_inicio = excluded.fecha_inicio,
+                fecha_fin = excluded.fecha_fin,
+                responsables = excluded.responsables,
+                etiquetas = excluded.etiquetas,
+                campos_personalizados = excluded.campos_personalizados,
+                esquema_campos = excluded.esquema_campos
+            """,
+            {
+                "id": project.id,
+                "nombre": project.name,
+                "descripcion": project.description,
+                "status": Status(project.status).value,
+                "fecha_inicio": _iso(project.start_date),
+                "fecha_fin": _iso(project.end_date),
+                "responsables": _dump_compact(project.owners),
+                "etiquetas": _dump_compact(project.tags),
+                "campos_personalizados": _dump_compact(project.custom_fields),
+                "esquema_campos": _dump_compact(
+                    {
+                        name: schema.dict(by_alias=True)
+                        for name, schema in project.field_schemas.items()
+                    }
+                ),
+            },
+        )
+
+    def _delete_task_rows(
+        self,
+        cur: sqlite3.Cursor,
+        project_id: str,
+        task_id: Optional[str] = None,
+    ):
+        where = "project_id = ?"
+        params: tuple = (project_id,)
+        if task_id is not None:
+            params += (task_id,)
+        for table in ("subtasks", "attachments", "notifications"):
+            extra = " AND task_id = ?" if task_id is not None else ""
+            cur.execute(f"DELETE FROM {table} WHERE {where}{extra}", params)
+        extra = " AND id = ?" if task_id is not None else ""
+        cur.execute(f"DELETE FROM tasks WHERE {where}{extra}", params)
+
+    def _upsert_subtask_row(
+        self,
+        cur: sqlite3.Cursor,
+        project_id: str,
+        task_id: str,
+        subtask: Subtask,
+    ):
+        cur.execute(
+            """
+            INSERT INTO subtasks VALUES (
+                :project_id, :task_id, :id,
+                (SELECT COALESCE(MAX(position), -1) + 1 FROM subtasks
+                 WHERE project_id = :project_id AND task_id = :task_id),
+                :title, :description, :status, :history,
+                :created_at, :updated_at
+            )
+            ON CONFLICT (project_id, task_id, id) DO UPDATE SET
+                title = excluded.title,
+                description = excluded.description,
+                status = excluded.status,
+                history = excluded.history,
+                created_at = excluded.created_at,
+                updated_at = excluded.updated_at
+            """,
+            {
+                "project_id": project_id,
+                "task_id": task_id,
+                "id": subtask.id,
+                "title": subtask.title,
+                "description": subtask.description,
+                "status": Status(subtask.status).value,
+                "history": _dump_compact([h.dict() for h in subtask.history]),
+                "created_at": _iso(subtask.created_at),
+                "updated_at": _iso(subtask.updated_at),
+            },
+        )
+
+    def _write_task(
+        self,
+        cur: sqlite3.Cursor,
+        project_id: str,
+        task: Task,
+    ):
+        cur.execute(
+            """
+            INSERT INTO tasks VALUES (
+                :project_id, :id,
+                (SELECT COALESCE(MAX(position), -1) + 1 FROM tasks
+                 WHERE project_id = :project_id),
+                :title, :description, :status, :fecha_inicio, :fecha_fin,
+                :asignados, :priority, :dependencies, :etiquetas,
+                :campos_personalizados, :history, :created_at, :updated_at
+            )
+            ON CONFLICT (project_id, id) DO UPDATE SET
+                title = excluded.title,
+                description = excluded.description,
+                status = excluded.status,
+                fecha_inicio = excluded.fecha_inicio,
+                fecha_fin = excluded.fecha_fin,
+                asignados = excluded.asignados,
+                priority = excluded.priority,
+                dependencies = excluded.dependencies,
+                etiquetas = excluded.etiquetas,
+                campos_personalizados = excluded.campos_personalizados,
+                history = excluded.history,
+                created_at = excluded.created_at,
+                updated_at = excluded.updated_at
+            """,
+            {
+                "project_id": project_id,
+                "id": task.id,
+                "title": task.title,
+                "description": task.description,
+                "status": Status(task.status).value,
+                "fecha_inicio": _iso(task.start_date),
+                "fecha_fin": _iso(task.end_date),
+                "asignados": _dump_compact(task.assignees),
+                "priority": task.priority,
+                "dependencies": _dump_compact(task.dependencies),
+                "etiquetas": _dump_compact(task.tags),
+                "campos_personalizados": _dump_compact(task.custom_fields),
+                "history": _dump_compact([h.dict() for h in task.history]),
+                "created_at": _iso(task.created_at),
+                "updated_at": _iso(task.updated_at),
+            },
+        )
+        # Hijos de la tarea: se reemplazan, salvo las subtareas, que se
+        # actualizan in situ para conservar su orden.
+        params = (project_id, task.id)
+        for table in ("attachments", "notifications"):
+            cur.execute(
+                f"DELETE FROM {table} WHERE project_id = ? AND task_id = ?",
+                params,
+            )
+        cur.executemany(
+            "INSERT INTO attachments VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (project_id, task.id, i, a.name, a.url, a.type)
+                for i, a in enumerate(task.attachments)
+            ],
+        )
+        cur.executemany(
+            "INSERT INTO notifications VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    project_id,
+                    task.id,
+                    i,
+                    n.kind,
+                    _iso(n.timestamp),
+                    n.message,
+                )
+                for i, n in enumerate(task.notifications)
+            ],
+        )
+        sub_ids = [st.id for st in task.subtasks]
+        cur.execute(
+            "DELETE FROM subtasks WHERE project_id = ? AND task_id = ? "
+            f"AND id NOT IN ({','.join('?' * len(sub_ids))})",
+            params + tuple(sub_ids),
+        )
+        for subtask in task.subtasks:
+            self._upsert_subtask_row(cur, project_id, task.id, subtask)
+
+    # ---------- Lectura ---------- #
+
+    @contextmanager
+    def _reading(self) -> Iterator[sqlite3.Connection]:
+        """Conexión de lectura del hilo, con una instantánea de la base de
+        datos que se mantiene durante todo el bloque."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                str(self.path),
+                check_same_thread=False,
+                isolation_level=None,
+            )
+            conn.row_factory = sqlite3.Row
+            with self._readers_lock:
+                self._readers.append(conn)
+            self._local.conn = conn
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.execute("COMMIT")
+
+    def _rows_by(
+        self,
+        conn: sqlite3.Connection,
+        sql: str,
+        params: tuple,
+        *keys: str,
+    ) -> Dict[Any, List[sqlite3.Row]]:
+        grouped: Dict[Any, List[sqlite3.Row]] = {}
+        for row in conn.execute(sql, params):
+            key = tuple(row[k] for k in keys)
+            grouped.setdefault(key, []).append(row)
+        return grouped
+
+    def _load(
+        self,
+        project_id: Optional[str] = None,
+    ) -> Dict[str, Project]:
+        where, params = "", ()
+        if project_id is not None:
+            where, params = "WHERE project_id = ?", (project_id,)
+        order = " ORDER BY position"
+        with self._reading() as conn:
+            projects = conn.execute(
+                "SELECT * FROM projects "
+                + ("WHERE id = ?" if project_id is not None else "")
+                + order,
+                params,
+            ).fetchall()
+            tasks = self._rows_by(
+                conn,
+                f"SELECT * FROM tasks {where}{order}",
+                params,
+                "project_id",
+            )
+            subtasks = self._rows_by(
+                conn,
+                f"SELECT * FROM subtasks {where}{order}",
+                params,
+                "project_id",
+                "task_id",
+            )
+            attachments = self._rows_by(
+                conn,
+                f"SELECT * FROM attachments {where}{order}",
+                params,
+                "project_id",
+                "task_id",
+            )
+            notifications = self._rows_by(
+                conn,
+                f"SELECT * FROM notifications {where}{order}",
+                params,
+                "project_id",
+                "task_id",
+            )
+
+        build = construct_project if self._trusted else Project.parse_obj
+        result: Dict[str, Project] = {}
+        for p in projects:
+            raw_tasks = []
+            for t in tasks.get((p["id"],), []):
+                key = (p["id"], t["id"])
+                raw_tasks.append(
+                    {
+                        "id": t["id"],
+                        "title": t["title"],
+                        "description": t["description"],
+                        "status": t["status"],
+                        "fecha_inicio": t["fecha_inicio"],
+                        "fecha_fin": t["fecha_fin"],
+                        "asignados": json.loads(t["asignados"]),
+                        "priority": t["priority"],
+                        "dependencies": json.loads(t["dependencies"]),
+                        "etiquetas": json.loads(t["etiquetas"]),
+                        "campos_personalizados": json.loads(
+                            t["campos_personalizados"],
+                        ),
+                        "history": json.loads(t["history"]),
+                        "created_at": t["created_at"],
+                        "updated_at": t["updated_at"],
+                        "subtasks": [
+                            {
+                                "id": s["id"],
+                                "title": s["title"],
+                                "description": s["description"],
+                                "status": s["status"],
+                                "history": json.loads(s["history"]),
+                                "created_at": s["created_at"],
+                                "updated_at": s["updated_at"],
+                            }
+                            for s in subtasks.get(key, [])
+                        ],
+                        "adjuntos": [
+                            {
+                                "name": a["name"],
+                                "url": a["url"],
+                                "type": a["type"],
+                            }
+                            for a in attachments.get(key, [])
+                        ],
+                        "notificaciones": [
+                            {
+                                "tipo": n["tipo"],
+                                "fecha": n["fecha"],
+                                "mensaje": n["mensaje"],
+                            }
+                            for n in notifications.get(key, [])
+                        ],
+                    }
+                )
+            result[p["id"]] = build(
+                {
+                    "id": p["id"],
+                    "nombre": p["nombre"],
+                    "descripcion": p["descripcion"],
+                    "status": p["status"],
+                    "fecha_inicio": p["fecha_inicio"],
+                    "fecha_fin": p["fecha_fin"],
+                    "responsables": json.loads(p["responsables"]),
+                    "etiquetas": json.loads(p["etiquetas"]),
+                    "campos_personalizados": json.loads(
+                        p["campos_personalizados"],
+                    ),
+                    "esquema_campos": json.loads(p["esquema_campos"]),
+                    "tasks": raw_tasks,
+                }
+            )
+        return result
+
+    # ---------- Operaciones (dentro de una transacción) ---------- #
+
+    def _op_put_project(
+        self,
+        cur: sqlite3.Cursor,
+        project: Project,
+    ):
+        self._upsert_project_row(cur, project)
+        self._delete_task_rows(cur, project.id)
+        for task in project.tasks:
+            self._write_task(cur, project.id, task)
+
+    def _op_put_project_fields(
+        self,
+        cur: sqlite3.Cursor,
+        project: Project,
+    ):
+        self._upsert_project_row(cur, project)
+
+    def _op_delete_project(
+        self,
+        cur: sqlite3.Cursor,
+        project_id: str,
+    ):
+        self._delete_task_rows(cur, project_id)
+        cur.execute("DELETE FROM history WHERE project_id = ?", (project_id,))
+        cur.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+
+    def _op_put_task(
+        self,
+        cur: sqlite3.Cursor,
+        project: Project,
+        task: Task,
+    ):
+        self._write_task(cur, project.id, task)
+
+    def _op_delete_task(
+        self,
+        cur: sqlite3.Cursor,
+        project: Project,
+        task_id: str,
+    ):
+        self._delete_task_rows(cur, project.id, task_id)
+
+    def _op_put_subtask(
+        self,
+        cur: sqlite3.Cursor,
+        project: Project,
+        task_id: str,
+        subtask: Subtask,
+    ):
+        self._upsert_subtask_row(cur, project.id, task_id, subtask)
+
+    def _op_delete_subtask(
+        self,
+        cur: sqlite3.Cursor,
+        project: Project,
+        task_id: str,
+        sub_id: str,
+    ):
+        cur.execute(
+            """
+            DELETE FROM subtasks
+            WHERE project_id = ? AND task_id = ? AND id = ?
+            """,
+            (project.id, task_id, sub_id),
+        )
+
+    # ---------- StorageBackend ---------- #
+
+    def load_all(self) -> Dict[str, Project]:
+        projects = self._load()
+        if TRUSTED_LOAD and not self._trusted:
+            # Todo validado: las próximas cargas pueden saltarse la validación
+            with self._lock:
+                self._set_version()
+            self._trusted = True
+        return projects
+
+    def load_index(self) -> Dict[str, dict]:
+        with self._reading() as conn:
+            rows = conn.execute(
+                "SELECT id, nombre, status FROM projects ORDER BY position"
+            ).fetchall()
+        return {row["id"]: dict(row) for row in rows}
+
+    def get_project(
+        self,
+        project_id: str,
+    ) -> Optional[Project]:
+        return self._load(project_id).get(project_id)
+
+    def put_project(
+        self,
+        project: Project,
+    ):
+        self._write(self._op_put_project, project)
+
+    def put_project_fields(
+        self,
+        project: Project,
+    ):
+        self._write(self._op_put_project_fields, project)
+
+    def delete_project(
+        self,
+        project_id: str,
+    ):
+        self._write(self._op_delete_project, project_id)
+
+    def put_task(
+        self,
+        project: Project,
+        task: Task,
+    ):
+        self._write(self._op_put_task, project, task)
+
+    def delete_task(
+        self,
+        project: Project,
+        task_id: str,
+    ):
+        self._write(self._op_delete_task, project, task_id)
+
+    def put_subtask(
+        self,
+        project: Project,
+        task_id: str,
+        subtask: Subtask,
+    ):
+        self._write(self._op_put_subtask, project, task_id, subtask)
+
+    def delete_subtask(
+        self,
+        project: Project,
+        task_id: str,
+        sub_id: str,
+    ):
+        self._write(self._op_delete_subtask, project, task_id, sub_id)
+
+    def append_history(
+        self,
+        project_id: str,
+        entries: List[HistoryEntry],
+    ):
+        def append(cur):
+            start = cur.execute(
+                "SELECT COALESCE(MAX(seq), -1) + 1 FROM history "
+                "WHERE project_id = ?",
+                (project_id,),
+            ).fetchone()[0]
+            cur.executemany(
+                "INSERT INTO history VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        project_id,
+                        seq,
+                        _iso(entry.timestamp),
+                        entry.action,
+                        entry.user,
+                        _dump_optional(entry.details),
+                    )
+                    for seq, entry in enumerate(entries, start=start)
+                ],
+            )
+
+        self._write(append)
+
+    def read_history(
+        self,
+        project_id: str,
+        cursor: int = 0,
+        limit: int = 50,
+    ) -> Tuple[List[HistoryEntry], Optional[int]]:
+        with self._reading() as conn:
+            rows = conn.execute(
+                """
+                SELECT seq, timestamp, action, user, details FROM history
+                WHERE project_id = ? AND seq >= ?
+                ORDER BY seq LIMIT ?
+                """,
+                (project_id, cursor, limit + 1),
+            ).fetchall()
+        entries = [
+            HistoryEntry(
+                timestamp=row["timestamp"],
+                action=row["action"],
+                user=row["user"],
+                details=_load_optional(row["details"]),
+            )
+            for row in rows[:limit]
+        ]
+        next_cursor = rows[limit]["seq"] if len(rows) > limit else None
+        return entries, next_cursor
+
+    def history_count(
+        self,
+        project_id: str,
+    ) -> int:
+        with self._reading() as conn:
+            row = conn.execute(
+                """
+                SELECT COALESCE(MAX(seq), -1) + 1 FROM history
+                WHERE project_id = ?
+                """,
+                (project_id,),
+            ).fetchone()
+        return row[0]
+
+    def delete_history(
+        self,
+        project_id: str,
+    ):
+        self._write(
+            lambda cur: cur.execute(
+                "DELETE FROM history WHERE project_id = ?",
+                (project_id,),
+            )
+        )
+
+    def apply_batch(
+        self,
+        ops: List[Tuple[str, tuple]],
+    ):
+        """Aplica todas las operaciones en una única transacción."""
+
+        def apply(cur):
+            for name, args in ops:
+                getattr(self, f"_op_{name}")(cur, *args)
+
+        self._write(apply)
+
+    def sync(self):
+        """Fuerza a disco el WAL y la base de datos, también lo confirmado
+        con ``synchronous=NORMAL``."""
+        with self._lock:
+            for path in (self.path, Path(f"{self.path}-wal")):
+                try:
+                    fd = os.open(path, os.O_RDONLY)
+                except FileNotFoundError:
+                    continue
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+
+    def close(self):
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+        self._conn.close()
@@ -0,0 +1,150 @@
+# =============================================================
+# file: task_index.py
+# =============================================================
+from typing import Dict, List, Optional, Tuple
+
+from .models import Project, Subtask, Task
+
+
+def _remove(
+    items: list,
+    item: object,
+):
+    # Borrado en sitio por identidad: evita comparar modelos con __eq__
+    for i, other in enumerate(items):
+        if other is item:
+            del items[i]
+            return
+
+
+class TaskIndex:
+    """Índices id -> objeto de las tareas de un proyecto y sus subtareas.
+
+    Se construye a partir de las listas del propio proyecto y se mantiene
+    en cada alta y baja hecha por los servicios. Si alguien sustituye las
+    listas (p. ej. ``update`` con ``tasks``) el índice deja de estar al día
+    y ``ProjectService.task_index`` lo reconstruye.
+    """
+
+    def __init__(
+        self,
+        project: Project,
+    ):
+        self.project = project
+        self._tasks_list = project.tasks
+        self.tasks: Dict[str, Task] = {t.id: t for t in project.tasks}
+        self._size = len(project.tasks)
+        # task_id -> (lista de subtareas indexada, índice, tamaño)
+        self._subtasks: Dict[
+            str,
+            Tuple[List[Subtask], Dict[str, Subtask], int],
+        ] = {}
+
+    def is_current(
+        self,
+        project: Project,
+    ) -> bool:
+        return (
+            self.project is project
+            and self._tasks_list is project.tasks
+            and self._size == len(project.tasks)
+        )
+
+    # ---------- Tareas ---------- #
+
+    def get_task(
+        self,
+        task_id: str,
+    ) -> Optional[Task]:
+        return self.tasks.get(task_id)
+
+    def add_task(
+        self,
+        task: Task,
+    ):
+        self.project.tasks.append(task)
+        self.tasks[task.id] = task
+        self._size += 1
+
+    def remove_task(
+        self,
+        task_id: str,
+    ) -> Optional[Task]:
+        task = self.tasks.pop(task_id, None)
+        if task is not None:
+            _remove(self.project.tasks, task)
+            self._size -= 1
+            self._subtasks.pop(task_id, None)
+        return task
+
+    def rename_task(
+        self,
+        old_id: str,
+    ):
+        """Reindexa una tarea cuyo ``id`` se ha cambiado en sitio."""
+        task = self.tasks.pop(old_id)
+        self.tasks[task.id] = task
+        subtasks = self._subtasks.pop(old_id, None)
+        if subtasks is not None:
+            self._subtasks[task.id] = subtasks
+
+    # ---------- Subtareas ---------- #
+
+    def _subtask_map(
+        self,
+        task: Task,
+    ) -> Dict[str, Subtask]:
+        entry = self._subtasks.get(task.id)
+        if (
+            entry is None
+            or entry[0] is not task.subtasks
+            or entry[2] != len(task.subtasks)
+        ):
+            subtasks = {s.id: s for s in task.subtasks}
+            entry = (task.subtasks, subtasks, len(task.subtasks))
+            self._subtasks[task.id] = entry
+        return entry[1]
+
+    def _resize(
+        self,
+        task: Task,
+    ):
+        items, subtasks, _ = self._subtasks[task.id]
+        self._subtasks[task.id] = (items, subtasks, len(items))
+
+    def get_subtask(
+        self,
+        task: Task,
+        sub_id: str,
+    ) -> Optional[Subtask]:
+        return self._subtask_map(task).get(sub_id)
+
+    def add_subtask(
+        self,
+        task: Task,
+        subtask: Subtask,
+    ):
+        self._subtask_map(task)[subtask.id] = subtask
+        task.subtasks.append(subtask)
+        self._resize(task)
+
+    def remove_subtask(
+        self,
+        task: Task,
+        sub_id: str,
+    ) -> Optional[Subtask]:
+        subtask = self._subtask_map(task).pop(sub_id, None)
+        if subtask is not None:
+            _remove(task.subtasks, subtask)
+            self._resize(task)
+        return subtask
+
+    def rename_subtask(
+        self,
+        task: Task,
+        old_id: str,
+    ):
+        subtasks = self._subtask_map(task)
+        subtask = subtasks.pop(old_id, None)
+        if subtask is not None:
+            subtasks[subtask.id] = subtask
@@ -1,36 +1,48 @@
 from datetime import datetime
 from typing import Any, Dict
 
+from .bus import SubtaskCreated, TaskCreated
+from .custom_fields import normalize
+from .locks import writes_project
 from .models import Status, Subtask, Task
+from .patches import patch_values
 from .project_service import ProjectService
 
 
 class TaskService:
     def __init__(self, project_service: ProjectService):
         self.ps = project_service
+        self.locks = project_service.locks
 
     # ---------- Tasks ---------- #
 
+    @writes_project
     def add_task(
         self,
         project_id: str,
         data: Dict[str, Any],
         user: str,
     ) -> Task:
-        project = self.ps.projects[project_id]
-        if any(t.id == data["id"] for t in project.tasks):
+        index = self.ps.task_index(project_id)
+        if index.get_task(data["id"]) is not None:
             raise ValueError("La tarea ya existe en este proyecto")
         task = Task.parse_obj(data)
-        project.tasks.append(task)
+        self.ps.dependency_graph(project_id).check(task.id, task.dependencies)
+        task.custom_fields = normalize(
+            index.project.field_schemas,
+            task.custom_fields,
+        )
+        index.add_task(task)
         self.ps._record_history(
-            project,
+            index.project,
             "task-created",
             user,
             {"task_id": task.id},
         )
-        self.ps._persist()
+        self.ps._persist_task(project_id, task.id, TaskCreated)
         return task
 
+    @writes_project
     def update_task(
         self,
         project_id: str,
@@ -39,17 +51,30 @@ class TaskService:
         user: str,
     ) -> Task:
         project = self.ps.projects[project_id]
-        task = next(
-            (t for t in project.tasks if t.id == task_id),
-            None,
+        task = self._get_task(project_id, task_id)
+        index = self.ps.task_index(project_id)
+        new_id = updates.get("id", task_id)
+        if new_id != task_id and index.get_task(new_id) is not None:
+            raise ValueError("La tarea ya existe en este proyecto")
+        # Los campos personalizados con esquema se validan antes de tocar nada
+        custom = normalize(
+            project.field_schemas,
+            {f: v for f, v in updates.items() if not hasattr(task, f)},
+        )
+        self.ps.dependency_graph(project_id).check(
+            task_id,
+            updates.get("dependencies", task.dependencies),
+            updates.get("id", task_id),
         )
-        if not task:
-            raise KeyError("Tarea no encontrada")
         for field, value in updates.items():
             if hasattr(task, field):
                 setattr(task, field, value)
             else:
-                task.custom_fields[field] = value
+                task.custom_fields[field] = custom[field]
+        if task.id != task_id:
+            index.rename_task(task_id)
+            # Tombstone del id anterior en almacenamiento e índices
+            self.ps._persist_task(project_id, task_id)
         task.updated_at = datetime.utcnow()
         task.status = updates.get("status", task.status)
         self.ps._record_history(
@@ -58,9 +83,44 @@ class TaskService:
             user,
             {"task_id": task.id, **updates},
         )
-        self.ps._persist()
+        self.ps._persist_task(project_id, task.id)
+        return task
+
+    @writes_project
+    def patch_task(
+        self,
+        project_id: str,
+        task_id: str,
+        patch: Dict[str, Any],
+        user: str,
+    ) -> Task:
+        """JSON Merge Patch sobre los campos de la tarea (ver
+        ``ProjectService.patch``)."""
+        project = self.ps.projects[project_id]
+        task = self._get_task(project_id, task_id)
+        values = patch_values(task, patch)
+        if "custom_fields" in values:
+            values["custom_fields"] = normalize(
+                project.field_schemas,
+                values["custom_fields"],
+            )
+        self.ps.dependency_graph(project_id).check(
+            task_id,
+            values.get("dependencies", task.dependencies),
+        )
+        for field, value in values.items():
+            setattr(task, field, value)
+        task.updated_at = datetime.utcnow()
+        self.ps._record_history(
+            project,
+            "task-updated",
+            user,
+            {"task_id": task_id, **patch},
+        )
+        self.ps._persist_task(project_id, task_id)
         return task
 
+    @writes_project
     def close_task(
         self,
         project_id: str,
@@ -74,24 +134,27 @@ class TaskService:
             user,
         )
 
+    @writes_project
     def delete_task(
         self,
         project_id: str,
         task_id: str,
         user: str,
     ):
-        project = self.ps.projects[project_id]
-        project.tasks = [t for t in project.tasks if t.id != task_id]
+        self.ps.dependency_graph(project_id).check_remove(task_id)
+        index = self.ps.task_index(project_id)
+        index.remove_task(task_id)
         self.ps._record_history(
-            project,
+            index.project,
             "task-deleted",
             user,
             {"task_id": task_id},
         )
-        self.ps._persist()
+        self.ps._persist_task(project_id, task_id)
 
     # ---------- Subtasks ---------- #
 
+    @writes_project
     def add_subtask(
         self,
         project_id: str,
@@ -99,11 +162,12 @@ class TaskService:
         data: Dict[str, Any],
         user: str,
     ) -> Subtask:
+        index = self.ps.task_index(project_id)
         task = self._get_task(project_id, task_id)
-        if any(st.id == data["id"] for st in task.subtasks):
+        if index.get_subtask(task, data["id"]) is not None:
             raise ValueError("Subtarea duplicada")
         subtask = Subtask.parse_obj(data)
-        task.subtasks.append(subtask)
+        index.add_subtask(task, subtask)
         self.ps._record_history(
             self.ps.projects[project_id],
             "subtask-created",
@@ -113,9 +177,15 @@ class TaskService:
                 "subtask_id": subtask.id,
             },
         )
-        self.ps._persist()
+        self.ps._persist_subtask(
+            project_id,
+            task_id,
+            subtask.id,
+            SubtaskCreated,
+        )
         return subtask
 
+    @writes_project
     def update_subtask(
         self,
         project_id: str,
@@ -125,9 +195,17 @@ class TaskService:
         user: str,
     ) -> Subtask:
         subtask = self._get_subtask(project_id, task_id, sub_id)
+        index = self.ps.task_index(project_id)
+        task = self._get_task(project_id, task_id)
+        new_id = updates.get("id", sub_id)
+        if new_id != sub_id and index.get_subtask(task, new_id) is not None:
+            raise ValueError("Subtarea duplicada")
         for field, value in updates.items():
             if hasattr(subtask, field):
                 setattr(subtask, field, value)
+        if subtask.id != sub_id:
+            index.rename_subtask(task, sub_id)
+            self.ps._persist_subtask(project_id, task_id, sub_id)
         subtask.updated_at = datetime.utcnow()
         self.ps._record_history(
             self.ps.projects[project_id],
@@ -135,9 +213,32 @@ class TaskService:
             user,
             {"task_id": task_id, "subtask_id": sub_id, **updates},
         )
-        self.ps._persist()
+        self.ps._persist_subtask(project_id, task_id, subtask.id)
         return subtask
 
+    @writes_project
+    def patch_subtask(
+        self,
+        project_id: str,
+        task_id: str,
+        sub_id: str,
+        patch: Dict[str, Any],
+        user: str,
+    ) -> Subtask:
+        subtask = self._get_subtask(project_id, task_id, sub_id)
+        for field, value in patch_values(subtask, patch).items():
+            setattr(subtask, field, value)
+        subtask.updated_at = datetime.utcnow()
+        self.ps._record_history(
+            self.ps.projects[project_id],
+            "subtask-updated",
+            user,
+            {"task_id": task_id, "subtask_id": sub_id, **patch},
+        )
+        self.ps._persist_subtask(project_id, task_id, sub_id)
+        return subtask
+
+    @writes_project
     def close_subtask(
         self,
         project_id: str,
@@ -153,6 +254,7 @@ class TaskService:
             user,
         )
 
+    @writes_project
     def delete_subtask(
         self,
         project_id: str,
@@ -161,14 +263,14 @@ class TaskService:
         user: str,
     ):
         task = self._get_task(project_id, task_id)
-        task.subtasks = [st for st in task.subtasks if st.id != sub_id]
+        self.ps.task_index(project_id).remove_subtask(task, sub_id)
         self.ps._record_history(
             self.ps.projects[project_id],
             "subtask-deleted",
             user,
             {"task_id": task_id, "subtask_id": sub_id},
         )
-        self.ps._persist()
+        self.ps._persist_subtask(project_id, task_id, sub_id)
 
     # ---------- Helpers ---------- #
 
@@ -177,11 +279,7 @@ class TaskService:
         project_id: str,
         task_id: str,
     ) -> Task:
-        project = self.ps.projects[project_id]
-        task = next(
-            (t for t in project.tasks if t.id == task_id),
-            None,
-        )
+        task = self.ps.task_index(project_id).get_task(task_id)
         if not task:
             raise KeyError("Tarea no encontrada")
         return task
@@ -193,10 +291,7 @@ class TaskService:
         sub_id: str,
     ) -> Subtask:
         task = self._get_task(project_id, task_id)
-        subtask = next(
-            (s for s in task.subtasks if s.id == sub_id),
-            None,
-        )
+        subtask = self.ps.task_index(project_id).get_subtask(task, sub_id)
         if not subtask:
             raise KeyError("Subtarea no encontrada")
         return subtask
@@ -0,0 +1,104 @@
+# =============================================================
+# file: transfer.py
+# =============================================================
+from typing import Iterable, Iterator, List, Tuple
+
+from .models import HistoryEntry, Project
+from .project_service import ProjectService
+
+# Entradas de historial leídas por página al exportar
+HISTORY_PAGE = 1000
+
+
+def _full_history(
+    ps: ProjectService,
+    project_id: str,
+) -> List[HistoryEntry]:
+    entries: List[HistoryEntry] = []
+    cursor = 0
+    while cursor is not None:
+        page = ps.history(project_id, cursor, HISTORY_PAGE)
+        entries.extend(page.entries)
+        cursor = page.next_cursor
+    return entries
+
+
+def export_ndjson(
+    ps: ProjectService,
+) -> Iterator[bytes]:
+    """Un proyecto por línea (JSON por alias) con su historial completo.
+
+    Se genera proyecto a proyecto: en modo perezoso solo el LRU y la línea
+    en curso están en memoria. Cada línea se lee con el lock de lectura de
+    su proyecto, así que es coherente consigo misma; el volcado no congela
+    el conjunto mientras se recorre.
+    """
+    for project_id in ps.project_ids():
+        with ps.locks.read(project_id):
+            project = ps.projects.get(project_id)
+            if project is None:
+                # Borrado mientras se exportaba
+                continue
+            history = _full_history(ps, project_id)
+            if history and not project.history:
+                line = project.copy(update={"history": history}).json(
+                    by_alias=True,
+                )
+                data = line.encode()
+            else:
+                data = ps.project_json(project_id)
+        yield data + b"\n"
+
+
+def _parse(
+    batch: List[Tuple[int, bytes]],
+) -> List[Project]:
+    """Valida un lote de líneas; reúne todos sus errores en uno."""
+    projects, errors = [], []
+    for number, line in batch:
+        try:
+            projects.append(Project.parse_raw(line))
+        except ValueError as e:
+            errors.append(f"Línea {number}: {e}")
+    if errors:
+        raise ValueError("\n".join(errors))
+    return projects
+
+
+def _restore(
+    ps: ProjectService,
+    projects: List[Project],
+    user: str,
+    replace: bool,
+):
+    for project in projects:
+        ps.track(project.id)
+        ps.restore(project, user, replace)
+
+
+def import_ndjson(
+    ps: ProjectService,
+    lines: Iterable[bytes],
+    user: str,
+    replace: bool = False,
+    batch_size: int = 500,
+) -> int:
+    """Importa un volcado de ``export_ndjson``; devuelve cuántos proyectos.
+
+    Las líneas se validan por lotes de ``batch_size`` y todo se aplica en
+    una única transacción: si cualquier línea falla (o un proyecto ya
+    existe y no se pide ``replace``) no se importa nada.
+    """
+    count = 0
+    batch: List[Tuple[int, bytes]] = []
+    with ps.transaction():
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            batch.append((number, line))
+            count += 1
+            if len(batch) >= batch_size:
+                _restore(ps, _parse(batch), user, replace)
+                batch.clear()
+        _restore(ps, _parse(batch), user, replace)
+    return count
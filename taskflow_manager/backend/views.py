@@ -0,0 +1,174 @@
+# =============================================================
+# file: views.py
+# =============================================================
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, Iterable, List, Optional, Sequence, Set, Tuple, TypeVar
+
+from pydantic import BaseModel
+
+from .indexes import status_value
+from .models import Task, field_names
+
+Item = TypeVar("Item")
+
+
+class View(str, Enum):
+    full = "full"
+    summary = "summary"
+
+
+def parse_keys(
+    text: Optional[str],
+) -> Optional[Set[str]]:
+    """``"id,nombre, status"`` -> ``{"id", "nombre", "status"}``."""
+    if not text:
+        return None
+    keys = {key.strip() for key in text.split(",")}
+    keys.discard("")
+    return keys or None
+
+
+def _names(
+    model,
+    keys: Optional[Set[str]],
+) -> Optional[Set[str]]:
+    # Las claves llegan por alias (como en el JSON) o por nombre de campo
+    if keys is None:
+        return None
+    names = field_names(model)
+    unknown = keys - set(names)
+    if unknown:
+        raise ValueError(f"Campos desconocidos: {', '.join(sorted(unknown))}")
+    return {names[key] for key in keys}
+
+
+def _item_id(
+    item: Any,
+) -> str:
+    # Ids sueltos, resúmenes (dict) o modelos
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict):
+        return item["id"]
+    return item.id
+
+
+def _resume(
+    items: Sequence[Item],
+    cursor: str,
+) -> int:
+    """Posición desde la que sigue la página tras ``"<pos>:<id>"``."""
+    prefix, sep, item_id = cursor.partition(":")
+    if not sep or not prefix.isdigit():
+        raise ValueError(f"Cursor no válido: {cursor}")
+    position = int(prefix)
+    if position < len(items) and _item_id(items[position]) == item_id:
+        return position + 1
+    # Altas o bajas antes del cursor lo han movido: se busca por id
+    for moved, item in enumerate(items):
+        if _item_id(item) == item_id:
+            return moved + 1
+    # Se ha borrado: sigue el que ha pasado a ocupar su posición
+    return min(position, len(items))
+
+
+def page(
+    items: Sequence[Item],
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Tuple[Sequence[Item], Optional[str]]:
+    """Hasta ``limit`` elementos tras el cursor (desde el principio si es
+    None) y el cursor de la siguiente página, o ``None`` si no quedan más.
+
+    El cursor es ``"<pos>:<id>"`` del último elemento devuelto: si sigue
+    en su posición la página continúa sin recorrer la lista, y si no, tras
+    él o tras el hueco que ha dejado. ``ValueError`` si está mal formado.
+    """
+    start = 0 if cursor is None else _resume(items, cursor)
+    if limit is None:
+        return items[start:], None
+    end = start + limit
+    if end >= len(items):
+        return items[start:end], None
+    return items[start:end], f"{end - 1}:{_item_id(items[end - 1])}"
+
+
+def json_list(
+    parts: Iterable[bytes],
+) -> bytes:
+    return b"[" + b",".join(parts) + b"]"
+
+
+def model_json(
+    obj: BaseModel,
+    fields: Optional[Set[str]] = None,
+    exclude: Optional[Set[str]] = None,
+) -> bytes:
+    """JSON por alias con solo ``fields`` y sin ``exclude``; las claves
+    excluidas (``tasks``, ``history``...) ni siquiera se serializan."""
+    model = type(obj)
+    data = obj.json(
+        by_alias=True,
+        include=_names(model, fields),
+        exclude=_names(model, exclude),
+    )
+    return data.encode()
+
+
+def _default(
+    value,
+):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} no es serializable")
+
+
+def summary_json(
+    summary: dict,
+    fields: Optional[Set[str]] = None,
+    exclude: Optional[Set[str]] = None,
+) -> bytes:
+    keys = set(summary)
+    unknown = (fields or set()) - keys
+    if unknown:
+        raise ValueError(f"Campos desconocidos: {', '.join(sorted(unknown))}")
+    if fields is not None:
+        keys &= fields
+    if exclude is not None:
+        keys -= exclude
+    data = {key: value for key, value in summary.items() if key in keys}
+    return json.dumps(
+        data,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=_default,
+    ).encode()
+
+
+def task_summary(
+    task: Task,
+) -> dict:
+    """Entrada ligera de una tarea (claves por alias), sin subtareas ni
+    historial."""
+    return {
+        "id": task.id,
+        "title": task.title,
+        "status": status_value(task.status),
+        "asignados": task.assignees,
+        "fecha_fin": task.end_date,
+    }
+
+
+def tasks_json(
+    tasks: List[Task],
+    view: View = View.full,
+    fields: Optional[Set[str]] = None,
+    exclude: Optional[Set[str]] = None,
+) -> bytes:
+    """Lista JSON de tareas completas o de sus resúmenes."""
+    if view == View.summary:
+        summaries = map(task_summary, tasks)
+        return json_list(summary_json(s, fields, exclude) for s in summaries)
+    return json_list(model_json(task, fields, exclude) for task in tasks)
@@ -0,0 +1,117 @@
+# =============================================================
+# file: working_set.py
+# =============================================================
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, MutableMapping, Set
+
+from .models import Project
+from .persistence import StorageBackend, project_summary
+
+
+class LazyProjectMap(MutableMapping):
+    """Diccionario de proyectos que hidrata bajo demanda.
+
+    Al arrancar solo se carga el índice ligero del backend; cada
+    ``Project`` se lee del almacenamiento en su primer acceso y se guarda
+    en un LRU de ``capacity`` entradas. Solo se expulsan proyectos ya
+    persistidos, que se pueden volver a leer tal cual: no los que tienen
+    una escritura en curso (``pinned``) ni los que la escritura diferida
+    aún no ha llevado al backend (``storage.unflushed()``).
+    """
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        capacity: int,
+    ):
+        self.storage = storage
+        self.capacity = capacity
+        self._index: Dict[str, dict] = storage.load_index()
+        self._cache: "OrderedDict[str, Project]" = OrderedDict()
+        # Proyectos con cambios aún sin persistir (transacción en curso):
+        # no se pueden expulsar
+        self.pinned: Set[str] = set()
+        self._lock = threading.RLock()
+
+    def _remember(
+        self,
+        project: Project,
+    ):
+        self._cache[project.id] = project
+        self._cache.move_to_end(project.id)
+        if len(self._cache) <= self.capacity:
+            return
+        unflushed = self.storage.unflushed()
+        while len(self._cache) > self.capacity:
+            victim = next(
+                (
+                    pid
+                    for pid in self._cache
+                    if pid not in self.pinned and pid not in unflushed
+                ),
+                None,
+            )
+            if victim is None:
+                break
+            evicted = self._cache.pop(victim)
+            # El índice conserva el último nombre/estado conocido
+            self._index[evicted.id] = project_summary(evicted)
+
+    def __getitem__(
+        self,
+        project_id: str,
+    ) -> Project:
+        with self._lock:
+            if project_id in self._cache:
+                self._cache.move_to_end(project_id)
+                return self._cache[project_id]
+            if project_id not in self._index:
+                raise KeyError(project_id)
+            project = self.storage.get_project(project_id)
+            if project is None:
+                del self._index[project_id]
+                raise KeyError(project_id)
+            self._remember(project)
+            return project
+
+    def __setitem__(
+        self,
+        project_id: str,
+        project: Project,
+    ):
+        with self._lock:
+            self._index[project_id] = project_summary(project)
+            self._remember(project)
+
+    def __delitem__(
+        self,
+        project_id: str,
+    ):
+        with self._lock:
+            del self._index[project_id]
+            self._cache.pop(project_id, None)
+
+    def __contains__(
+        self,
+        project_id: object,
+    ) -> bool:
+        return project_id in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._index))
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def summaries(self) -> List[dict]:
+        """Resumen de todos los proyectos sin hidratar ninguno."""
+        with self._lock:
+            summaries = dict(self._index)
+            for pid, project in self._cache.items():
+                summaries[pid] = project_summary(project)
+            return list(summaries.values())
+
+    @property
+    def hydrated(self) -> int:
+        return len(self._cache)
@@ -0,0 +1,377 @@
+# =============================================================
+# file: write_behind.py
+# =============================================================
+import atexit
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from .models import HistoryEntry, Project, Subtask, Task
+from .persistence import StorageBackend
+
+logger = logging.getLogger("persistence")
+
+# none: sin fsync
+# batched: un fsync por grupo, sin esperar al escritor
+# fsync-per-commit: cada mutación espera a que su grupo llegue a disco
+DURABILITY_LEVELS = ("none", "batched", "fsync-per-commit")
+
+# Clave de coalescencia dentro de un proyecto:
+#   ()                      -> proyecto completo (put o delete)
+#   ("fields",)             -> solo campos del proyecto
+#   ("t", task_id)          -> tarea completa
+#   ("t", task_id, sub_id)  -> subtarea
+Key = Tuple[str, ...]
+Op = Tuple[str, tuple]
+
+
+def _merge(
+    ops: Dict[Key, Op],
+    key: Key,
+    op: Op,
+):
+    """Añade ``op`` a las operaciones pendientes de un proyecto.
+
+    Una escritura más amplia ya pendiente (prefijo de la clave) cubre a la
+    nueva, porque se aplica con el estado vivo del objeto en el momento
+    del flush; a su vez la nueva sustituye a las más específicas.
+    """
+    if any(k != key and key[: len(k)] == k for k in ops):
+        return
+    for k in [k for k in ops if k[: len(key)] == key]:
+        del ops[k]
+    ops[key] = op
+
+
+class WriteBehindStorage(StorageBackend):
+    """Persistencia diferida con group commit sobre otro backend.
+
+    Las mutaciones solo marcan el proyecto como sucio; un hilo escritor
+    agrupa todo lo acumulado durante ``window`` segundos y lo aplica con
+    un único ``apply_batch`` del backend interno.
+    """
+
+    def __init__(
+        self,
+        inner: StorageBackend,
+        durability: str = "batched",
+        window: float = 0.05,
+    ):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Nivel de durabilidad desconocido: {durability}")
+        self.inner = inner
+        self.durability = durability
+        self.window = window
+        self.inner.fsync = durability != "none"
+
+        self._pending: Dict[str, Dict[Key, Op]] = {}
+        self._history: Dict[str, List[HistoryEntry]] = {}
+        # Grupo que se está aplicando: las lecturas lo siguen viendo hasta
+        # que el backend interno lo confirme
+        self._inflight: Dict[str, Dict[Key, Op]] = {}
+        self._inflight_history: Dict[str, List[HistoryEntry]] = {}
+        # Grupos aplicados (o intentados): las lecturas que combinan lo
+        # escrito con la cola se repiten si cambia mientras leen
+        self._landed = 0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._queued = 0
+        self._flushed = 0
+        self._failed: Tuple[int, Optional[BaseException]] = (0, None)
+        self._closed = False
+        self._writer = threading.Thread(
+            target=self._run,
+            name="write-behind",
+            daemon=True,
+        )
+        self._writer.start()
+        atexit.register(self.close)
+
+    @property
+    def blocking_writes(self) -> bool:
+        # Solo fsync-per-commit espera al escritor en cada mutación
+        return self.durability == "fsync-per-commit"
+
+    # ---------- Cola ---------- #
+
+    def _submit(
+        self,
+        mutate: Callable[[], None],
+    ):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("El almacenamiento está cerrado")
+            mutate()
+            self._queued += 1
+            generation = self._queued
+            self._cond.notify_all()
+            if self.durability != "fsync-per-commit":
+                return
+            while self._flushed < generation:
+                failed_at, error = self._failed
+                if failed_at >= generation:
+                    raise error
+                self._cond.wait()
+
+    def _enqueue(
+        self,
+        project_id: str,
+        key: Key,
+        op: Op,
+    ):
+        def mutate():
+            _merge(self._pending.setdefault(project_id, {}), key, op)
+
+        self._submit(mutate)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not (self._pending or self._history or self._closed):
+                    self._cond.wait()
+                if self._closed:
+                    return
+            if self.durability != "fsync-per-commit":
+                # Ventana de agrupación: deja que lleguen más cambios
+                time.sleep(self.window)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Fallo en la escritura diferida")
+                time.sleep(self.window)
+
+    def _take(
+        self,
+        project_id: Optional[str],
+    ) -> Tuple[Dict[str, Dict[Key, Op]], Dict[str, List[HistoryEntry]]]:
+        # Saca de la cola todo lo pendiente, o solo lo de ``project_id``
+        if project_id is None:
+            pending, self._pending = self._pending, {}
+            history, self._history = self._history, {}
+            return pending, history
+        pending, history = {}, {}
+        if project_id in self._pending:
+            pending[project_id] = self._pending.pop(project_id)
+        if project_id in self._history:
+            history[project_id] = self._history.pop(project_id)
+        return pending, history
+
+    def flush(
+        self,
+        project_id: Optional[str] = None,
+    ):
+        """Aplica ya lo pendiente como un único grupo; con ``project_id``,
+        solo lo de ese proyecto."""
+        # Un vaciado parcial no confirma ni hace fallar a las mutaciones
+        # de los demás proyectos
+        partial = project_id is not None
+        with self._flush_lock:
+            with self._cond:
+                pending, history = self._take(project_id)
+                self._inflight = pending
+                self._inflight_history = history
+                generation = self._queued
+            ops: List[Op] = []
+            for project_ops in pending.values():
+                ops.extend(project_ops.values())
+            try:
+                if ops:
+                    self.inner.apply_batch(ops)
+                for pid, entries in history.items():
+                    self.inner.append_history(pid, entries)
+                if (ops or history) and self.durability != "none":
+                    self.inner.sync()
+            except Exception as e:
+                with self._cond:
+                    # Reencolar sin pisar lo que haya llegado después
+                    newer, self._pending = self._pending, pending
+                    for pid, project_ops in newer.items():
+                        merged = self._pending.setdefault(pid, {})
+                        for key, op in project_ops.items():
+                            _merge(merged, key, op)
+                    for pid, entries in self._history.items():
+                        history.setdefault(pid, []).extend(entries)
+                    self._history = history
+                    self._inflight, self._inflight_history = {}, {}
+                    self._landed += 1
+                    if not partial:
+                        self._failed = (generation, e)
+                    self._cond.notify_all()
+                raise
+            with self._cond:
+                self._inflight, self._inflight_history = {}, {}
+                self._landed += 1
+                if not partial:
+                    self._flushed = generation
+                self._cond.notify_all()
+
+    # ---------- StorageBackend ---------- #
+
+    def load_all(self) -> Dict[str, Project]:
+        return self.inner.load_all()
+
+    def load_index(self) -> Dict[str, dict]:
+        return self.inner.load_index()
+
+    def get_project(
+        self,
+        project_id: str,
+    ) -> Optional[Project]:
+        with self._cond:
+            # Lo encolado es más reciente que lo que se está aplicando
+            for queue in (self._pending, self._inflight):
+                for name, args in queue.get(project_id, {}).values():
+                    if name == "delete_project":
+                        return None
+                    return args[0]
+        return self.inner.get_project(project_id)
+
+    def put_project(
+        self,
+        project: Project,
+    ):
+        self._enqueue(project.id, (), ("put_project", (project,)))
+
+    def put_project_fields(
+        self,
+        project: Project,
+    ):
+        self._enqueue(
+            project.id,
+            ("fields",),
+            ("put_project_fields", (project,)),
+        )
+
+    def delete_project(
+        self,
+        project_id: str,
+    ):
+        self._enqueue(project_id, (), ("delete_project", (project_id,)))
+
+    def put_task(
+        self,
+        project: Project,
+        task: Task,
+    ):
+        self._enqueue(
+            project.id,
+            ("t", task.id),
+            ("put_task", (project, task)),
+        )
+
+    def delete_task(
+        self,
+        project: Project,
+        task_id: str,
+    ):
+        self._enqueue(
+            project.id,
+            ("t", task_id),
+            ("delete_task", (project, task_id)),
+        )
+
+    def put_subtask(
+        self,
+        project: Project,
+        task_id: str,
+        subtask: Subtask,
+    ):
+        self._enqueue(
+            project.id,
+            ("t", task_id, subtask.id),
+            ("put_subtask", (project, task_id, subtask)),
+        )
+
+    def delete_subtask(
+        self,
+        project: Project,
+        task_id: str,
+        sub_id: str,
+    ):
+        self._enqueue(
+            project.id,
+            ("t", task_id, sub_id),
+            ("delete_subtask", (project, task_id, sub_id)),
+        )
+
+    def append_history(
+        self,
+        project_id: str,
+        entries: List[HistoryEntry],
+    ):
+        def mutate():
+            self._history.setdefault(project_id, []).extend(entries)
+
+        self._submit(mutate)
+
+    def _queued_history(
+        self,
+        project_id: str,
+    ) -> List[HistoryEntry]:
+        # Lo que se está aplicando va antes que lo encolado
+        inflight = self._inflight_history.get(project_id, [])
+        return inflight + self._history.get(project_id, [])
+
+    def read_history(
+        self,
+        project_id: str,
+        cursor: int = 0,
+        limit: int = 50,
+    ) -> Tuple[List[HistoryEntry], Optional[int]]:
+        """Lo ya escrito seguido de lo que sigue en cola, sin vaciarla."""
+        while True:
+            with self._cond:
+                landed = self._landed
+                queued = self._queued_history(project_id)
+            stored = self.inner.history_count(project_id)
+            entries, next_cursor = self.inner.read_history(
+                project_id,
+                cursor,
+                limit,
+            )
+            with self._cond:
+                if self._landed == landed:
+                    break
+        if not queued or next_cursor is not None:
+            return entries, next_cursor
+        # Posiciones dentro de la cola, a continuación de lo escrito
+        start = max(cursor - stored, 0)
+        end = start + limit - len(entries)
+        entries = entries + queued[start:end]
+        total = stored + len(queued)
+        return entries, (stored + end if stored + end < total else None)
+
+    def history_count(
+        self,
+        project_id: str,
+    ) -> int:
+        with self._cond:
+            queued = self._queued_history(project_id)
+        return self.inner.history_count(project_id) + len(queued)
+
+    def delete_history(
+        self,
+        project_id: str,
+    ):
+        # Solo se escribe lo de este proyecto; el resto sigue en cola
+        self.flush(project_id)
+        self.inner.delete_history(project_id)
+
+    def unflushed(self) -> Set[str]:
+        with self._cond:
+            return set(self._pending) | set(self._inflight)
+
+    def sync(self):
+        self.flush()
+
+    def close(self):
+        """Vacía la cola y cierra el backend interno (idempotente)."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join()
+        self.flush()
+        self.inner.close()
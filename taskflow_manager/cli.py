@@ -4,6 +4,11 @@ import sys
 
 import click
 
+from .backend.cluster import check_shared
+from .backend.formats import COMPRESSIONS, FORMATS, decode, detect, encode
+from .backend.project_service import ProjectService
+from .backend.transfer import export_ndjson, import_ndjson
+
 BASE = os.path.dirname(__file__)
 
 
@@ -105,6 +110,46 @@ def dev():
     )
 
 
+@cli.command()
+@click.option(
+    "--workers",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Procesos de la API sobre el mismo almacenamiento.",
+)
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=2410, show_default=True)
+def serve(workers, host, port):
+    """Levanta solo la API, sin autoreload, en uno o varios procesos.
+
+    Con varios procesos cada uno guarda sus proyectos en memoria: se
+    coordinan con locks de fichero y un registro de cambios compartido
+    (necesita TASKFLOW_STORAGE=sqlite o sharded).
+    """
+    if workers > 1:
+        try:
+            check_shared()
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        os.environ["TASKFLOW_WORKERS"] = str(workers)
+    click.echo(f"🟢 API en http://{host}:{port} ({workers} procesos)")
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "taskflow_manager.api:app",
+            "--host",
+            host,
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+        ]
+    )
+
+
 @cli.command()
 def check():
     """Corre validaciones estáticas: lint, formatting y errores comunes."""
@@ -123,5 +168,109 @@ def check():
     )
 
 
+@cli.command()
+@click.argument(
+    "src",
+    type=click.Path(exists=True, dir_okay=False),
+)
+@click.argument(
+    "dst",
+    type=click.Path(dir_okay=False),
+    required=False,
+)
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(FORMATS),
+    default="json-min",
+    show_default=True,
+    help="Formato de salida.",
+)
+@click.option(
+    "--compression",
+    type=click.Choice(COMPRESSIONS),
+    default="none",
+    show_default=True,
+    help="Compresión de salida.",
+)
+def convert(src, dst, fmt, compression):
+    """Convierte un fichero de datos entre formatos (el origen se autodetecta).
+
+    Sin DST el fichero se reescribe en su sitio.
+    """
+    with open(src, "rb") as f:
+        data = f.read()
+    src_fmt, src_compression = detect(data)
+    out = encode(decode(data), fmt, compression)
+    dst = dst or src
+    tmp = f"{dst}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(out)
+    os.replace(tmp, dst)
+    click.echo(
+        f"🔁 {src} ({src_fmt}/{src_compression}, {len(data)} B) → "
+        f"{dst} ({fmt}/{compression}, {len(out)} B)"
+    )
+
+
+@cli.command(name="export")
+@click.argument(
+    "dst",
+    type=click.File("wb"),
+    default="-",
+)
+def export_data(dst):
+    """Vuelca todos los proyectos a NDJSON (por defecto, a stdout).
+
+    Lee el almacenamiento de TASKFLOW_DATA_DIR proyecto a proyecto, sin
+    cargarlo entero en memoria.
+    """
+    ps = ProjectService(lazy=True)
+    count = 0
+    for line in export_ndjson(ps):
+        dst.write(line)
+        count += 1
+    click.echo(f"📤 {count} proyectos exportados", err=True)
+
+
+@cli.command(name="import")
+@click.argument(
+    "src",
+    type=click.File("rb"),
+    default="-",
+)
+@click.option(
+    "--replace",
+    is_flag=True,
+    help="Sustituir los proyectos que ya existan.",
+)
+@click.option(
+    "--batch-size",
+    type=int,
+    default=500,
+    show_default=True,
+    help="Líneas validadas por lote.",
+)
+@click.option(
+    "--user",
+    default="system",
+    show_default=True,
+)
+def import_data(src, replace, batch_size, user):
+    """Importa un volcado NDJSON en TASKFLOW_DATA_DIR: todo o nada.
+
+    Con la API en marcha usa POST /import; escribir a la vez desde aquí
+    dejaría a la API con un estado desfasado.
+    """
+    ps = ProjectService(lazy=True)
+    try:
+        count = import_ndjson(ps, src, user, replace, batch_size)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    finally:
+        ps.storage.close()
+    click.echo(f"📥 {count} proyectos importados", err=True)
+
+
 if __name__ == "__main__":
     cli()
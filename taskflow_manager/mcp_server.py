@@ -1,20 +1,23 @@
 import asyncio
+import json
 import logging
+from typing import Awaitable, TypeVar
 
 from fastmcp import FastMCP
 
 from .api import app as fastapi_app
-from .backend.project_service import ProjectService
-from .backend.task_service import TaskService
+from .api import aps, ats, ex, gs, qs
+from .backend.models import Status
+from .backend.views import View, parse_keys
 
 # Configuración de logging para monitorización
 # (stderr redirigido a tu sistema de logs)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("mcp_server")
 
-ps = ProjectService()
-ts = TaskService(ps)
+Result = TypeVar("Result")
 
+# Servicios compartidos con la API: un único estado en memoria por proceso
 # 1) Clonar la API REST como recursos y tools MCP,
 #    con versionado
 mcp = FastMCP.from_fastapi(
@@ -32,29 +35,42 @@ mcp = FastMCP.from_fastapi(
 # mcp.mount("finanzas", other_mcp)
 
 
-# Helper para correr funciones síncronas con timeout
+# Helper para acotar cada llamada a los servicios async
 # (rate-limit / timeouts)
-async def _run_sync(
-    fn,
+async def _timed(
+    call: Awaitable[Result],
     timeout: float = 5.0,
-):
-    loop = asyncio.get_event_loop()
-    return await asyncio.wait_for(
-        loop.run_in_executor(None, fn),
-        timeout,
-    )
+) -> Result:
+    return await asyncio.wait_for(call, timeout)
 
 
 # ─────────── Tools de Proyectos ───────────
 
 
 @mcp.tool()
-async def list_projects_llm() -> list[dict]:
-    """Lista todos los proyectos."""
+async def list_projects_llm(
+    summary: bool = False,
+    exclude: str | None = None,
+    cursor: str | None = None,
+    limit: int | None = None,
+) -> dict:
+    """Lista los proyectos; ``summary`` devuelve solo id, nombre y estado,
+    y ``exclude`` (p. ej. "tasks,history") omite esas claves. Con ``limit``
+    devuelve una página: la siguiente se pide con ``next_cursor`` (None en
+    la última)."""
+
     try:
-        return await _run_sync(
-            lambda: [p.dict(by_alias=True) for p in ps.projects.values()]
+        content, next_cursor = await _timed(
+            aps.list_json(
+                cursor=cursor,
+                limit=limit,
+                view=View.summary if summary else View.full,
+                exclude=parse_keys(exclude),
+            )
         )
+        return {"projects": json.loads(content), "next_cursor": next_cursor}
+    except ValueError as e:
+        raise Exception(str(e))
     except asyncio.TimeoutError:
         raise Exception("Timeout en list_projects_llm")
 
@@ -65,7 +81,7 @@ async def get_project_llm(
 ) -> dict:
     """Recupera un proyecto por ID."""
     try:
-        return await _run_sync(lambda: ps.projects[id].dict(by_alias=True))
+        return json.loads(await _timed(aps.project_json(id)))
     except KeyError:
         raise Exception(f"Proyecto '{id}' no encontrado")
     except asyncio.TimeoutError:
@@ -94,8 +110,8 @@ async def create_project_llm(
         "etiquetas": etiquetas_list,
     }
     try:
-        proj = await _run_sync(
-            lambda: ps.create(
+        proj = await _timed(
+            aps.create(
                 payload,
                 user="llm",
             )
@@ -114,8 +130,8 @@ async def update_project_llm(
 ) -> dict:
     """Actualiza campos de un proyecto."""
     try:
-        proj = await _run_sync(
-            lambda: ps.update(
+        proj = await _timed(
+            aps.update(
                 id,
                 updates,
                 user="llm",
@@ -134,8 +150,8 @@ async def close_project_llm(
 ) -> dict:
     """Marca un proyecto como cerrado."""
     try:
-        proj = await _run_sync(
-            lambda: ps.close(
+        proj = await _timed(
+            aps.close(
                 id,
                 user="llm",
             )
@@ -153,8 +169,8 @@ async def delete_project_llm(
 ) -> str:
     """Elimina un proyecto con todo su contenido."""
     try:
-        await _run_sync(
-            lambda: ps.delete(
+        await _timed(
+            aps.delete(
                 id,
                 user="llm",
             )
@@ -176,8 +192,8 @@ async def add_task_llm(
 ) -> dict:
     """Añade una tarea a un proyecto."""
     try:
-        task = await _run_sync(
-            lambda: ts.add_task(
+        task = await _timed(
+            ats.add_task(
                 project_id,
                 payload,
                 user="llm",
@@ -200,8 +216,8 @@ async def update_task_llm(
 ) -> dict:
     """Actualiza campos de una tarea."""
     try:
-        task = await _run_sync(
-            lambda: ts.update_task(
+        task = await _timed(
+            ats.update_task(
                 project_id,
                 task_id,
                 updates,
@@ -211,6 +227,8 @@ async def update_task_llm(
         return task.dict(by_alias=True)
     except KeyError:
         raise Exception(f"Tarea '{task_id}' no encontrada")
+    except ValueError as e:
+        raise Exception(str(e))
     except asyncio.TimeoutError:
         raise Exception("Timeout en update_task_llm")
 
@@ -222,8 +240,8 @@ async def close_task_llm(
 ) -> dict:
     """Marca una tarea como completada."""
     try:
-        task = await _run_sync(
-            lambda: ts.close_task(
+        task = await _timed(
+            ats.close_task(
                 project_id,
                 task_id,
                 user="llm",
@@ -243,8 +261,8 @@ async def delete_task_llm(
 ) -> str:
     """Elimina una tarea de un proyecto."""
     try:
-        await _run_sync(
-            lambda: ts.delete_task(
+        await _timed(
+            ats.delete_task(
                 project_id,
                 task_id,
                 user="llm",
@@ -257,6 +275,100 @@ async def delete_task_llm(
         raise Exception("Timeout en delete_task_llm")
 
 
+# ─────────── Tools de Consultas ───────────
+
+
+@mcp.tool()
+async def find_tasks_llm(
+    assignee: str | None = None,
+    status: str | None = None,
+    tag: str | None = None,
+    owner: str | None = None,
+    filter: str | None = None,
+) -> list[dict]:
+    """Busca tareas de todos los proyectos por asignado, estado, etiqueta,
+    responsable del proyecto o campos personalizados
+    (filter="sprint=42 AND estimate>5")."""
+    try:
+        matches = await _timed(
+            ex.read(
+                qs.tasks,
+                assignee,
+                Status(status) if status else None,
+                tag,
+                owner,
+                filter,
+                offload=bool(filter),
+            )
+        )
+        return [m.dict(by_alias=True) for m in matches]
+    except ValueError as e:
+        raise Exception(str(e))
+    except asyncio.TimeoutError:
+        raise Exception("Timeout en find_tasks_llm")
+
+
+@mcp.tool()
+async def find_projects_llm(
+    owner: str | None = None,
+    status: str | None = None,
+    tag: str | None = None,
+) -> list[dict]:
+    """Busca proyectos por responsable, estado o etiqueta."""
+    try:
+        projects = await _timed(
+            ex.read(
+                qs.projects,
+                owner,
+                Status(status) if status else None,
+                tag,
+            )
+        )
+        return [p.dict(by_alias=True) for p in projects]
+    except ValueError as e:
+        raise Exception(str(e))
+    except asyncio.TimeoutError:
+        raise Exception("Timeout en find_projects_llm")
+
+
+@mcp.tool()
+async def search_llm(
+    q: str,
+    limit: int = 20,
+) -> list[dict]:
+    """Búsqueda de texto en proyectos, tareas y subtareas (BM25).
+
+    Devuelve ids y títulos; usa get_project_llm para el detalle."""
+    try:
+        hits = await _timed(ex.read(qs.search, q, limit))
+        return [h.dict() for h in hits]
+    except ValueError as e:
+        raise Exception(str(e))
+    except asyncio.TimeoutError:
+        raise Exception("Timeout en search_llm")
+
+
+@mcp.tool()
+async def critical_path_llm(
+    project_id: str,
+) -> dict:
+    """Camino crítico de un proyecto según las dependencias y fechas de sus
+    tareas: las tareas sin holgura, en orden, y el fin más temprano."""
+    try:
+        path = await _timed(
+            ex.read(
+                gs.critical_path,
+                project_id,
+                project_id=project_id,
+            )
+        )
+        return path.dict()
+    except KeyError:
+        raise Exception(f"Proyecto '{project_id}' no encontrado")
+    except asyncio.TimeoutError:
+        raise Exception("Timeout en critical_path_llm")
+
+
 # ─────────── Tools de Subtareas ───────────
 
 
@@ -268,8 +380,8 @@ async def add_subtask_llm(
 ) -> dict:
     """Añade una subtarea a una tarea."""
     try:
-        sub = await _run_sync(
-            lambda: ts.add_subtask(
+        sub = await _timed(
+            ats.add_subtask(
                 project_id,
                 task_id,
                 payload,
@@ -294,8 +406,8 @@ async def update_subtask_llm(
 ) -> dict:
     """Actualiza campos de una subtarea."""
     try:
-        sub = await _run_sync(
-            lambda: ts.update_subtask(
+        sub = await _timed(
+            ats.update_subtask(
                 project_id,
                 task_id,
                 sub_id,
@@ -306,6 +418,8 @@ async def update_subtask_llm(
         return sub.dict(by_alias=True)
     except KeyError:
         raise Exception(f"Subtarea '{sub_id}' no encontrada")
+    except ValueError as e:
+        raise Exception(str(e))
     except asyncio.TimeoutError:
         raise Exception("Timeout en update_subtask_llm")
 
@@ -318,8 +432,8 @@ async def close_subtask_llm(
 ) -> dict:
     """Marca una subtarea como completada."""
     try:
-        sub = await _run_sync(
-            lambda: ts.close_subtask(
+        sub = await _timed(
+            ats.close_subtask(
                 project_id,
                 task_id,
                 sub_id,
@@ -341,8 +455,8 @@ async def delete_subtask_llm(
 ) -> str:
     """Elimina una subtarea de una tarea."""
     try:
-        await _run_sync(
-            lambda: ts.delete_subtask(
+        await _timed(
+            ats.delete_subtask(
                 project_id,
                 task_id,
                 sub_id,
@@ -0,0 +1,194 @@
+"""Prueba de carga de los locks por proyecto.
+
+Varios hilos mutan a la vez los mismos proyectos (subtareas nuevas,
+incrementos leer-modificar-escribir dentro de una transacción, parches)
+mientras otros dan de alta y de baja proyectos y otros listan, serializan
+y consultan. Al final se comprueba, en memoria y tras recargar desde el
+almacenamiento, que no se ha perdido ninguna actualización.
+
+    python -m taskflow_manager.test.stress_locks
+
+Usa ``TASKFLOW_STORAGE`` y el resto de la configuración del entorno; sin
+``TASKFLOW_DATA_DIR`` trabaja en un directorio temporal.
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("TASKFLOW_DATA_DIR", tempfile.mkdtemp())
+
+from taskflow_manager.backend.project_service import (  # noqa: E402
+    ProjectService,
+)
+from taskflow_manager.backend.query_service import QueryService  # noqa: E402
+from taskflow_manager.backend.task_service import TaskService  # noqa: E402
+
+PROJECTS = 4
+WRITERS = 8
+OPERATIONS = 50
+USER = "stress"
+
+errors = []
+
+
+def worker(
+    fn,
+    *args,
+):
+    def run():
+        try:
+            fn(*args)
+        except Exception as e:  # pragma: no cover - se informa al final
+            errors.append(f"{fn.__name__}{args}: {e!r}")
+
+    return threading.Thread(target=run)
+
+
+def setup(
+    ps: ProjectService,
+    ts: TaskService,
+):
+    for p in range(PROJECTS):
+        project_id = f"p{p}"
+        ps.create({"id": project_id, "nombre": project_id}, USER)
+        ts.add_task(project_id, {"id": "t", "title": "contador"}, USER)
+        ts.update_task(project_id, "t", {"contador": 0}, USER)
+
+
+def add_subtasks(
+    ts: TaskService,
+    writer: int,
+):
+    # Ids únicos: cada alta debe sobrevivir
+    for i in range(OPERATIONS):
+        project_id = f"p{i % PROJECTS}"
+        data = {"id": f"s{writer}-{i}", "title": "sub"}
+        ts.add_subtask(project_id, "t", data, USER)
+
+
+def increment(
+    ps: ProjectService,
+    ts: TaskService,
+    writer: int,
+):
+    # Leer y escribir con el lock de escritura del proyecto tomado: nadie
+    # escribe entre medias aunque se ceda el GIL
+    for i in range(OPERATIONS):
+        project_id = f"p{(i + writer) % PROJECTS}"
+        with ps.locks.write(project_id):
+            task = ps.task_index(project_id).get_task("t")
+            value = task.custom_fields["contador"] + 1
+            time.sleep(0)
+            ts.update_task(project_id, "t", {"contador": value}, USER)
+
+
+def increment_in_transaction(
+    ps: ProjectService,
+    ts: TaskService,
+    writer: int,
+):
+    # Lo mismo dentro de una transacción: ``track`` retiene el proyecto
+    for i in range(OPERATIONS):
+        project_id = f"p{(i + writer) % PROJECTS}"
+        with ps.transaction():
+            ps.track(project_id)
+            task = ps.task_index(project_id).get_task("t")
+            value = task.custom_fields["contador"] + 1
+            time.sleep(0)
+            ts.update_task(project_id, "t", {"contador": value}, USER)
+
+
+def patch_projects(
+    ps: ProjectService,
+    writer: int,
+):
+    for i in range(OPERATIONS):
+        project_id = f"p{i % PROJECTS}"
+        ps.patch(project_id, {"descripcion": f"{writer}-{i}"}, USER)
+
+
+def churn(
+    ps: ProjectService,
+    writer: int,
+):
+    # Altas y bajas mientras otros recorren la lista de proyectos
+    for i in range(OPERATIONS):
+        project_id = f"tmp-{writer}-{i}"
+        ps.create({"id": project_id, "nombre": project_id}, USER)
+        ps.delete(project_id, USER)
+
+
+def read(
+    ps: ProjectService,
+    qs: QueryService,
+    stop: threading.Event,
+):
+    while not stop.is_set():
+        ps.list_json()
+        ps.list_json(limit=2, fields={"id", "nombre"})
+        for p in range(PROJECTS):
+            ps.project_json(f"p{p}")
+            qs.filter_tasks(f"p{p}", "contador>=0")
+        qs.search("sub")
+        qs.projects()
+
+
+def check(
+    ps: ProjectService,
+    label: str,
+):
+    subtasks = WRITERS * OPERATIONS
+    increments = 2 * WRITERS * OPERATIONS
+    total_subtasks = total_count = 0
+    for p in range(PROJECTS):
+        task = ps.task_index(f"p{p}").get_task("t")
+        total_subtasks += len(task.subtasks)
+        total_count += task.custom_fields["contador"]
+    leftovers = [pid for pid in ps.project_ids() if pid.startswith("tmp-")]
+    assert total_subtasks == subtasks, (label, total_subtasks, subtasks)
+    assert total_count == increments, (label, total_count, increments)
+    assert not leftovers, (label, leftovers)
+    print(
+        f"✅ {label}: {total_subtasks} subtareas, contador {total_count}, "
+        f"{len(ps.project_ids())} proyectos"
+    )
+
+
+def main():
+    ps = ProjectService()
+    ts = TaskService(ps)
+    qs = QueryService(ps)
+    setup(ps, ts)
+
+    stop = threading.Event()
+    readers = [worker(read, ps, qs, stop) for _ in range(2)]
+    writers = []
+    for writer in range(WRITERS):
+        writers.append(worker(add_subtasks, ts, writer))
+        writers.append(worker(increment, ps, ts, writer))
+        writers.append(worker(increment_in_transaction, ps, ts, writer))
+        writers.append(worker(patch_projects, ps, writer))
+        writers.append(worker(churn, ps, writer))
+
+    start = time.perf_counter()
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    stop.set()
+    for thread in readers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    if errors:
+        raise SystemExit("\n".join(["❌ Errores:", *errors]))
+    print(f"{len(writers)} escritores en {elapsed:.2f}s")
+    check(ps, "memoria")
+    ps.storage.close()
+    check(ProjectService(), "recargado")
+
+
+if __name__ == "__main__":
+    main()